@@ -1,8 +1,54 @@
 import streamlit as st
 import pandas as pd
 import json
+import hashlib
+import itertools
+import contextlib
 import io
-import zipfile
+import uuid
+import asyncio
+from envio_nibo import URL_AGENDAMENTOS, enviar_agendamentos
+from diario_envios import CAMINHO_DIARIO, DiarioEnvios
+from versoes_planilha import VersoesPlanilha
+from cache_planilhas import chave_cache, ler_com_cache, ler_planilha_com_cache
+from rastreio_etapas import RastreioEtapas
+from trabalhos_geracao import FilaTrabalhos
+from conciliacao_runner import FALHA, ler_dados_runner, conciliar, registrar_no_diario, tabela_conciliacao
+from cadastros_nibo import CadastrosNibo, ler_cadastro
+from armazem_artefatos import ArmazemArtefatos, mapear_arquivo
+from nibo_core import (
+    COLUNAS_OBRIGATORIAS,
+    TAMANHO_BLOCO,
+    OPCOES_COMPRESSAO_ZIP,
+    BACKEND_JSON,
+    LIMITE_LINHAS_COM_ERRO,
+    colunas_faltando,
+    mensagens_validacao,
+    erros_por_linha,
+    ler_planilha_em_blocos,
+    abas_da_planilha,
+    ler_varias_planilhas,
+    resumir_em_blocos,
+    construir_payloads,
+    payloads_da_planilha,
+    montar_colecao_postman,
+    escrever_colecao_postman,
+    nome_arquivo_json,
+    criar_zip_com_jsons,
+    estrutura_colecao_runner,
+    escrever_dados_runner,
+    escrever_dados_runner_json,
+    exportar_todos_artefatos,
+    impressoes_linhas,
+    comparar_versoes,
+    linhas_a_regenerar,
+    dividir_colecao_postman,
+    payloads_com_linhas,
+    resolver_nomes,
+    resolver_blocos,
+    nova_resolucao,
+    tabela_nomes_sem_id,
+)
 from datetime import datetime
 
 # Configuração da página
@@ -13,335 +59,556 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
+# Planilhas lidas mantidas em cache entre os reruns do Streamlit
+MAX_PLANILHAS_EM_CACHE = 8
+
+# Agrupamento em pastas da coleção tradicional (chaves de CRITERIOS_PASTA)
+OPCOES_PASTAS = {
+    "Sem pastas": None,
+    "Por stakeholder": 'stakeholder',
+    "Por mês de vencimento": 'mes_vencimento',
+}
+
+# Segundos entre as atualizações do progresso de uma geração em segundo plano
+INTERVALO_PROGRESSO = 1
+
+# Cadastros do Nibo que traduzem nomes em IDs (chaves de cadastros_nibo.CADASTROS)
+ROTULOS_CADASTROS = {
+    'stakeholders': "🏢 Stakeholders",
+    'categorias': "🏷️ Categorias",
+    'centros_custo': "🎯 Centros de custo",
+}
+
+# Formato do arquivo de dados do Collection Runner
+FORMATOS_DADOS_RUNNER = {
+    "CSV (requestData como texto JSON)": 'csv',
+    "JSON (menor, sem reinterpretar texto a cada iteração)": 'json',
+}
+
 def validar_colunas_obrigatorias(df):
     """Valida se a planilha contém todas as colunas obrigatórias"""
-    colunas_obrigatorias = [
-        'stakeholderId', 'description', 'reference', 'date', 
-        'Vencimento', 'categoryId', 'value', 'costCenterId'
-    ]
+    faltando = colunas_faltando(df)
     
-    colunas_faltando = [col for col in colunas_obrigatorias if col not in df.columns]
-    
-    if colunas_faltando:
-        st.error(f"❌ Colunas obrigatórias não encontradas: {', '.join(colunas_faltando)}")
+    if faltando:
+        st.error(f"❌ Colunas obrigatórias não encontradas: {', '.join(faltando)}")
         st.info("📋 Colunas obrigatórias:")
-        for col in colunas_obrigatorias:
+        for col in COLUNAS_OBRIGATORIAS:
             st.text(f"  • {col}")
         return False
     
     return True
 
-def validar_dados(df):
-    """Valida os dados da planilha"""
-    erros = []
+@st.cache_resource(max_entries=2, show_spinner=False)
+def indices_cadastros(versao_cadastros):
+    """Índices em memória dos cadastros do Nibo, montados uma vez por versão (importacoes)"""
+    with CadastrosNibo() as cadastros:
+        return cadastros.indices()
+
+@st.cache_resource(max_entries=MAX_PLANILHAS_EM_CACHE, show_spinner=False)
+def contar_abas(hash_arquivo, nome_arquivo, _caminho):
+    """Quantas abas a planilha tem, em cache pelo hash do conteúdo: abrir o XLSX a cada rerun levaria segundos"""
+    return len(abas_da_planilha(_caminho, nome_arquivo))
+
+@st.cache_resource(max_entries=MAX_PLANILHAS_EM_CACHE, show_spinner=False)
+def analisar_planilha(hash_conteudo, nome_arquivo, modo_streaming, versao_cadastros, _caminho, _indices):
+    """Lê, traduz os nomes em IDs, valida e resume a planilha enviada
     
-    # Verificar se há linhas vazias
-    linhas_vazias = df.isnull().all(axis=1).sum()
-    if linhas_vazias > 0:
-        erros.append(f"🔍 {linhas_vazias} linha(s) completamente vazia(s) encontrada(s)")
+    O resultado fica em cache pelo hash do conteúdo do arquivo, então os reruns
+    do Streamlit (troca de opção, digitação do nome da coleção) não leem nem
+    validam a planilha de novo. O cache guarda poucas planilhas e descarta a
+    usada há mais tempo. Os DataFrames devolvidos não devem ser alterados.
+    Fora do modo streaming, a planilha lida também fica no cache em disco
+    (cache_planilhas), que sobrevive a reinícios e é compartilhado entre sessões.
+    Também devolve o rastreio de tempo e memória da leitura e da validação.
+    Com `_indices` (dos cadastros na `versao_cadastros`), os nomes nas colunas
+    de ID viram IDs antes da validação; o resumo traz a resolução.
+    A planilha é lida do armazém em disco (`_caminho`), mapeada em memória.
+    """
+    rastreio = RastreioEtapas()
+    resolucao = nova_resolucao()
+    with mapear_arquivo(_caminho, nome_arquivo) as arquivo:
+        if modo_streaming:
+            # Só o primeiro bloco fica em memória; os demais são validados e descartados
+            blocos = ler_planilha_em_blocos(arquivo, nome_arquivo)
+            if _indices:
+                blocos = resolver_blocos(blocos, _indices, resolucao)
+            with rastreio.etapa("Leitura do primeiro bloco") as etapa:
+                df = next(blocos, pd.DataFrame())
+                etapa['linhas'] = len(df)
+        else:
+            with rastreio.etapa("Leitura da planilha") as etapa:
+                df, do_cache = ler_planilha_com_cache(arquivo, nome_arquivo, hash_conteudo)
+                etapa['linhas'] = len(df)
+                if do_cache:
+                    etapa['etapa'] += " (cache em disco)"
+            blocos = iter([])
+            if _indices:
+                with rastreio.etapa("Tradução de nomes em IDs", len(df)):
+                    df = resolver_nomes(df, _indices, resolucao)
+        
+        # No modo streaming a leitura (e a tradução) dos demais blocos acontece junto com a validação
+        with rastreio.etapa("Validação" + (" (leitura e validação em blocos)" if modo_streaming else "")) as etapa:
+            if all(col in df.columns for col in COLUNAS_OBRIGATORIAS):
+                resumo, relatorio, conversoes = resumir_em_blocos(itertools.chain([df], blocos), list(_indices or ()))
+            else:
+                resumo, relatorio, conversoes = {'linhas': len(df) + sum(len(bloco) for bloco in blocos)}, None, None
+            etapa['linhas'] = resumo['linhas']
+    resumo['resolucao'] = resolucao if _indices else None
     
-    # Verificar valores monetários
-    try:
-        pd.to_numeric(df['value'], errors='coerce')
-    except:
-        erros.append("💰 Coluna 'value' contém valores não numéricos")
-    
-    # Verificar datas
-    valores_nulos = df[['stakeholderId', 'description', 'date', 'Vencimento']].isnull().sum()
-    for coluna, nulos in valores_nulos.items():
-        if nulos > 0:
-            erros.append(f"📅 {nulos} valor(es) nulo(s) na coluna '{coluna}'")
-    
-    return erros
-
-def converter_planilha_para_json(df, token_api, nome_colecao):
-    """Converte a planilha em formato JSON para coleção Postman"""
-    json_list = []
-    
-    for _, row in df.iterrows():
-        # Pular linhas completamente vazias
-        if pd.isna(row).all():
-            continue
-            
-        json_data = {
-            "stakeholderId": str(row["stakeholderId"]) if pd.notna(row["stakeholderId"]) else "",
-            "description": str(row["description"]) if pd.notna(row["description"]) else "",
-            "reference": str(row["reference"]) if pd.notna(row["reference"]) else "",
-            "scheduleDate": str(row["date"]) if pd.notna(row["date"]) else "",
-            "dueDate": str(row["Vencimento"]) if pd.notna(row["Vencimento"]) else "",
-            "accrualDate": str(row["date"]) if pd.notna(row["date"]) else "",
-            "categories": [
-                {
-                    "categoryId": str(row["categoryId"]) if pd.notna(row["categoryId"]) else "",
-                    "value": float(row["value"]) if pd.notna(row["value"]) else 0.0
-                }
-            ],
-            "costCenterValueType": 0,
-            "costCenters": [
-                {
-                    "costCenterId": str(row["costCenterId"]) if pd.notna(row["costCenterId"]) else "",
-                    "value": float(row["value"]) if pd.notna(row["value"]) else 0.0
-                }
-            ]
-        }
-        json_list.append(json_data)
-    
-    # Criar coleção Postman
-    colecao_postman = {
-        "info": {
-            "name": nome_colecao,
-            "_postman_id": f"auto-generated-{datetime.now().strftime('%Y%m%d-%H%M%S')}",
-            "schema": "https://schema.getpostman.com/json/collection/v2.1.0/collection.json",
-            "description": f"Coleção gerada automaticamente em {datetime.now().strftime('%d/%m/%Y às %H:%M')}\n\nEndpoint: https://api.nibo.com.br/empresas/v1/schedules/debit"
-        },
-        "item": []
-    }
+    # No modo streaming as conversões são só do último bloco e não servem para a planilha toda
+    return df, resumo, relatorio, None if modo_streaming else conversoes, rastreio.etapas
+
+@st.cache_resource(max_entries=MAX_PLANILHAS_EM_CACHE, show_spinner=False)
+def analisar_varias_planilhas(hash_conteudo, versao_cadastros, _arquivos, _indices):
+    """Lê em paralelo, junta, valida e resume várias planilhas (ou as abas de uma)
     
-    for i, item in enumerate(json_list):
-        colecao_postman["item"].append({
-            "name": f"Agendamento {i+1} - {item['description'][:50]}{'...' if len(item['description']) > 50 else ''}",
-            "request": {
-                "method": "POST",
-                "header": [
-                    {"key": "Content-Type", "value": "application/json"},
-                    {"key": "ApiToken", "value": token_api, "type": "text"}
-                ],
-                "url": {
-                    "raw": "https://api.nibo.com.br/empresas/v1/schedules/debit",
-                    "protocol": "https",
-                    "host": ["api", "nibo", "com", "br"],
-                    "path": ["empresas", "v1", "schedules", "debit"]
-                },
-                "body": {
-                    "mode": "raw",
-                    "raw": json.dumps(item, indent=2, ensure_ascii=False),
-                    "options": {
-                        "raw": {
-                            "language": "json"
-                        }
-                    }
-                }
-            },
-            "response": []
-        })
-    
-    return colecao_postman, len(json_list), json_list
-
-def criar_jsons_individuais(df):
-    """Cria JSONs individuais para cada linha da planilha"""
-    json_list = []
-    
-    for i, row in df.iterrows():
-        # Pular linhas completamente vazias
-        if pd.isna(row).all():
-            continue
-            
-        json_data = {
-            "stakeholderId": str(row["stakeholderId"]) if pd.notna(row["stakeholderId"]) else "",
-            "description": str(row["description"]) if pd.notna(row["description"]) else "",
-            "reference": str(row["reference"]) if pd.notna(row["reference"]) else "",
-            "scheduleDate": str(row["date"]) if pd.notna(row["date"]) else "",
-            "dueDate": str(row["Vencimento"]) if pd.notna(row["Vencimento"]) else "",
-            "accrualDate": str(row["date"]) if pd.notna(row["date"]) else "",
-            "categories": [
-                {
-                    "categoryId": str(row["categoryId"]) if pd.notna(row["categoryId"]) else "",
-                    "value": float(row["value"]) if pd.notna(row["value"]) else 0.0
-                }
-            ],
-            "costCenterValueType": 0,
-            "costCenters": [
-                {
-                    "costCenterId": str(row["costCenterId"]) if pd.notna(row["costCenterId"]) else "",
-                    "value": float(row["value"]) if pd.notna(row["value"]) else 0.0
-                }
-            ]
-        }
-        json_list.append(json_data)
+    Mesmo cache e retorno de analisar_planilha, mais a lista das abas lidas.
+    `_arquivos` são pares (nome, caminho no armazém em disco).
+    """
+    rastreio = RastreioEtapas()
+    with rastreio.etapa("Leitura das planilhas e abas em paralelo") as etapa:
+        df, fontes, do_cache = ler_com_cache(
+            chave_cache(hash_conteudo, ''),
+            lambda: ler_varias_planilhas(_arquivos)
+        )
+        etapa['linhas'] = len(df)
+        if do_cache:
+            etapa['etapa'] = "Leitura das planilhas e abas (cache em disco)"
+    
+    resolucao = nova_resolucao()
+    if _indices:
+        with rastreio.etapa("Tradução de nomes em IDs", len(df)):
+            df = resolver_nomes(df, _indices, resolucao)
+    
+    with rastreio.etapa("Validação") as etapa:
+        if all(col in df.columns for col in COLUNAS_OBRIGATORIAS):
+            resumo, relatorio, conversoes = resumir_em_blocos([df], list(_indices or ()))
+        else:
+            resumo, relatorio, conversoes = {'linhas': len(df)}, None, None
+        etapa['linhas'] = resumo['linhas']
+    resumo['resolucao'] = resolucao if _indices else None
     
-    return json_list
+    return df, resumo, relatorio, conversoes, rastreio.etapas, fontes
 
-def criar_zip_com_jsons(json_list):
-    """Cria arquivo ZIP com JSONs individuais"""
-    zip_buffer = io.BytesIO()
+@st.cache_resource(max_entries=MAX_PLANILHAS_EM_CACHE, show_spinner=False)
+def conciliar_execucao(hash_conteudo, hash_relatorios, agrupar, versao_cadastros, _df, _conversoes, _relatorios, _dados_execucao):
+    """Concilia os relatórios de uma execução do Runner com a planilha
     
-    with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED) as zip_file:
-        # Criar arquivo de controle para Collection Runner
-        control_data = []
-        
-        for i, json_data in enumerate(json_list):
-            # Nome do arquivo baseado na descrição
-            descricao_limpa = "".join(c for c in json_data["description"] if c.isalnum() or c in (' ', '-', '_')).rstrip()
-            nome_arquivo = f"agendamento_{i+1:03d}_{descricao_limpa[:30]}.json"
+    Em cache pelos hashes da planilha e dos relatórios e pela versão dos
+    cadastros que traduziram os nomes da planilha. Os agendamentos que o
+    Runner criou são confirmados no diário de envios (uma vez por entrada do
+    cache). Retorna o resumo, a tabela da conciliação e os payloads que
+    falharam e o diário ainda não confirmou (o lote de reenvio).
+    """
+    relatorios = [json.loads(relatorio.getvalue()) for relatorio in _relatorios]
+    dados_execucao = None
+    if _dados_execucao is not None:
+        _dados_execucao.seek(0)
+        dados_execucao = ler_dados_runner(_dados_execucao, _dados_execucao.name)
+    payloads, linhas = payloads_com_linhas(_df, _conversoes, agrupar)
+    resumo, situacoes = conciliar(relatorios, payloads, dados_execucao)
+    with DiarioEnvios() as diario:
+        falhas = registrar_no_diario(diario, resumo, payloads, situacoes)
+    return resumo, tabela_conciliacao(payloads, linhas, situacoes, _df), falhas
+
+def mostrar_diagnostico(rastreio):
+    """Painel recolhido com o tempo e a memória de cada etapa, e o rastreio em JSON para download"""
+    with st.expander(f"🩺 Diagnóstico de desempenho (geração em {rastreio.total_segundos():.2f}s)"):
+        etapas = rastreio.contexto.get('leitura', []) + rastreio.etapas
+        st.dataframe(pd.DataFrame({
+            "Etapa": [registro['etapa'] for registro in etapas],
+            "Tempo (s)": [registro['segundos'] for registro in etapas],
+            "CPU (s)": [registro['cpu_segundos'] for registro in etapas],
+            "Linhas": [registro['linhas'] for registro in etapas],
+            "Linhas/s": [registro['linhas_por_segundo'] for registro in etapas],
+            "Pico de memória (MB)": [registro['pico_memoria_mb'] for registro in etapas],
+            "Aumento de memória (MB)": [registro['aumento_memoria_mb'] for registro in etapas],
+        }), use_container_width=True, hide_index=True)
+        st.caption("As etapas de leitura e validação foram medidas quando a planilha foi carregada (os reruns usam o cache). "
+                   "A CPU é a da thread da geração; a memória é o RSS do processo inteiro, amostrado durante cada etapa, "
+                   "e inclui outras gerações que rodem ao mesmo tempo.")
+        st.download_button(
+            label="📥 Baixar Rastreio (JSON)",
+            data=json.dumps(rastreio.para_dict(), indent=2, ensure_ascii=False),
+            file_name=f"nibo_rastreio_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json",
+            mime="application/json"
+        )
+
+@st.cache_resource
+def fila_trabalhos():
+    """Pool de geração único do servidor, compartilhado por todas as sessões"""
+    return FilaTrabalhos()
+
+def gerar_artefatos(trabalho, df, conversoes, arquivo, opcoes):
+    """Gera os artefatos escolhidos e devolve o que a página precisa para mostrá-los
+    
+    Roda em uma thread do pool de trabalhos, fora do script do Streamlit, então
+    não chama st.*. No modo streaming, `arquivo` é o caminho da planilha no
+    armazém em disco, lida de novo em blocos. O progresso é contado sobre os
+    payloads, que também verificam o pedido de cancelamento. Os artefatos são
+    gravados no armazém, na pasta da sessão; o resultado leva só os nomes.
+    """
+    tipo_colecao = opcoes['tipo_colecao']
+    token_api, nome_colecao, json_compacto = opcoes['token_api'], opcoes['nome_colecao'], opcoes['json_compacto']
+    modo_streaming, agrupar_linhas = opcoes['modo_streaming'], opcoes['agrupar_linhas']
+    rastreio = RastreioEtapas(
+        arquivo=opcoes['nome_entrada'],
+        linhas=trabalho.total,
+        tipo_colecao=tipo_colecao,
+        modo_streaming=modo_streaming,
+        json_compacto=json_compacto,
+        agrupar_linhas=agrupar_linhas,
+        backend_json=BACKEND_JSON,
+        leitura=opcoes['etapas_leitura']
+    )
+    resultado = {
+        'tipo_colecao': tipo_colecao,
+        'rastreio': rastreio,
+        'avisos': [],
+        'gerado_em': datetime.now().strftime('%Y%m%d_%H%M%S'),
+        'id_sessao': opcoes['id_sessao'],
+        'artefatos': {},
+    }
+    contagem_diario = {}
+    impressoes = None
+    armazem = ArmazemArtefatos()
+    
+    def gravar_artefato(chave, extensao):
+        """Arquivo do armazém onde gravar o artefato `chave` deste trabalho"""
+        resultado['artefatos'][chave] = f"{trabalho.id}_{chave}.{extensao}"
+        return armazem.gravar(opcoes['id_sessao'], resultado['artefatos'][chave])
+    
+    planilha = mapear_arquivo(arquivo, opcoes['nome_entrada']) if modo_streaming else contextlib.nullcontext()
+    with DiarioEnvios() as diario, planilha:
+        if modo_streaming:
+            # A planilha é lida de novo em blocos: leitura, payloads e escrita entram juntos na etapa do artefato
+            payloads = payloads_da_planilha(planilha, df, modo_streaming, conversoes, agrupar_linhas, opcoes['indices_cadastros'])
+            if opcoes['pular_confirmados']:
+                payloads = diario.filtrar_pendentes(payloads, contagem_diario)
+            em_blocos = " (leitura, payloads e escrita em blocos)"
+            df_geracao = df
+            if opcoes['so_alteracoes']:
+                resultado['avisos'].append("♻️ No modo streaming a geração é sempre completa")
+        else:
+            df_geracao, conversoes_geracao = df, conversoes
+            if opcoes['so_alteracoes']:
+                with rastreio.etapa("Comparação com a versão anterior", len(df)):
+                    impressoes = impressoes_linhas(df, conversoes)
+                    with VersoesPlanilha() as versoes:
+                        anterior = versoes.ultima(opcoes['nome_entrada'])
+                    if anterior is not None:
+                        diferencas = comparar_versoes(anterior, impressoes)
+                        df_geracao = df.iloc[linhas_a_regenerar(impressoes, diferencas, agrupar_linhas)]
+                        conversoes_geracao = None
+                
+                if anterior is None:
+                    resultado['avisos'].append("♻️ Primeira geração desta planilha: todas as linhas entram, e esta versão fica guardada para a próxima comparação")
+                else:
+                    resultado['avisos'].append(
+                        f"♻️ Desde a versão gerada em {anterior['gerada_em']}: {len(diferencas['novas'])} linha(s) nova(s), "
+                        f"{len(diferencas['alteradas'])} alterada(s), {diferencas['removidas']} removida(s) e "
+                        f"{diferencas['inalteradas']} sem mudança. Só as novas e alteradas entram nos artefatos; "
+                        f"agendamentos de linhas alteradas ou removidas já enviados não são apagados no Nibo"
+                    )
             
-            # Adicionar JSON individual ao ZIP
-            json_string = json.dumps(json_data, indent=2, ensure_ascii=False)
-            zip_file.writestr(nome_arquivo, json_string)
+            with rastreio.etapa("Montagem dos payloads", len(df_geracao)):
+                payloads = payloads_da_planilha(None, df_geracao, modo_streaming, conversoes_geracao, agrupar_linhas)
+            if opcoes['pular_confirmados']:
+                with rastreio.etapa("Consulta ao diário de envios", len(payloads)):
+                    payloads = list(diario.filtrar_pendentes(payloads, contagem_diario))
+            trabalho.total = len(payloads)
+            em_blocos = ""
+        
+        payloads = trabalho.acompanhar(payloads)
+        
+        if tipo_colecao == "📋 Coleção Tradicional" and (opcoes['max_itens'] or opcoes['max_bytes'] or opcoes['pastas']):
+            # Coleções menores, em uma passada pelos payloads, com manifesto
+            with rastreio.etapa("Coleção tradicional dividida" + em_blocos) as etapa:
+                with gravar_artefato('partes', 'zip') as saida:
+                    _, manifesto = dividir_colecao_postman(
+                        payloads, token_api, nome_colecao, opcoes['max_itens'], opcoes['max_bytes'], opcoes['pastas'], json_compacto,
+                        destino=saida
+                    )
+                etapa['linhas'] = resultado['total'] = manifesto['total_agendamentos']
+            resultado['manifesto'] = manifesto
+        
+        elif tipo_colecao == "📋 Coleção Tradicional":
+            # Coleção tradicional, escrita item a item no armazém
+            with rastreio.etapa("Coleção tradicional (JSON indentado)" + em_blocos) as etapa:
+                with gravar_artefato('colecao', 'json') as saida:
+                    total_requests = escrever_colecao_postman(saida, payloads, token_api, nome_colecao, json_compacto)
+                etapa['linhas'] = resultado['total'] = total_requests
+            # Prévia das linhas que entram no artefato: no modo incremental, só as novas e alteradas
+            resultado['preview'], _, _ = montar_colecao_postman(construir_payloads(df_geracao.head(10), agrupar=agrupar_linhas), token_api, nome_colecao, json_compacto)
+        
+        elif tipo_colecao == "⚡ Coleção para Collection Runner (Recomendado)":
+            # Coleção para Collection Runner: dados de iteração escritos registro a registro direto dos payloads
+            formato_dados_runner = opcoes['formato_dados_runner']
+            with rastreio.etapa(f"{formato_dados_runner.upper()} de dados do Runner" + em_blocos) as etapa:
+                with gravar_artefato('dados_runner', formato_dados_runner) as saida:
+                    escrever = escrever_dados_runner_json if formato_dados_runner == 'json' else escrever_dados_runner
+                    total_requests = escrever(saida, payloads)
+                etapa['linhas'] = total_requests
             
-            # Adicionar ao arquivo de controle
-            control_data.append({"file": nome_arquivo})
+            with rastreio.etapa("JSON da coleção do Runner"):
+                colecao_runner = estrutura_colecao_runner(token_api, nome_colecao)
+                with gravar_artefato('colecao_runner', 'json') as saida:
+                    saida.write(json.dumps(colecao_runner, indent=2, ensure_ascii=False).encode('utf-8'))
+            resultado.update(colecao_runner=colecao_runner, total=total_requests, formato_dados_runner=opcoes['formato_dados_runner'])
         
-        # Criar arquivo de controle data.json
-        control_json = json.dumps(control_data, indent=2, ensure_ascii=False)
-        zip_file.writestr("data.json", control_json)
+        elif tipo_colecao == "📦 Todos os Artefatos (um ZIP)":
+            # Uma passada pelos payloads alimenta os três artefatos, gravados em paralelo
+            compressao, nivel = OPCOES_COMPRESSAO_ZIP[opcoes['compressao_zip']]
+            with rastreio.etapa(f"Todos os artefatos em paralelo ({opcoes['compressao_zip']})" + em_blocos) as etapa:
+                with gravar_artefato('pacote', 'zip') as saida:
+                    _, total_requests = exportar_todos_artefatos(payloads, token_api, nome_colecao, json_compacto, compressao, nivel, destino=saida)
+                etapa['linhas'] = resultado['total'] = total_requests
         
-        # Criar arquivo README com instruções
-        readme_text = f"""# Nibo API - JSONs Individuais
-Gerado em: {datetime.now().strftime('%d/%m/%Y às %H:%M')}
-
-## IMPORTANTE - API Nibo usa ApiToken no Header
-
-CORRETO: ApiToken: SEU_TOKEN_AQUI
-ERRADO: Authorization: Bearer SEU_TOKEN_AQUI
-
-## Endpoint da API:
-POST https://api.nibo.com.br/empresas/v1/schedules/debit
-
-## Headers necessarios:
-Content-Type: application/json
-ApiToken: SEU_TOKEN_AQUI
-
-## Arquivos inclusos:
-- {len(json_list)} arquivos JSON individuais
-- data.json: Arquivo de controle para Collection Runner
+        else:
+            # JSONs Individuais em ZIP
+            compressao, nivel = OPCOES_COMPRESSAO_ZIP[opcoes['compressao_zip']]
+            with rastreio.etapa(f"ZIP com JSONs individuais ({opcoes['compressao_zip']})" + em_blocos) as etapa:
+                with gravar_artefato('zip', 'zip') as saida:
+                    _, total_arquivos = criar_zip_com_jsons(payloads, compressao, nivel, destino=saida, compacto=json_compacto)
+                etapa['linhas'] = resultado['total'] = total_arquivos
+            resultado['preview'] = [nome_arquivo_json(i, json_data) for i, json_data in enumerate(construir_payloads(df_geracao.head(10), agrupar=agrupar_linhas))]
+    
+    if impressoes is not None:
+        # Só depois da geração: a próxima versão é comparada com o que virou artefato
+        with VersoesPlanilha() as versoes:
+            versoes.guardar(opcoes['nome_entrada'], impressoes)
+    if contagem_diario.get('ignorados'):
+        resultado['avisos'].append(f"🧾 {contagem_diario['ignorados']} agendamento(s) já confirmados no diário de envios ficaram de fora")
+    return resultado
 
-## Como usar no Postman Collection Runner:
+def botao_download(resultado, chave, **opcoes):
+    """Download de um artefato do armazém em disco, aberto só quando o botão é clicado
 
-1. Crie uma requisicao POST para o endpoint acima
-2. Adicione os headers mencionados
-3. No Pre-request Script, adicione o codigo para ler os arquivos
-4. No Collection Runner, selecione o arquivo data.json
-5. Execute a colecao
+    O Streamlit recebe o arquivo aberto e o lê direto do disco, sem uma cópia
+    em bytes montada aqui antes.
+    """
+    armazem, sessao, nome = ArmazemArtefatos(), resultado['id_sessao'], resultado['artefatos'][chave]
+    if not armazem.usar(sessao, nome):
+        st.warning(f"⌛ {opcoes['file_name']} já saiu do armazém em disco (sem uso há muito tempo ou falta de espaço): gere de novo")
+        return
+    st.download_button(data=lambda: armazem.abrir(sessao, nome), **opcoes)
 
-Veja o README completo no ZIP para instrucoes detalhadas.
-"""
-        zip_file.writestr("README.txt", readme_text)
+def mostrar_resultado(resultado):
+    """Mensagens, downloads e previews dos artefatos de uma geração concluída"""
+    tipo_colecao, gerado_em = resultado['tipo_colecao'], resultado['gerado_em']
+    for aviso in resultado['avisos']:
+        st.info(aviso)
     
-    zip_buffer.seek(0)
-    return zip_buffer
-
-def criar_colecao_com_runner(df, token_api, nome_colecao):
-    """Cria coleção otimizada para Collection Runner com arquivo de dados"""
-    json_list = []
-    data_file_list = []
+    if 'manifesto' in resultado:
+        manifesto = resultado['manifesto']
+        st.success(f"✅ Coleção dividida em {len(manifesto['partes'])} parte(s)! {resultado['total']} requisições criadas")
+        
+        st.info("💡 **Uso**: Descompacte e importe no Postman as coleções nibo_collection_NNN.json, uma de cada vez ou todas juntas")
+        
+        botao_download(
+            resultado, 'partes',
+            label="📥 Baixar Coleções (ZIP)",
+            file_name=f"nibo_collections_{gerado_em}.zip",
+            mime="application/zip",
+            use_container_width=True
+        )
+        
+        with st.expander("🗂️ Manifesto das partes"):
+            st.dataframe(
+                pd.DataFrame(manifesto['partes'], columns=['arquivo', 'agendamentos', 'primeiro', 'ultimo', 'bytes']),
+                use_container_width=True, hide_index=True
+            )
+        
+    elif tipo_colecao == "📋 Coleção Tradicional":
+        st.success(f"✅ Coleção tradicional gerada! {resultado['total']} requisições criadas")
+        
+        st.info("💡 **Uso**: Importe no Postman e execute cada requisição individualmente ou use 'Run Collection'")
+        
+        # Botão de download
+        botao_download(
+            resultado, 'colecao',
+            label="📥 Baixar Coleção Postman",
+            file_name=f"nibo_collection_{gerado_em}.json",
+            mime="application/json",
+            use_container_width=True
+        )
+        
+        # Mostrar preview
+        with st.expander("🔍 Preview da Coleção JSON"):
+            colecao_preview = resultado['preview']
+            st.json(colecao_preview, expanded=False)
+            if resultado['total'] > len(colecao_preview["item"]):
+                st.info(f"Mostrando as primeiras {len(colecao_preview['item'])} requisições de {resultado['total']} total")
+        
+    elif tipo_colecao == "⚡ Coleção para Collection Runner (Recomendado)":
+        formato_dados_runner = resultado['formato_dados_runner']
+        st.success(f"✅ Coleção para Runner gerada! {resultado['total']} registros preparados")
+        
+        # Downloads
+        col1, col2 = st.columns(2)
+        with col1:
+            botao_download(
+                resultado, 'colecao_runner',
+                label="📥 1️⃣ Baixar Coleção JSON",
+                file_name=f"nibo_runner_collection_{gerado_em}.json",
+                mime="application/json",
+                use_container_width=True
+            )
+        with col2:
+            botao_download(
+                resultado, 'dados_runner',
+                label=f"📊 2️⃣ Baixar Dados {formato_dados_runner.upper()}",
+                file_name=f"nibo_runner_data_{gerado_em}.{formato_dados_runner}",
+                mime="text/csv" if formato_dados_runner == 'csv' else "application/json",
+                use_container_width=True
+            )
+        
+        # Instruções de uso
+        with st.expander("📖 Como usar no Collection Runner", expanded=True):
+            st.markdown(f"""
+            ### 🎯 Passo a passo:
+            
+            1. **Baixe os 2 arquivos** acima (coleção JSON e dados {formato_dados_runner.upper()})
+            2. **Importe a coleção JSON** no Postman
+            3. **Abra a coleção** e clique em "Run" (ícone de play)
+            4. **Na aba "Data"**: Clique em "Select File" e escolha o arquivo de dados ({formato_dados_runner.upper()})
+            5. **Configure**:
+               - Iterations: Automático (baseado no arquivo de dados)
+               - Delay: 0 ms (a coleção ajusta o ritmo sozinha)
+            6. **Clique em "Run"** e acompanhe o progresso!
+            
+            ### ⚡ Vantagens do Collection Runner:
+            - ✅ **Mais eficiente** - Uma requisição configurável para todos os dados
+            - ✅ **Ritmo adaptativo** - Acelera enquanto a API responde bem; em 429/503 desacelera, espera o Retry-After e repete a iteração
+            - ✅ **Relatórios detalhados** - Veja sucessos/falhas em tempo real
+            - ✅ **Logs completos** - Debug facilitado no Console
+            - ✅ **Testes automáticos** - Validação de status code e resposta
+            
+            ### 🐛 Debug:
+            - Abra o Postman Console (View > Show Postman Console)
+            - Veja os logs de cada requisição em tempo real
+            - Identifique facilmente quais agendamentos falharam
+            - Acompanhe o atraso atual (`nibo_atraso_ms`) e a vazão (`nibo_sucessos_por_segundo`) nas variáveis da coleção
+            """)
+        
+        # Mostrar preview
+        with st.expander("🔍 Preview da Coleção JSON"):
+            st.json(resultado['colecao_runner'], expanded=False)
     
-    for i, row in df.iterrows():
-        # Pular linhas completamente vazias
-        if pd.isna(row).all():
-            continue
+    elif tipo_colecao == "📦 Todos os Artefatos (um ZIP)":
+        st.success(f"✅ Todos os artefatos gerados! {resultado['total']} agendamentos em cada um")
+        
+        botao_download(
+            resultado, 'pacote',
+            label="📦 Baixar Todos os Artefatos (ZIP)",
+            file_name=f"nibo_artefatos_{gerado_em}.zip",
+            mime="application/zip",
+            use_container_width=True
+        )
+        
+        with st.expander("📖 Conteúdo do ZIP", expanded=True):
+            st.markdown("""
+            - **nibo_collection.json**: Coleção tradicional, uma requisição por agendamento
+            - **nibo_runner_collection.json** + **nibo_runner_data.csv**: Coleção e dados para o Collection Runner
+            - **nibo_jsons.zip**: JSONs individuais, com data.json e README.txt
+            """)
+    
+    else:
+        # JSONs Individuais em ZIP
+        total_arquivos = resultado['total']
+        st.success(f"✅ ZIP com JSONs individuais gerado! {total_arquivos} arquivos criados")
+        
+        # Download do ZIP
+        botao_download(
+            resultado, 'zip',
+            label="📦 Baixar ZIP com JSONs Individuais",
+            file_name=f"nibo_jsons_{gerado_em}.zip",
+            mime="application/zip",
+            use_container_width=True
+        )
+        
+        # Instruções de uso
+        with st.expander("📖 Como usar os JSONs individuais", expanded=True):
+            st.markdown(f"""
+            ### 📦 Conteúdo do ZIP:
+            - **{total_arquivos} arquivos JSON** individuais (um por agendamento)
+            - **data.json**: Arquivo de controle para Collection Runner
+            - **README.txt**: Instruções de uso
             
-        json_data = {
-            "stakeholderId": str(row["stakeholderId"]) if pd.notna(row["stakeholderId"]) else "",
-            "description": str(row["description"]) if pd.notna(row["description"]) else "",
-            "reference": str(row["reference"]) if pd.notna(row["reference"]) else "",
-            "scheduleDate": str(row["date"]) if pd.notna(row["date"]) else "",
-            "dueDate": str(row["Vencimento"]) if pd.notna(row["Vencimento"]) else "",
-            "accrualDate": str(row["date"]) if pd.notna(row["date"]) else "",
-            "categories": [
-                {
-                    "categoryId": str(row["categoryId"]) if pd.notna(row["categoryId"]) else "",
-                    "value": float(row["value"]) if pd.notna(row["value"]) else 0.0
-                }
-            ],
-            "costCenterValueType": 0,
-            "costCenters": [
-                {
-                    "costCenterId": str(row["costCenterId"]) if pd.notna(row["costCenterId"]) else "",
-                    "value": float(row["value"]) if pd.notna(row["value"]) else 0.0
-                }
-            ]
-        }
+            ### 🔧 Opção 1 - Collection Runner (Recomendado):
+            1. **Extraia o ZIP** em uma pasta no seu computador
+            2. **Crie uma requisição POST** no Postman para a API Nibo
+            3. **Adicione os headers** (ApiToken)
+            4. **Use data.json** como Data File no Runner
+            
+            ### 📋 Opção 2 - Uso Manual:
+            - Cada arquivo JSON pode ser usado individualmente
+            - Copie e cole o conteúdo no body das requisições
+            - Ideal para testes específicos ou debugging
+            
+            ### 🎯 Vantagens dos JSONs separados:
+            - ✅ **Flexibilidade total** de uso
+            - ✅ **Fácil debugging** de registros específicos
+            - ✅ **Reutilização** de JSONs individuais
+            - ✅ **Controle granular** sobre cada requisição
+            """)
         
-        json_list.append(json_data)
-        # Arquivo de dados para o Runner
-        data_file_list.append({
-            "requestData": json.dumps(json_data, ensure_ascii=False),
-            "description": json_data["description"]
-        })
-    
-    # Coleção otimizada com Pre-request Script
-    pre_request_script = '''// Script para carregar dados dinamicamente no Collection Runner
-const requestData = pm.iterationData.get("requestData");
-
-if (requestData) {
-    // Define o body da requisição com os dados da iteração atual
-    pm.request.body.raw = requestData;
-    
-    // Log para debug
-    const data = JSON.parse(requestData);
-    console.log("✅ Enviando agendamento:", data.description);
-    console.log("Valor:", data.categories[0].value);
-} else {
-    console.error("❌ Dados não encontrados para esta iteração");
-}'''
-    
-    test_script = '''// Test Script para validar a resposta
-pm.test("Status code é 200 ou 201", function () {
-    pm.expect(pm.response.code).to.be.oneOf([200, 201]);
-});
-
-pm.test("Resposta não contém erro", function () {
-    const jsonData = pm.response.json();
-    pm.expect(jsonData.error).to.be.undefined;
-});
-
-// Log da resposta
-console.log("Resposta:", pm.response.json());'''
-    
-    colecao_runner = {
-        "info": {
-            "name": f"{nome_colecao} - Collection Runner",
-            "_postman_id": f"runner-generated-{datetime.now().strftime('%Y%m%d-%H%M%S')}",
-            "schema": "https://schema.getpostman.com/json/collection/v2.1.0/collection.json",
-            "description": f"Coleção otimizada para Collection Runner - {datetime.now().strftime('%d/%m/%Y às %H:%M')}\n\n⚠️ IMPORTANTE: Use 'ApiToken' no header, não 'Authorization'\n\nEndpoint: https://api.nibo.com.br/empresas/v1/schedules/debit"
-        },
-        "item": [
-            {
-                "name": "Criar Agendamento Nibo",
-                "event": [
-                    {
-                        "listen": "prerequest",
-                        "script": {
-                            "exec": pre_request_script.split('\n'),
-                            "type": "text/javascript"
-                        }
-                    },
-                    {
-                        "listen": "test",
-                        "script": {
-                            "exec": test_script.split('\n'),
-                            "type": "text/javascript"
-                        }
-                    }
-                ],
-                "request": {
-                    "method": "POST",
-                    "header": [
-                        {"key": "Content-Type", "value": "application/json", "type": "text"},
-                        {"key": "ApiToken", "value": token_api, "type": "text"}
-                    ],
-                    "url": {
-                        "raw": "https://api.nibo.com.br/empresas/v1/schedules/debit",
-                        "protocol": "https",
-                        "host": ["api", "nibo", "com", "br"],
-                        "path": ["empresas", "v1", "schedules", "debit"]
-                    },
-                    "body": {
-                        "mode": "raw",
-                        "raw": "// Este body será substituído pelo Pre-request Script\n{\n  \"stakeholderId\": \"\",\n  \"description\": \"\"\n}",
-                        "options": {
-                            "raw": {
-                                "language": "json"
-                            }
-                        }
-                    }
-                },
-                "response": []
-            }
-        ]
-    }
+        # Mostrar lista dos arquivos que serão criados
+        with st.expander("📋 Preview dos arquivos no ZIP"):
+            st.markdown("### Arquivos que serão gerados:")
+            for nome in resultado['preview']:
+                st.text(f"📄 {nome}")
+            
+            if total_arquivos > 10:
+                st.text(f"... e mais {total_arquivos - 10} arquivos")
+            
+            st.text("📄 data.json (arquivo de controle)")
+            st.text("📄 README.txt (instruções de uso)")
+    
+    mostrar_diagnostico(resultado['rastreio'])
+
+def acompanhar_trabalho(id_trabalho):
+    """Progresso da geração da sessão e, quando ela termina, os artefatos
+    
+    Roda como fragmento: enquanto o trabalho está ativo, só este trecho da
+    página é atualizado, a cada INTERVALO_PROGRESSO segundos.
+    """
+    fila = fila_trabalhos()
+    trabalho = fila.obter(id_trabalho)
+    if trabalho is None:
+        return
+    
+    if trabalho.ativo:
+        st.session_state['acompanhando_geracao'] = True
+        if trabalho.cancelando:
+            st.info("⏹️ Cancelando a geração...")
+        elif trabalho.estado == trabalho.NA_FILA:
+            st.info(f"⏳ Geração na fila, na posição {fila.posicao_na_fila(trabalho)}: "
+                    f"o servidor roda {fila.simultaneos} por vez, na ordem de chegada")
+        elif not trabalho.processadas:
+            st.progress(0.0, text="🔄 Preparando os agendamentos...")
+        else:
+            restante = trabalho.segundos_restantes()
+            st.progress(
+                trabalho.fracao(),
+                text=f"🔄 Gerando... {trabalho.processadas:,} de {trabalho.total:,} linhas · {trabalho.linhas_por_segundo():,.0f} linhas/s"
+                     + (f" · cerca de {restante:.0f}s restantes" if restante is not None else "")
+            )
+        if not trabalho.cancelando and st.button("⏹️ Cancelar Geração", key=f"cancelar_{trabalho.id}"):
+            trabalho.cancelar()
+        st.caption(f"Trabalho {trabalho.id}: {trabalho.descricao}")
+        return
+    
+    # Terminou enquanto o fragmento se atualizava sozinho: a página toda roda de novo, sem atualização periódica
+    if st.session_state.pop('acompanhando_geracao', False):
+        st.rerun()
     
-    return colecao_runner, data_file_list, len(json_list)
+    if trabalho.estado == trabalho.CANCELADO:
+        st.warning(f"⏹️ Geração cancelada{f' depois de {trabalho.processadas:,} linha(s)' if trabalho.processadas else ''}; nenhum artefato foi gerado")
+    elif trabalho.estado == trabalho.FALHOU:
+        st.error(f"❌ Erro ao gerar a coleção: {trabalho.erro}")
+    else:
+        mostrar_resultado(trabalho.resultado)
 
 # Interface principal
 st.title("💰 Nibo API - Gerador de Coleções Postman")
@@ -389,13 +656,79 @@ with st.sidebar:
         help="Nome que aparecerá na coleção do Postman"
     )
     
+    # Leitura em blocos para planilhas muito grandes
+    modo_streaming = st.checkbox(
+        "🌊 Modo streaming (planilhas grandes)",
+        help=f"Lê a planilha em blocos de {TAMANHO_BLOCO:,} linhas em vez de carregá-la inteira na memória"
+    )
+    
+    # Diário de envios: evita agendamentos duplicados ao repetir exportações/envios
+    pular_confirmados = st.checkbox(
+        "🧾 Pular agendamentos já confirmados",
+        value=True,
+        help=f"Consulta o diário de envios ({CAMINHO_DIARIO}) e deixa de fora os agendamentos que o Nibo já confirmou"
+    )
+    
+    # Linhas de um mesmo agendamento (rateado em várias categorias/centros de custo) viram uma requisição
+    agrupar_linhas = st.checkbox(
+        "🧩 Agrupar linhas do mesmo agendamento",
+        help="Junta as linhas com stakeholderId, reference, date e Vencimento iguais em um só agendamento, "
+             "com várias categorias e centros de custo: menos requisições à API"
+    )
+    
+    # Versão corrigida de uma planilha já gerada: só as linhas novas ou alteradas viram artefatos
+    so_alteracoes = st.checkbox(
+        "♻️ Gerar só linhas novas ou alteradas",
+        help="Compara com a última versão gerada desta planilha (pelo nome do arquivo) e deixa de fora as linhas sem mudança. Não vale no modo streaming"
+    )
+    
+    json_compacto = st.checkbox(
+        "🗜️ JSON compacto",
+        help=f"Bodies das requisições e arquivos do ZIP sem indentação: artefatos menores e geração mais rápida (serializador: {BACKEND_JSON})"
+    )
+    
+    # Cadastros do Nibo: a planilha pode trazer os nomes no lugar dos IDs
+    st.markdown("---")
+    st.markdown("### 📇 Cadastros do Nibo")
+    with CadastrosNibo() as cadastros:
+        importacoes = cadastros.importacoes()
+    for tipo, rotulo in ROTULOS_CADASTROS.items():
+        if tipo in importacoes:
+            arquivo_cadastro, importado_em, registros = importacoes[tipo]
+            st.caption(f"{rotulo}: {registros:,} registro(s) de {arquivo_cadastro} ({importado_em})")
+        else:
+            st.caption(f"{rotulo}: não importado")
+    
+    with st.expander("📥 Importar cadastros"):
+        st.caption("Exportações do Nibo em CSV, Excel ou JSON, com uma coluna de ID e uma de nome. Cada importação substitui o cadastro anterior")
+        arquivos_cadastro = {
+            tipo: st.file_uploader(rotulo, type=['csv', 'json', 'xlsx', 'xls'], key=f"cadastro_{tipo}")
+            for tipo, rotulo in ROTULOS_CADASTROS.items()
+        }
+        if st.button("📥 Importar", disabled=not any(arquivos_cadastro.values()), use_container_width=True):
+            try:
+                with CadastrosNibo() as cadastros:
+                    for tipo, arquivo_cadastro in arquivos_cadastro.items():
+                        if arquivo_cadastro is not None:
+                            cadastros.importar(tipo, *ler_cadastro(arquivo_cadastro, arquivo_cadastro.name), arquivo_cadastro.name)
+            except ValueError as e:
+                st.error(f"❌ Erro ao importar o cadastro: {e}")
+            else:
+                st.rerun()
+    
+    traduzir_nomes = st.checkbox(
+        "🔎 Traduzir nomes em IDs",
+        value=True,
+        disabled=not importacoes,
+        help="Nas colunas stakeholderId, categoryId e costCenterId, troca os nomes pelos IDs dos cadastros importados "
+             "(pelo nome exato ou sem acentos, maiúsculas e espaços extras). Valores que já são IDs ficam como estão"
+    )
+    versao_cadastros = tuple(importacoes.items()) if traduzir_nomes and importacoes else None
+    indices_nomes = indices_cadastros(versao_cadastros) if versao_cadastros else None
+    
     st.markdown("---")
     st.markdown("### 📊 Colunas Obrigatórias:")
-    colunas_obrigatorias = [
-        'stakeholderId', 'description', 'reference', 'date', 
-        'Vencimento', 'categoryId', 'value', 'costCenterId'
-    ]
-    for col in colunas_obrigatorias:
+    for col in COLUNAS_OBRIGATORIAS:
         st.text(f"• {col}")
     
     st.markdown("---")
@@ -406,49 +739,129 @@ with st.sidebar:
 # Área principal para upload de arquivo
 st.header("📁 Upload da Planilha")
 
-uploaded_file = st.file_uploader(
+# Planilhas enviadas e artefatos gerados ficam no armazém em disco, na pasta da sessão
+id_sessao = st.session_state.setdefault('id_sessao', uuid.uuid4().hex)
+armazem = ArmazemArtefatos()
+
+uploaded_files = st.file_uploader(
     "Escolha sua planilha:",
     type=['xlsx', 'xls', 'csv'],
-    help="Formatos aceitos: Excel (.xlsx, .xls) ou CSV (.csv)"
+    accept_multiple_files=True,
+    key=f"planilhas_{st.session_state.setdefault('versao_envio', 0)}",
+    help="Formatos aceitos: Excel (.xlsx, .xls) ou CSV (.csv). Com vários arquivos, ou abas em um arquivo, todos são lidos em paralelo e juntados, com a coluna 'origem'"
 )
+if uploaded_files:
+    # O Streamlit guarda o envio na memória até o seletor mudar: as planilhas vão para
+    # o disco e o seletor é trocado por um novo (outra chave), o que libera essa memória
+    st.session_state['planilhas'] = [(arquivo.name, *armazem.guardar_envio(id_sessao, arquivo)) for arquivo in uploaded_files]
+    st.session_state['versao_envio'] += 1
+    st.rerun()
 
-if uploaded_file is not None:
+planilhas = st.session_state.get('planilhas')
+if planilhas and not all(armazem.usar(id_sessao, nome_armazem) for _, nome_armazem, _ in planilhas):
+    st.warning("⌛ A planilha enviada já saiu do armazém em disco (sem uso há muito tempo ou falta de espaço): envie de novo")
+    planilhas = st.session_state['planilhas'] = None
+
+if planilhas:
+    col_arquivos, col_remover = st.columns([4, 1])
+    with col_arquivos:
+        st.markdown("📄 " + " · ".join(
+            f"**{nome}** ({armazem.tamanho(id_sessao, nome_armazem) / 2 ** 20:.2f} MB)" for nome, nome_armazem, _ in planilhas
+        ))
+    with col_remover:
+        if st.button("🗑️ Remover", use_container_width=True, help="Tira a planilha da sessão para enviar outra"):
+            for _, nome_armazem, _ in planilhas:
+                armazem.descartar(id_sessao, nome_armazem)
+            st.session_state['planilhas'] = None
+            st.rerun()
+    
     try:
-        # Ler o arquivo
-        if uploaded_file.name.endswith('.csv'):
-            df = pd.read_csv(uploaded_file)
+        # Ler os arquivos (ou reaproveitar a leitura feita em um rerun anterior)
+        hash_conteudo = hashlib.sha256()
+        for nome, _, hash_arquivo in planilhas:
+            hash_conteudo.update(nome.encode('utf-8'))
+            hash_conteudo.update(hash_arquivo.encode('ascii'))
+        hash_conteudo = hash_conteudo.hexdigest()
+        
+        nome_planilha, caminho_planilha = planilhas[0][0], armazem.caminho(id_sessao, planilhas[0][1])
+        varias_planilhas = len(planilhas) > 1 or contar_abas(planilhas[0][2], nome_planilha, caminho_planilha) > 1
+        if varias_planilhas:
+            df, resumo, relatorio, conversoes, etapas_leitura, fontes = analisar_varias_planilhas(
+                hash_conteudo, versao_cadastros, [(nome, armazem.caminho(id_sessao, nome_armazem)) for nome, nome_armazem, _ in planilhas], indices_nomes
+            )
+            nome_entrada = ", ".join(nome for nome, _, _ in planilhas)
+            if modo_streaming:
+                st.info("ℹ️ Com várias planilhas ou abas, a leitura é feita por inteiro, sem o modo streaming")
+                modo_streaming = False
         else:
-            df = pd.read_excel(uploaded_file)
+            df, resumo, relatorio, conversoes, etapas_leitura = analisar_planilha(
+                planilhas[0][2], nome_planilha, modo_streaming, versao_cadastros, caminho_planilha, indices_nomes
+            )
+            nome_entrada = nome_planilha
+        
+        st.success(f"✅ Arquivo carregado com sucesso! {resumo['linhas']} linha(s) encontrada(s)")
         
-        st.success(f"✅ Arquivo carregado com sucesso! {len(df)} linha(s) encontrada(s)")
+        if varias_planilhas:
+            with st.expander(f"📚 Planilhas e abas lidas ({len(fontes)})"):
+                st.dataframe(pd.DataFrame({
+                    'Origem': [fonte['origem'] for fonte in fontes],
+                    'Linhas': [fonte['linhas'] for fonte in fontes],
+                    'Colunas faltando': [", ".join(fonte['faltando']) for fonte in fontes],
+                }), use_container_width=True, hide_index=True)
+                if any(fonte['faltando'] for fonte in fontes):
+                    st.warning("⚠️ Abas sem as colunas obrigatórias ficaram de fora")
         
         # Mostrar preview dos dados
         with st.expander("👁️ Preview dos Dados", expanded=True):
             st.dataframe(df.head(10), use_container_width=True)
-            if len(df) > 10:
-                st.info(f"Mostrando as primeiras 10 linhas de {len(df)} total")
+            if resumo['linhas'] > 10:
+                st.info(f"Mostrando as primeiras 10 linhas de {resumo['linhas']} total")
         
         # Validar colunas obrigatórias
         if validar_colunas_obrigatorias(df):
             st.success("✅ Todas as colunas obrigatórias encontradas!")
             
-            # Validar dados
-            erros = validar_dados(df)
+            # Avisos de validação
+            erros = mensagens_validacao(relatorio)
             if erros:
                 with st.expander("⚠️ Avisos de Validação", expanded=True):
                     for erro in erros:
                         st.warning(erro)
+                    
+                    # Linhas exatas a corrigir na planilha
+                    st.markdown(f"**{len(relatorio['linhas'])} linha(s) com problema:**")
+                    st.dataframe(erros_por_linha(relatorio, LIMITE_LINHAS_COM_ERRO, df), use_container_width=True, hide_index=True)
+                    if len(relatorio['linhas']) > LIMITE_LINHAS_COM_ERRO:
+                        st.info(f"Mostrando as primeiras {LIMITE_LINHAS_COM_ERRO} linhas com problema; baixe o CSV para ver todas")
+                    st.download_button(
+                        label="📥 Baixar Linhas com Problema (CSV)",
+                        data=lambda: erros_por_linha(relatorio, df=df).to_csv(index=False, encoding='utf-8-sig'),
+                        file_name=f"nibo_validacao_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
+                        mime="text/csv"
+                    )
+            
+            # Nomes traduzidos em IDs pelos cadastros do Nibo
+            resolucao = resumo.get('resolucao')
+            if resolucao:
+                traduzidas = sum(resolucao['linhas_resolvidas'].values())
+                if traduzidas:
+                    st.info(f"🔎 {traduzidas} célula(s) com nome traduzida(s) em ID pelos cadastros do Nibo")
+                if resolucao['sem_id']:
+                    with st.expander(f"🔎 Nomes sem ID nos cadastros ({len(resolucao['sem_id'])})"):
+                        st.dataframe(tabela_nomes_sem_id(resolucao), use_container_width=True, hide_index=True)
+                        st.caption("Corrija o nome na planilha ou importe o cadastro atualizado na barra lateral. "
+                                   "Nomes ambíguos levam a mais de um ID: use o ID na planilha")
             
             # Estatísticas
             col1, col2, col3, col4 = st.columns(4)
             with col1:
-                st.metric("📊 Total de Linhas", len(df))
+                st.metric("📊 Total de Linhas", resumo['linhas'])
             with col2:
-                st.metric("💰 Valor Total", f"R$ {df['value'].sum():,.2f}")
+                st.metric("💰 Valor Total", f"R$ {resumo['valor_total']:,.2f}")
             with col3:
-                st.metric("🏢 Stakeholders Únicos", df['stakeholderId'].nunique())
+                st.metric("🏢 Stakeholders Únicos", resumo['stakeholders_unicos'])
             with col4:
-                st.metric("🏷️ Categorias Únicas", df['categoryId'].nunique())
+                st.metric("🏷️ Categorias Únicas", resumo['categorias_unicas'])
             
             # Opções de geração
             st.markdown("---")
@@ -456,165 +869,260 @@ if uploaded_file is not None:
             
             tipo_colecao = st.radio(
                 "Escolha o tipo de coleção:",
-                ["⚡ Coleção para Collection Runner (Recomendado)", "📋 Coleção Tradicional", "📁 JSONs Individuais (ZIP)"],
-                help="**Collection Runner**: Mais eficiente, uma requisição com dados externos (CSV)\n\n**Tradicional**: Uma requisição separada por linha da planilha\n\n**JSONs Individuais**: Cada linha vira um arquivo JSON separado"
+                ["⚡ Coleção para Collection Runner (Recomendado)", "📋 Coleção Tradicional", "📁 JSONs Individuais (ZIP)", "📦 Todos os Artefatos (um ZIP)"],
+                help="**Collection Runner**: Mais eficiente, uma requisição com dados externos (CSV)\n\n**Tradicional**: Uma requisição separada por linha da planilha\n\n**JSONs Individuais**: Cada linha vira um arquivo JSON separado\n\n**Todos os Artefatos**: Os três acima de uma vez só, em um único ZIP (ex.: para auditoria)"
             )
             
-            # Botão para gerar coleção
-            if st.button("🚀 Gerar Coleção", type="primary", use_container_width=True):
+            opcoes_geracao = {'tipo_colecao': tipo_colecao, 'max_itens': None, 'max_bytes': None, 'pastas': None}
+            if tipo_colecao in ("📁 JSONs Individuais (ZIP)", "📦 Todos os Artefatos (um ZIP)"):
+                opcoes_geracao['compressao_zip'] = st.selectbox(
+                    "🗜️ Compressão do ZIP:",
+                    list(OPCOES_COMPRESSAO_ZIP),
+                    help="Sem compressão gera o ZIP mais rápido, porém maior"
+                )
+            
+            if tipo_colecao == "⚡ Coleção para Collection Runner (Recomendado)":
+                opcoes_geracao['formato_dados_runner'] = FORMATOS_DADOS_RUNNER[st.selectbox(
+                    "📄 Arquivo de dados do Runner:",
+                    list(FORMATOS_DADOS_RUNNER),
+                    help="O JSON leva cada agendamento como objeto, sem aspas escapadas; recomendado para lotes grandes"
+                )]
+            
+            if tipo_colecao == "📋 Coleção Tradicional":
+                col_itens, col_mb, col_pastas = st.columns(3)
+                with col_itens:
+                    max_itens = st.number_input("✂️ Máx. requisições por coleção", min_value=0, value=0, step=500,
+                                                help="Divide a coleção em várias menores; 0 = sem limite")
+                with col_mb:
+                    max_mb = st.number_input("✂️ Máx. MB por coleção", min_value=0.0, value=0.0, step=5.0,
+                                             help="Divide a coleção pelo tamanho do arquivo; 0 = sem limite")
+                with col_pastas:
+                    pastas = st.selectbox("📂 Pastas", list(OPCOES_PASTAS),
+                                          help="Agrupa as requisições de cada coleção em pastas do Postman")
+                opcoes_geracao.update(max_itens=int(max_itens) or None, max_bytes=int(max_mb * 2 ** 20) or None, pastas=OPCOES_PASTAS[pastas])
+            
+            # Botão para gerar coleção: a geração roda em segundo plano, no pool do servidor
+            fila = fila_trabalhos()
+            trabalho = fila.obter(st.session_state.get('trabalho_geracao'))
+            em_andamento = trabalho is not None and trabalho.ativo
+            gerar = st.button("🚀 Gerar Coleção", type="primary", use_container_width=True, disabled=em_andamento)
+            if gerar and not em_andamento:
                 if not token_api:
                     st.error("❌ Por favor, insira o token da API Nibo na barra lateral")
                 elif not nome_colecao:
                     st.error("❌ Por favor, insira um nome para a coleção")
                 else:
-                    with st.spinner("🔄 Gerando coleção Postman..."):
-                        if tipo_colecao == "📋 Coleção Tradicional":
-                            # Coleção tradicional
-                            colecao, total_requests, _ = converter_planilha_para_json(df, token_api, nome_colecao)
-                            
-                            json_string = json.dumps(colecao, indent=2, ensure_ascii=False)
-                            
-                            st.success(f"✅ Coleção tradicional gerada! {total_requests} requisições criadas")
-                            
-                            st.info("💡 **Uso**: Importe no Postman e execute cada requisição individualmente ou use 'Run Collection'")
-                            
-                            # Botão de download
-                            st.download_button(
-                                label="📥 Baixar Coleção Postman",
-                                data=json_string,
-                                file_name=f"nibo_collection_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json",
-                                mime="application/json",
-                                use_container_width=True
-                            )
-                            
-                            # Mostrar preview
-                            with st.expander("🔍 Preview da Coleção JSON"):
-                                st.json(colecao, expanded=False)
-                            
-                        elif tipo_colecao == "⚡ Coleção para Collection Runner (Recomendado)":
-                            # Coleção para Collection Runner
-                            colecao_runner, data_file, total_requests = criar_colecao_com_runner(df, token_api, nome_colecao)
-                            
-                            # Criar arquivo de dados CSV para o runner
-                            df_runner = pd.DataFrame(data_file)
-                            csv_data = df_runner.to_csv(index=False, encoding='utf-8-sig')
-                            
-                            json_string = json.dumps(colecao_runner, indent=2, ensure_ascii=False)
-                            
-                            st.success(f"✅ Coleção para Runner gerada! {total_requests} registros preparados")
-                            
-                            # Downloads
-                            col1, col2 = st.columns(2)
-                            with col1:
-                                st.download_button(
-                                    label="📥 1️⃣ Baixar Coleção JSON",
-                                    data=json_string,
-                                    file_name=f"nibo_runner_collection_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json",
-                                    mime="application/json",
-                                    use_container_width=True
-                                )
-                            with col2:
-                                st.download_button(
-                                    label="📊 2️⃣ Baixar Dados CSV",
-                                    data=csv_data,
-                                    file_name=f"nibo_runner_data_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
-                                    mime="text/csv",
-                                    use_container_width=True
-                                )
-                            
-                            # Instruções de uso
-                            with st.expander("📖 Como usar no Collection Runner", expanded=True):
-                                st.markdown("""
-                                ### 🎯 Passo a passo:
-                                
-                                1. **Baixe os 2 arquivos** acima (JSON e CSV)
-                                2. **Importe a coleção JSON** no Postman
-                                3. **Abra a coleção** e clique em "Run" (ícone de play)
-                                4. **Na aba "Data"**: Clique em "Select File" e escolha o arquivo CSV
-                                5. **Configure**:
-                                   - Iterations: Automático (baseado no CSV)
-                                   - Delay: 500ms (recomendado)
-                                6. **Clique em "Run"** e acompanhe o progresso!
-                                
-                                ### ⚡ Vantagens do Collection Runner:
-                                - ✅ **Mais eficiente** - Uma requisição configurável para todos os dados
-                                - ✅ **Controle de velocidade** - Delay entre requisições evita sobrecarga
-                                - ✅ **Relatórios detalhados** - Veja sucessos/falhas em tempo real
-                                - ✅ **Logs completos** - Debug facilitado no Console
-                                - ✅ **Testes automáticos** - Validação de status code e resposta
-                                
-                                ### 🐛 Debug:
-                                - Abra o Postman Console (View > Show Postman Console)
-                                - Veja os logs de cada requisição em tempo real
-                                - Identifique facilmente quais agendamentos falharam
-                                """)
-                            
-                            # Mostrar preview
-                            with st.expander("🔍 Preview da Coleção JSON"):
-                                st.json(colecao_runner, expanded=False)
+                    opcoes_geracao.update(
+                        token_api=token_api,
+                        nome_colecao=nome_colecao,
+                        json_compacto=json_compacto,
+                        modo_streaming=modo_streaming,
+                        agrupar_linhas=agrupar_linhas,
+                        pular_confirmados=pular_confirmados,
+                        so_alteracoes=so_alteracoes,
+                        nome_entrada=nome_entrada,
+                        etapas_leitura=etapas_leitura,
+                        indices_cadastros=indices_nomes,
+                        id_sessao=id_sessao,
+                    )
+                    
+                    # Os artefatos da geração anterior da sessão saem do armazém junto com ela
+                    if trabalho is not None:
+                        fila.descartar(trabalho.id)
+                        armazem.descartar(id_sessao, f"{trabalho.id}_")
+                    # No modo streaming o trabalho lê de novo a planilha do armazém
+                    trabalho = fila.enviar(gerar_artefatos, f"{tipo_colecao} · {nome_entrada}", resumo['linhas'],
+                                           df, conversoes, caminho_planilha if modo_streaming else None, opcoes_geracao)
+                    st.session_state['trabalho_geracao'] = trabalho.id
+                    st.rerun()
+            
+            if trabalho is not None:
+                st.fragment(run_every=INTERVALO_PROGRESSO if trabalho.ativo else None)(acompanhar_trabalho)(trabalho.id)
+            
+            # Conciliação de uma execução do Runner: o resultado de cada linha e o reenvio só das falhas
+            st.markdown("---")
+            st.subheader("🧾 Conciliar Resultados do Runner")
+            st.info("💡 Envie o relatório JSON de uma execução da coleção do Runner (Newman com `-r json`, ou \"Export Results\" no Runner do Postman) "
+                    "para ver o resultado de cada linha da planilha e baixar um lote de reenvio só com as falhas")
+            
+            col1, col2 = st.columns(2)
+            with col1:
+                relatorios_execucao = st.file_uploader(
+                    "📑 Relatórios da execução (JSON):",
+                    type=['json'],
+                    accept_multiple_files=True,
+                    key="relatorios_execucao",
+                    help="Com vários relatórios (ex.: a execução e depois o reenvio), vale o resultado mais recente de cada agendamento: envie do mais antigo ao mais recente"
+                )
+            with col2:
+                dados_execucao = st.file_uploader(
+                    "📄 Arquivo de dados usado na execução:",
+                    type=['csv', 'json'],
+                    key="dados_execucao",
+                    help="Necessário para os relatórios do Runner do Postman, que não trazem o body de cada iteração"
+                )
+            
+            if relatorios_execucao and modo_streaming:
+                st.info("ℹ️ A conciliação lê a planilha inteira: desligue o modo streaming para conciliar")
+            elif relatorios_execucao:
+                hash_relatorios = hashlib.sha256()
+                for arquivo in relatorios_execucao + ([dados_execucao] if dados_execucao is not None else []):
+                    hash_relatorios.update(arquivo.name.encode('utf-8'))
+                    hash_relatorios.update(arquivo.getbuffer())
+                resumo_conciliacao, tabela, falhas = conciliar_execucao(
+                    hash_conteudo, hash_relatorios.hexdigest(), agrupar_linhas, versao_cadastros, df, conversoes, relatorios_execucao, dados_execucao
+                )
+                
+                col1, col2, col3, col4 = st.columns(4)
+                with col1:
+                    st.metric("🔁 Iterações", resumo_conciliacao['iteracoes'])
+                with col2:
+                    st.metric("✅ Com Sucesso", resumo_conciliacao['com_sucesso'])
+                with col3:
+                    st.metric("❌ Com Falha", resumo_conciliacao['com_falha'])
+                with col4:
+                    st.metric("⏸️ Não Executados", resumo_conciliacao['nao_executados'])
+                
+                if resumo_conciliacao['sem_correspondencia']:
+                    st.warning(
+                        f"⚠️ {resumo_conciliacao['sem_correspondencia']} iteração(ões) sem linha correspondente na planilha. "
+                        + ("Relatórios do Runner do Postman precisam do arquivo de dados usado na execução. " if dados_execucao is None else "")
+                        + "Confira também se a opção de agrupar linhas é a mesma da geração"
+                    )
+                if resumo_conciliacao['registrados_diario']:
+                    st.caption(
+                        f"🧾 {resumo_conciliacao['registrados_diario']} agendamento(s) criados pelo Runner registrados no diário de envios: "
+                        "ficam fora do reenvio e das exportações que pulam os já confirmados"
+                    )
+                if resumo_conciliacao['ja_confirmados']:
+                    st.info(f"🧾 {resumo_conciliacao['ja_confirmados']} falha(s) já confirmada(s) no diário de envios ficaram fora do lote de reenvio")
+                
+                tabela_falhas = tabela[tabela['Situação'] == FALHA]
+                if len(tabela_falhas):
+                    st.dataframe(tabela_falhas.head(LIMITE_LINHAS_COM_ERRO), use_container_width=True, hide_index=True)
+                    if len(tabela_falhas) > LIMITE_LINHAS_COM_ERRO:
+                        st.info(f"Mostrando os primeiros {LIMITE_LINHAS_COM_ERRO} agendamentos com falha; baixe o CSV para ver todos")
+                st.download_button(
+                    label="📥 Baixar Conciliação (CSV)",
+                    data=lambda: tabela.to_csv(index=False, encoding='utf-8-sig'),
+                    file_name=f"nibo_conciliacao_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
+                    mime="text/csv"
+                )
+                
+                if not falhas:
+                    st.success("✅ Nenhum agendamento com falha: nada a reenviar")
+                elif not token_api:
+                    st.info("🔑 Insira o token da API Nibo na barra lateral para baixar o lote de reenvio")
+                else:
+                    formato_reenvio = FORMATOS_DADOS_RUNNER[st.selectbox(
+                        "📄 Arquivo de dados do reenvio:",
+                        list(FORMATOS_DADOS_RUNNER),
+                        key="formato_reenvio"
+                    )]
+                    def dados_reenvio():
+                        with io.BytesIO() as arquivo_dados:
+                            (escrever_dados_runner_json if formato_reenvio == 'json' else escrever_dados_runner)(arquivo_dados, falhas)
+                            return arquivo_dados.getvalue()
+                    
+                    col1, col2 = st.columns(2)
+                    with col1:
+                        st.download_button(
+                            label=f"📥 Baixar Coleção de Reenvio ({len(falhas)} falhas)",
+                            data=json.dumps(estrutura_colecao_runner(token_api, f"{nome_colecao} - reenvio"), indent=2, ensure_ascii=False),
+                            file_name=f"nibo_reenvio_collection_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json",
+                            mime="application/json",
+                            use_container_width=True
+                        )
+                    with col2:
+                        st.download_button(
+                            label=f"📊 Baixar Dados do Reenvio {formato_reenvio.upper()}",
+                            data=dados_reenvio,
+                            file_name=f"nibo_reenvio_data_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{formato_reenvio}",
+                            mime="text/csv" if formato_reenvio == 'csv' else "application/json",
+                            use_container_width=True
+                        )
+            
+            # Envio direto, sem Postman
+            st.markdown("---")
+            st.subheader("📤 Enviar Direto para o Nibo")
+            st.info(f"💡 Os agendamentos são enviados em paralelo para `{URL_AGENDAMENTOS}`, com limite de taxa e novas tentativas em 429/5xx")
+            
+            col1, col2, col3 = st.columns(3)
+            with col1:
+                concorrencia = st.number_input("🔀 Requisições simultâneas", min_value=1, max_value=64, value=8)
+            with col2:
+                requisicoes_por_segundo = st.number_input("⏱️ Limite de requisições/s", min_value=0.0, max_value=200.0, value=5.0, step=0.5, help="0 = sem limite")
+            with col3:
+                tentativas = st.number_input("🔁 Novas tentativas em 429/5xx", min_value=0, max_value=10, value=5)
+            
+            if st.button("📤 Enviar Agendamentos", use_container_width=True):
+                if not token_api:
+                    st.error("❌ Por favor, insira o token da API Nibo na barra lateral")
+                else:
+                    progresso = st.progress(0.0)
+                    painel_envio = st.empty()
+                    
+                    def mostrar_progresso(parcial):
+                        # No modo streaming o total só é conhecido no fim: sem barra parcial nem estimativa
+                        estimativa = ""
+                        if parcial['total']:
+                            progresso.progress(min(1.0, parcial['concluidos'] / parcial['total']))
+                            if parcial['por_segundo']:
+                                estimativa = f" · ⏳ faltam ~{(parcial['total'] - parcial['concluidos']) / parcial['por_segundo']:.0f}s"
+                        painel_envio.markdown(
+                            f"**{parcial['concluidos']}**" + (f" de {parcial['total']}" if parcial['total'] else "") + " enviados · "
+                            f"✅ {parcial['sucessos']} · ❌ {parcial['falhas']} · "
+                            f"⚡ {parcial['por_segundo']:.1f} req/s · ⏱️ p50 {parcial['latencia_p50']:.0f} ms · p95 {parcial['latencia_p95']:.0f} ms"
+                            + estimativa
+                        )
+                    
+                    # Cada confirmação vai para o diário assim que o Nibo responde; um envio
+                    # interrompido pode ser repetido e continua de onde parou
+                    contagem_diario = {}
+                    planilha = mapear_arquivo(caminho_planilha, nome_planilha) if modo_streaming else contextlib.nullcontext()
+                    with DiarioEnvios() as diario, planilha:
+                        payloads = payloads_da_planilha(planilha, df, modo_streaming, conversoes, agrupar_linhas, indices_nomes)
+                        if pular_confirmados:
+                            payloads = diario.filtrar_pendentes(payloads, contagem_diario)
+                        if not modo_streaming:
+                            # Total do progresso: os agendamentos enviados de fato, depois de agrupar e de consultar o diário
+                            payloads = list(payloads)
                         
-                        else:
-                            # JSONs Individuais em ZIP
-                            json_list = criar_jsons_individuais(df)
-                            zip_data = criar_zip_com_jsons(json_list)
-                            
-                            st.success(f"✅ ZIP com JSONs individuais gerado! {len(json_list)} arquivos criados")
-                            
-                            # Download do ZIP
-                            st.download_button(
-                                label="📦 Baixar ZIP com JSONs Individuais",
-                                data=zip_data.getvalue(),
-                                file_name=f"nibo_jsons_{datetime.now().strftime('%Y%m%d_%H%M%S')}.zip",
-                                mime="application/zip",
-                                use_container_width=True
-                            )
-                            
-                            # Instruções de uso
-                            with st.expander("📖 Como usar os JSONs individuais", expanded=True):
-                                st.markdown(f"""
-                                ### 📦 Conteúdo do ZIP:
-                                - **{len(json_list)} arquivos JSON** individuais (um por agendamento)
-                                - **data.json**: Arquivo de controle para Collection Runner
-                                - **README.txt**: Instruções de uso
-                                
-                                ### 🔧 Opção 1 - Collection Runner (Recomendado):
-                                1. **Extraia o ZIP** em uma pasta no seu computador
-                                2. **Crie uma requisição POST** no Postman para a API Nibo
-                                3. **Adicione os headers** (ApiToken)
-                                4. **Use data.json** como Data File no Runner
-                                
-                                ### 📋 Opção 2 - Uso Manual:
-                                - Cada arquivo JSON pode ser usado individualmente
-                                - Copie e cole o conteúdo no body das requisições
-                                - Ideal para testes específicos ou debugging
-                                
-                                ### 🎯 Vantagens dos JSONs separados:
-                                - ✅ **Flexibilidade total** de uso
-                                - ✅ **Fácil debugging** de registros específicos
-                                - ✅ **Reutilização** de JSONs individuais
-                                - ✅ **Controle granular** sobre cada requisição
-                                """)
-                            
-                            # Mostrar lista dos arquivos que serão criados
-                            with st.expander("📋 Preview dos arquivos no ZIP"):
-                                st.markdown("### Arquivos que serão gerados:")
-                                for i, json_data in enumerate(json_list[:10]):
-                                    descricao_limpa = "".join(c for c in json_data["description"] if c.isalnum() or c in (' ', '-', '_')).rstrip()
-                                    nome_arquivo = f"agendamento_{i+1:03d}_{descricao_limpa[:30]}.json"
-                                    st.text(f"📄 {nome_arquivo}")
-                                
-                                if len(json_list) > 10:
-                                    st.text(f"... e mais {len(json_list) - 10} arquivos")
-                                
-                                st.text("📄 data.json (arquivo de controle)")
-                                st.text("📄 README.txt (instruções de uso)")
+                        resultado_envio = asyncio.run(enviar_agendamentos(
+                            payloads,
+                            token_api,
+                            concorrencia=int(concorrencia),
+                            requisicoes_por_segundo=requisicoes_por_segundo,
+                            tentativas=int(tentativas),
+                            total=None if modo_streaming else len(payloads),
+                            ao_progredir=mostrar_progresso,
+                            ao_confirmar=diario.registrar_confirmacao
+                        ))
+                    progresso.progress(1.0)
+                    
+                    if contagem_diario.get('ignorados'):
+                        st.info(f"🧾 {contagem_diario['ignorados']} agendamento(s) já confirmados no diário de envios foram pulados")
+                    
+                    if resultado_envio['falhas']:
+                        st.error(f"❌ {resultado_envio['falhas']} agendamento(s) falharam de {resultado_envio['concluidos']} enviados")
+                        df_falhas = pd.DataFrame(resultado_envio['lista_falhas'])
+                        st.dataframe(df_falhas, use_container_width=True)
+                        st.download_button(
+                            label="📥 Baixar Falhas (CSV)",
+                            data=df_falhas.to_csv(index=False, encoding='utf-8-sig'),
+                            file_name=f"nibo_falhas_envio_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
+                            mime="text/csv",
+                            use_container_width=True
+                        )
+                    else:
+                        st.success(f"✅ {resultado_envio['sucessos']} agendamento(s) enviados com sucesso em {resultado_envio['duracao']:.1f}s")
     
     except Exception as e:
         st.error(f"❌ Erro ao processar o arquivo: {str(e)}")
         st.info("💡 Verifique se o arquivo está no formato correto e não está corrompido")
 
 else:
-    st.info("👆 Faça upload de uma planilha para começar")
+    st.info("👆 Faça upload de uma ou mais planilhas para começar")
 
 # Footer
 st.markdown("---")
@@ -0,0 +1,144 @@
+"""Armazém em disco das planilhas enviadas e dos artefatos gerados, por sessão
+
+O Streamlit guarda na memória cada arquivo enviado e cada `data` passado ao
+st.download_button, e refaz isso a cada rerun; com várias pessoas gerando
+lotes grandes, a memória do servidor só cresce. Aqui as planilhas enviadas
+vão para o disco (e são lidas mapeadas em memória, pelo cache de páginas do
+sistema) e os artefatos são gravados direto em arquivo, cada sessão em seu
+diretório. Os downloads abrem o arquivo só quando o botão é clicado, e
+então o Streamlit lê esse arquivo para a sua memória de mídias.
+
+O armazém inteiro tem um teto de tamanho (LIMITE_ARMAZEM_MB): passando dele,
+saem os arquivos usados há mais tempo, de qualquer sessão. Arquivos sem uso
+há mais de VALIDADE_ARMAZEM segundos também saem.
+"""
+import os
+import mmap
+import time
+import uuid
+import shutil
+import hashlib
+import tempfile
+import contextlib
+
+DIRETORIO_ARMAZEM = os.environ.get("NIBO_ARMAZEM", os.path.join(tempfile.gettempdir(), "nibo_armazem"))
+
+# Teto do armazém (todas as sessões), em MB
+LIMITE_ARMAZEM_MB = float(os.environ.get("NIBO_ARMAZEM_MB", 2048))
+
+# Segundos sem uso até um arquivo ser descartado
+VALIDADE_ARMAZEM = float(os.environ.get("NIBO_ARMAZEM_VALIDADE", 3600))
+
+class ArquivoMapeado(mmap.mmap):
+    """Arquivo mapeado em memória, com o `name` que as leituras usam para decidir o formato"""
+
+    def seekable(self):
+        return True
+
+    def readable(self):
+        return True
+
+def mapear_arquivo(caminho, nome=None):
+    """ArquivoMapeado (só leitura) do arquivo, com `nome` no lugar do caminho em `name`"""
+    with open(caminho, 'rb') as arquivo:
+        mapeado = ArquivoMapeado(arquivo.fileno(), 0, access=mmap.ACCESS_READ)
+    mapeado.name = nome or caminho
+    return mapeado
+
+class ArmazemArtefatos:
+    """Arquivos de cada sessão em disco, com teto de tamanho, validade e descarte dos usados há mais tempo"""
+
+    def __init__(self, diretorio=DIRETORIO_ARMAZEM, limite_mb=LIMITE_ARMAZEM_MB, validade=VALIDADE_ARMAZEM):
+        self.diretorio = diretorio
+        self.limite_bytes = limite_mb * 2 ** 20
+        self.validade = validade
+
+    def caminho(self, sessao, nome):
+        return os.path.join(self.diretorio, sessao, nome)
+
+    @contextlib.contextmanager
+    def gravar(self, sessao, nome):
+        """Arquivo binário onde gravar `nome`; só entra no armazém se o bloco `with` terminar sem erro"""
+        final = self.caminho(sessao, nome)
+        os.makedirs(os.path.dirname(final), exist_ok=True)
+        # Gravado com outro nome e renomeado no fim: um download nunca pega um arquivo pela metade
+        temporario = self.caminho(sessao, f"parcial_{uuid.uuid4().hex[:8]}_{nome}")
+        try:
+            with open(temporario, 'wb') as arquivo:
+                yield arquivo
+            os.replace(temporario, final)
+        except BaseException:
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(temporario)
+            raise
+        self.descartar_antigos(manter={final})
+
+    def guardar_envio(self, sessao, arquivo):
+        """Copia uma planilha enviada (UploadedFile) para o armazém, sem duplicar o conteúdo na memória
+        
+        Retorna o nome no armazém, com o hash do conteúdo, e o hash.
+        """
+        hash_conteudo = hashlib.sha256(arquivo.getbuffer()).hexdigest()
+        nome = f"envio_{hash_conteudo[:16]}{os.path.splitext(arquivo.name)[1].lower()}"
+        if not self.usar(sessao, nome):
+            with self.gravar(sessao, nome) as destino:
+                destino.write(arquivo.getbuffer())
+        return nome, hash_conteudo
+
+    def usar(self, sessao, nome):
+        """Marca o arquivo como usado agora, para o descarte; False se ele já foi descartado"""
+        try:
+            os.utime(self.caminho(sessao, nome))
+        except FileNotFoundError:
+            return False
+        return True
+
+    def tamanho(self, sessao, nome):
+        return os.path.getsize(self.caminho(sessao, nome))
+
+    def abrir(self, sessao, nome):
+        """Arquivo aberto para leitura binária; FileNotFoundError se ele já tiver sido descartado"""
+        return open(self.caminho(sessao, nome), 'rb')
+
+    def descartar(self, sessao, prefixo=""):
+        """Apaga os arquivos da sessão que começam com `prefixo` (todos, sem prefixo)"""
+        pasta = os.path.join(self.diretorio, sessao)
+        if not prefixo:
+            shutil.rmtree(pasta, ignore_errors=True)
+            return
+        with contextlib.suppress(FileNotFoundError):
+            for entrada in os.scandir(pasta):
+                if entrada.name.startswith(prefixo):
+                    with contextlib.suppress(FileNotFoundError):
+                        os.remove(entrada.path)
+
+    def descartar_antigos(self, manter=()):
+        """Apaga os arquivos vencidos e, se o armazém passar do teto, os usados há mais tempo
+        
+        Arquivos em `manter` (caminhos) ficam mesmo acima do teto.
+        """
+        agora = time.time()
+        arquivos = []
+        with contextlib.suppress(FileNotFoundError):
+            for pasta in os.scandir(self.diretorio):
+                if not pasta.is_dir():
+                    continue
+                with contextlib.suppress(FileNotFoundError):
+                    for entrada in os.scandir(pasta.path):
+                        try:
+                            estado = entrada.stat()
+                        except FileNotFoundError:  # apagado por outra thread
+                            continue
+                        arquivos.append((estado.st_mtime, estado.st_size, entrada.path, entrada.name.startswith('parcial_')))
+        
+        # Gravações em andamento não contam no teto; as abandonadas saem quando vencem
+        total = sum(tamanho for _, tamanho, _, parcial in arquivos if not parcial)
+        for modificado, tamanho, caminho, parcial in sorted(arquivos):
+            vencido = agora - modificado > self.validade
+            acima_do_teto = not parcial and total > self.limite_bytes
+            if caminho in manter or not (vencido or acima_do_teto):
+                continue
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(caminho)
+            if not parcial:
+                total -= tamanho
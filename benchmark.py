@@ -0,0 +1,245 @@
+"""Benchmark da geração: planilhas sintéticas e tempo/memória de cada etapa
+
+Gera planilhas realistas com as colunas obrigatórias (1k, 100k e 1M linhas,
+em CSV e XLSX), mede cada etapa do núcleo e acrescenta os resultados em um
+arquivo JSON Lines, um registro por etapa, marcado com o commit atual:
+
+    python benchmark.py
+    python benchmark.py --tamanhos 1000 100000 --formatos csv -r 5
+
+As planilhas geradas ficam no diretório de dados e são reaproveitadas entre
+execuções. O tempo é o melhor de `--repeticoes` execuções (padrão: 3, ou 1
+a partir de 100k linhas); o pico de memória
+(tracemalloc) é medido em uma execução à parte, para não distorcer o tempo.
+A leitura pelo cache usa um diretório temporário, só do benchmark, e é
+medida com o cache já gravado.
+"""
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import tempfile
+import tracemalloc
+import subprocess
+from datetime import datetime
+import numpy as np
+import pandas as pd
+import openpyxl
+from cache_planilhas import ler_planilha_com_cache
+from nibo_core import (
+    COLUNAS_OBRIGATORIAS,
+    ler_planilha,
+    validar_dados,
+    construir_payloads,
+    converter_planilha_para_json,
+    criar_colecao_com_runner,
+    criar_zip_com_jsons,
+)
+
+TAMANHOS_PADRAO = [1000, 100000, 1000000]
+
+# Sem --repeticoes, planilhas a partir deste tamanho são cronometradas uma vez só
+LINHAS_REPETICAO_UNICA = 100000
+FORMATOS = ['csv', 'xlsx']
+
+# Cadastros do Nibo usados pelas planilhas sintéticas
+QUANTIDADE_STAKEHOLDERS = 500
+QUANTIDADE_CATEGORIAS = 40
+QUANTIDADE_CENTROS_CUSTO = 12
+
+DESCRICOES = [
+    "Pagamento fornecedor", "Aluguel escritório", "Serviços de contabilidade", "Licença de software",
+    "Energia elétrica", "Manutenção de equipamentos", "Frete e transporte", "Honorários advocatícios",
+]
+
+def _guids(rng, quantidade):
+    """GUIDs aleatórios, no formato dos IDs do Nibo"""
+    digitos = [f"{a:016x}{b:016x}" for a, b in rng.integers(0, 2 ** 63, size=(quantidade, 2)).tolist()]
+    return np.array([f"{g[:8]}-{g[8:12]}-{g[12:16]}-{g[16:20]}-{g[20:]}" for g in digitos], dtype=object)
+
+def gerar_planilha(linhas, semente=0, taxa_erros=0.0):
+    """DataFrame sintético com as colunas obrigatórias
+
+    Stakeholders, categorias e centros de custo vêm de cadastros fixos, o
+    vencimento fica até 60 dias depois da data e os valores seguem uma
+    distribuição log-normal. Com `taxa_erros`, essa fração das linhas recebe
+    um stakeholder vazio ou uma categoria fora do formato GUID (erros que a
+    validação aponta, mas que não impedem a geração dos artefatos).
+    """
+    rng = np.random.default_rng(semente)
+    stakeholders = _guids(rng, QUANTIDADE_STAKEHOLDERS)
+    categorias = _guids(rng, QUANTIDADE_CATEGORIAS)
+    centros_custo = _guids(rng, QUANTIDADE_CENTROS_CUSTO)
+
+    datas = pd.Timestamp('2024-01-01') + pd.to_timedelta(rng.integers(0, 365, linhas), unit='D')
+    df = pd.DataFrame({
+        'stakeholderId': stakeholders[rng.integers(0, QUANTIDADE_STAKEHOLDERS, linhas)],
+        'description': [f"{DESCRICOES[i % len(DESCRICOES)]} {i + 1}" for i in range(linhas)],
+        'reference': [f"NF {n}" for n in rng.integers(1000, 999999, linhas).tolist()],
+        'date': datas,
+        'Vencimento': datas + pd.to_timedelta(rng.integers(0, 61, linhas), unit='D'),
+        'categoryId': categorias[rng.integers(0, QUANTIDADE_CATEGORIAS, linhas)],
+        'value': np.round(rng.lognormal(6.5, 1.2, linhas), 2),
+        'costCenterId': centros_custo[rng.integers(0, QUANTIDADE_CENTROS_CUSTO, linhas)],
+    }, columns=COLUNAS_OBRIGATORIAS)
+
+    if taxa_erros:
+        com_erro = np.flatnonzero(rng.random(linhas) < taxa_erros)
+        df.loc[com_erro[::2], 'stakeholderId'] = None
+        df.loc[com_erro[1::2], 'categoryId'] = 'Despesas gerais'
+    return df
+
+def gravar_planilha(df, caminho):
+    """Grava a planilha em CSV ou XLSX (modo write_only do openpyxl, que aguenta 1M de linhas)"""
+    if caminho.endswith('.csv'):
+        df.to_csv(caminho, index=False)
+        return
+
+    workbook = openpyxl.Workbook(write_only=True)
+    planilha = workbook.create_sheet()
+    planilha.append(list(df.columns))
+    for linha in df.itertuples(index=False, name=None):
+        planilha.append([None if isinstance(v, float) and v != v else v for v in linha])
+    workbook.save(caminho)
+
+def planilha_sintetica(diretorio, linhas, formato, semente=0, taxa_erros=0.0):
+    """Caminho da planilha sintética, gerada só se ainda não existir no diretório"""
+    nome = f"nibo_{linhas}_s{semente}_e{taxa_erros:g}.{formato}"
+    caminho = os.path.join(diretorio, nome)
+    if not os.path.exists(caminho):
+        os.makedirs(diretorio, exist_ok=True)
+        # Gravada com outro nome e renomeada no fim: uma geração interrompida não deixa planilha pela metade
+        temporario = os.path.join(diretorio, f"parcial_{nome}")
+        gravar_planilha(gerar_planilha(linhas, semente, taxa_erros), temporario)
+        os.replace(temporario, caminho)
+    return caminho
+
+def _commit_atual():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def contexto_execucao():
+    """Commit, data, versões e máquina, repetidos em cada registro de resultados"""
+    return {
+        'commit': _commit_atual(),
+        'data': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'numpy': np.__version__,
+        'plataforma': platform.platform(),
+        'cpus': os.cpu_count(),
+    }
+
+def _ler(caminho):
+    with open(caminho, 'rb') as arquivo:
+        return ler_planilha(arquivo, caminho)
+
+def _ler_do_cache(caminho, diretorio_cache):
+    """Leitura pelo cache em disco; a primeira chamada grava o cache, as seguintes só o mapeiam"""
+    with open(caminho, 'rb') as arquivo:
+        return ler_planilha_com_cache(arquivo, caminho, diretorio=diretorio_cache)[0]
+
+def _zip(payloads):
+    arquivo, total = criar_zip_com_jsons(payloads)
+    arquivo.close()
+    return total
+
+# Etapas medidas: (nome, função que recebe o caminho, o DataFrame, os payloads e o diretório do cache)
+ETAPAS = [
+    ('leitura', lambda caminho, df, payloads, cache: _ler(caminho)),
+    ('leitura_cache', lambda caminho, df, payloads, cache: _ler_do_cache(caminho, cache)),
+    ('validar_dados', lambda caminho, df, payloads, cache: validar_dados(df)),
+    ('construir_payloads', lambda caminho, df, payloads, cache: construir_payloads(df)),
+    ('construir_payloads_agrupados', lambda caminho, df, payloads, cache: construir_payloads(df, agrupar=True)),
+    ('converter_planilha_para_json', lambda caminho, df, payloads, cache: converter_planilha_para_json(df, 'TOKEN', 'Benchmark')),
+    ('criar_colecao_com_runner', lambda caminho, df, payloads, cache: criar_colecao_com_runner(df, 'TOKEN', 'Benchmark')),
+    ('criar_zip_com_jsons', lambda caminho, df, payloads, cache: _zip(payloads)),
+]
+
+# Etapas executadas uma vez antes do cronômetro: a primeira leitura pelo cache o grava
+ETAPAS_COM_AQUECIMENTO = {'leitura_cache'}
+
+def medir_etapa(funcao, argumentos, repeticoes, memoria=True, aquecer=False):
+    """Melhor tempo em `repeticoes` execuções e pico de memória alocada (MB) em uma execução extra
+
+    Com `aquecer`, uma execução fora da medição vem antes.
+    """
+    if aquecer:
+        funcao(*argumentos)
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        funcao(*argumentos)
+        tempos.append(time.perf_counter() - inicio)
+
+    pico = None
+    if memoria:
+        tracemalloc.start()
+        try:
+            funcao(*argumentos)
+            pico = tracemalloc.get_traced_memory()[1] / 2 ** 20
+        finally:
+            tracemalloc.stop()
+    return min(tempos), float(np.median(tempos)), pico
+
+def executar(tamanhos, formatos, diretorio, repeticoes=None, memoria=True, taxa_erros=0.0, etapas=None):
+    """Roda as etapas para cada tamanho e formato; gera um registro por etapa"""
+    contexto = contexto_execucao()
+
+    # Cache do benchmark em um diretório temporário: o NIBO_CACHE_PLANILHAS do usuário fica intocado
+    with tempfile.TemporaryDirectory(prefix='nibo_benchmark_cache_') as diretorio_cache:
+        for linhas in tamanhos:
+            for formato in formatos:
+                caminho = planilha_sintetica(diretorio, linhas, formato, taxa_erros=taxa_erros)
+                df = _ler(caminho)
+                payloads = construir_payloads(df)
+                vezes = repeticoes or (1 if linhas >= LINHAS_REPETICAO_UNICA else 3)
+                for nome, funcao in ETAPAS:
+                    if etapas and nome not in etapas:
+                        continue
+                    melhor, mediana, pico = medir_etapa(funcao, (caminho, df, payloads, diretorio_cache), vezes, memoria,
+                                                        aquecer=nome in ETAPAS_COM_AQUECIMENTO)
+                    yield {
+                        **contexto,
+                        'linhas': linhas,
+                        'formato': formato,
+                        'tamanho_arquivo_mb': os.path.getsize(caminho) / 2 ** 20,
+                        'etapa': nome,
+                        'repeticoes': vezes,
+                        'segundos': melhor,
+                        'segundos_mediana': mediana,
+                        'linhas_por_segundo': linhas / melhor if melhor else None,
+                        'pico_memoria_mb': pico,
+                    }
+                del df, payloads
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark da geração de coleções a partir de planilhas sintéticas")
+    parser.add_argument('--tamanhos', type=int, nargs='+', default=TAMANHOS_PADRAO, help="Quantidades de linhas")
+    parser.add_argument('--formatos', nargs='+', choices=FORMATOS, default=FORMATOS)
+    parser.add_argument('--etapas', nargs='+', choices=[nome for nome, _ in ETAPAS], help="Só estas etapas (padrão: todas)")
+    parser.add_argument('-r', '--repeticoes', type=int, help="Execuções cronometradas por etapa (padrão: 3, ou 1 a partir de 100k linhas)")
+    parser.add_argument('--sem-memoria', action='store_true', help="Não mede o pico de memória (mais rápido)")
+    parser.add_argument('--taxa-erros', type=float, default=0.0, help="Fração de linhas inválidas nas planilhas geradas")
+    parser.add_argument('--dados', default='.benchmark_dados', help="Diretório das planilhas geradas")
+    parser.add_argument('-o', '--saida', default='benchmark_resultados.jsonl', help="Arquivo JSON Lines onde os resultados são acrescentados")
+    args = parser.parse_args(argv)
+
+    print(f"{'linhas':>9} {'formato':<7} {'etapa':<30} {'segundos':>9} {'linhas/s':>12} {'pico MB':>9}")
+    with open(args.saida, 'a', encoding='utf-8') as saida:
+        for registro in executar(args.tamanhos, args.formatos, args.dados, args.repeticoes,
+                                 not args.sem_memoria, args.taxa_erros, args.etapas):
+            saida.write(json.dumps(registro, ensure_ascii=False) + '\n')
+            saida.flush()
+            pico = f"{registro['pico_memoria_mb']:9.1f}" if registro['pico_memoria_mb'] is not None else f"{'-':>9}"
+            print(f"{registro['linhas']:>9} {registro['formato']:<7} {registro['etapa']:<30} "
+                  f"{registro['segundos']:9.3f} {registro['linhas_por_segundo']:12,.0f} {pico}", flush=True)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
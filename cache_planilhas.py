@@ -0,0 +1,134 @@
+"""Cache em disco das planilhas já lidas, em Arrow (Feather v2 sem compressão)
+
+Ler XLSX pelo openpyxl é a etapa mais cara, e a mesma planilha costuma ser
+enviada várias vezes, em sessões e por pessoas diferentes. O DataFrame lido
+fica guardado pelo hash do conteúdo e, nas próximas vezes, o arquivo é mapeado
+em memória em vez de a planilha ser lida de novo. As colunas de IDs vão
+codificadas como dicionário no arquivo e voltam com o tipo da leitura, então
+o DataFrame do cache é igual ao lido da planilha. O diretório tem um teto de
+tamanho: passando dele, saem os arquivos usados há mais tempo.
+
+Opcional: sem o pyarrow instalado, nada é guardado e toda leitura é completa.
+"""
+import os
+import json
+import hashlib
+from nibo_core import COLUNA_ORIGEM, ler_planilha
+
+try:
+    import pyarrow as pa
+    import pyarrow.feather as feather
+except ImportError:  # cache desligado
+    pa = None
+
+DIRETORIO_CACHE = os.environ.get("NIBO_CACHE_PLANILHAS", ".nibo_cache_planilhas")
+
+# Teto do diretório do cache, em MB
+LIMITE_CACHE_MB = float(os.environ.get("NIBO_CACHE_PLANILHAS_MB", 1024))
+
+# Colunas repetitivas, guardadas como dicionário no arquivo
+COLUNAS_DICIONARIO = ['stakeholderId', 'categoryId', 'costCenterId', COLUNA_ORIGEM]
+
+# Muda quando a leitura das planilhas mudar, para não reaproveitar caches antigos
+VERSAO_CACHE = 2
+
+def chave_cache(hash_conteudo, nome_arquivo):
+    """Chave de uma planilha no cache: hash do conteúdo e extensão, que decide como ela é lida"""
+    return f"v{VERSAO_CACHE}-{hash_conteudo}{os.path.splitext(nome_arquivo)[1].lower()}"
+
+def _caminho(chave, diretorio):
+    return os.path.join(diretorio, f"{chave}.arrow")
+
+def carregar(chave, diretorio=DIRETORIO_CACHE):
+    """DataFrame guardado e seus metadados, ou None; o arquivo é mapeado em memória, não lido
+    
+    Cada coluna vira um bloco próprio do DataFrame (split_blocks), sem juntar
+    as numéricas em uma cópia 2D, e os buffers do Arrow são liberados à
+    medida que são convertidos (self_destruct).
+    """
+    if pa is None:
+        return None
+    caminho = _caminho(chave, diretorio)
+    try:
+        tabela = pa.ipc.open_file(pa.memory_map(caminho)).read_all()
+        # A data de modificação marca o último uso, para o descarte dos mais antigos
+        os.utime(caminho)
+    except (OSError, pa.ArrowInvalid):
+        return None
+    metadados = json.loads((tabela.schema.metadata or {}).get(b'nibo', b'null'))
+    for i, campo in enumerate(tabela.schema):
+        if campo.name in COLUNAS_DICIONARIO and pa.types.is_dictionary(campo.type):
+            tabela = tabela.set_column(i, campo.name, tabela.column(i).cast(campo.type.value_type))
+    return tabela.to_pandas(split_blocks=True, self_destruct=True), metadados
+
+def guardar(chave, df, metadados=None, diretorio=DIRETORIO_CACHE, limite_mb=LIMITE_CACHE_MB):
+    """Guarda o DataFrame no cache e descarta os mais antigos se passar do teto
+    
+    Retorna False quando não dá para guardar: pyarrow ausente ou planilha que
+    o Arrow não representa (ex.: coluna com textos e números misturados).
+    """
+    if pa is None or not all(isinstance(coluna, str) for coluna in df.columns):
+        return False
+    try:
+        tabela = pa.Table.from_pandas(df, preserve_index=False)
+    except (pa.ArrowException, TypeError, ValueError):
+        return False
+    # Codificadas só no Arrow: os metadados do pandas guardam o tipo original, que volta no carregar
+    for i, campo in enumerate(tabela.schema):
+        if campo.name in COLUNAS_DICIONARIO and (pa.types.is_string(campo.type) or pa.types.is_large_string(campo.type)):
+            tabela = tabela.set_column(i, campo.name, tabela.column(i).dictionary_encode())
+    tabela = tabela.replace_schema_metadata({**(tabela.schema.metadata or {}), b'nibo': json.dumps(metadados).encode('utf-8')})
+    
+    os.makedirs(diretorio, exist_ok=True)
+    # Gravado com outro nome e renomeado no fim: uma gravação interrompida não deixa cache pela metade
+    temporario = os.path.join(diretorio, f"parcial_{os.getpid()}_{chave}.arrow")
+    feather.write_feather(tabela, temporario, compression='uncompressed')
+    os.replace(temporario, _caminho(chave, diretorio))
+    _descartar_antigos(diretorio, limite_mb)
+    return True
+
+def _descartar_antigos(diretorio, limite_mb):
+    """Apaga os arquivos usados há mais tempo até o cache caber no teto"""
+    arquivos = []
+    for entrada in os.scandir(diretorio):
+        if entrada.name.endswith('.arrow') and not entrada.name.startswith('parcial_'):
+            try:
+                estado = entrada.stat()
+            except FileNotFoundError:  # apagado por outro processo
+                continue
+            arquivos.append((estado.st_mtime, estado.st_size, entrada.path))
+    
+    total = sum(tamanho for _, tamanho, _ in arquivos)
+    for _, tamanho, caminho in sorted(arquivos):
+        if total <= limite_mb * 2 ** 20:
+            break
+        try:
+            os.remove(caminho)
+        except FileNotFoundError:
+            pass
+        total -= tamanho
+
+def ler_com_cache(chave, ler, diretorio=DIRETORIO_CACHE):
+    """DataFrame e metadados do cache ou, se não estiverem lá, de `ler()`, que os devolve e é guardado
+    
+    Retorna também se veio do cache.
+    """
+    guardado = carregar(chave, diretorio)
+    if guardado is not None:
+        return (*guardado, True)
+    df, metadados = ler()
+    guardar(chave, df, metadados, diretorio)
+    return df, metadados, False
+
+
+def ler_planilha_com_cache(arquivo, nome_arquivo, hash_conteudo=None, diretorio=DIRETORIO_CACHE):
+    """ler_planilha passando pelo cache; devolve o DataFrame e se ele veio do cache
+    
+    Sem o `hash_conteudo` (sha256) já calculado, o arquivo é lido uma vez para calculá-lo.
+    """
+    if hash_conteudo is None:
+        hash_conteudo = hashlib.sha256(arquivo.read()).hexdigest()
+        arquivo.seek(0)
+    chave = chave_cache(hash_conteudo, nome_arquivo)
+    df, _, do_cache = ler_com_cache(chave, lambda: (ler_planilha(arquivo, nome_arquivo), None), diretorio)
+    return df, do_cache
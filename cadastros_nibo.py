@@ -0,0 +1,116 @@
+"""Cadastros do Nibo (stakeholders, categorias e centros de custo) para traduzir nomes em IDs
+
+As exportações dos cadastros (CSV, Excel ou o JSON da API do Nibo) ficam no
+mesmo banco SQLite do diário de envios, com o nome já normalizado e a tabela
+ordenada por ele, e sobrevivem a reinícios. indices() monta deles os índices
+em memória que resolver_nomes (nibo_core) usa para trocar, antes da
+validação, os nomes da planilha pelos GUIDs.
+"""
+import json
+import sqlite3
+import pandas as pd
+from datetime import datetime
+from diario_envios import CAMINHO_DIARIO
+from nibo_core import normalizar_nomes, indexar_cadastro
+
+# Coluna da planilha traduzida por cada cadastro
+CADASTROS = {
+    'stakeholders': 'stakeholderId',
+    'categorias': 'categoryId',
+    'centros_custo': 'costCenterId',
+}
+
+# Colunas de ID e de nome aceitas nas exportações, na ordem de preferência (sem diferenciar maiúsculas)
+CAMPOS_ID = ['id', 'stakeholderid', 'categoryid', 'costcenterid']
+CAMPOS_NOME = ['name', 'nome', 'description', 'descricao', 'descrição']
+
+def _coluna(tabela, campos):
+    colunas = {str(coluna).strip().lower(): coluna for coluna in tabela.columns}
+    return next((colunas[campo] for campo in campos if campo in colunas), None)
+
+def ler_cadastro(arquivo, nome_arquivo):
+    """IDs e nomes de uma exportação de cadastro
+    
+    Aceita CSV/Excel com uma coluna de ID e uma de nome, ou JSON com a lista
+    dos registros, solta ou em 'items' (como a resposta da API do Nibo).
+    """
+    nome_arquivo = nome_arquivo.lower()
+    if nome_arquivo.endswith('.json'):
+        registros = json.load(arquivo)
+        if isinstance(registros, dict):
+            registros = registros.get('items', registros.get('value', []))
+        tabela = pd.DataFrame(registros)
+    elif nome_arquivo.endswith('.csv'):
+        tabela = pd.read_csv(arquivo, dtype=str)
+    else:
+        tabela = pd.read_excel(arquivo, dtype=str)
+    
+    coluna_id, coluna_nome = _coluna(tabela, CAMPOS_ID), _coluna(tabela, CAMPOS_NOME)
+    if coluna_id is None or coluna_nome is None:
+        raise ValueError(f"Cadastro sem coluna de ID ({', '.join(CAMPOS_ID)}) ou de nome ({', '.join(CAMPOS_NOME)})")
+    tabela = tabela[[coluna_id, coluna_nome]].dropna()
+    return tabela[coluna_id].astype(str).str.strip().tolist(), tabela[coluna_nome].astype(str).str.strip().tolist()
+
+class CadastrosNibo:
+    """Acesso aos cadastros importados; use com `with` para fechar a conexão ao sair"""
+
+    def __init__(self, caminho=CAMINHO_DIARIO):
+        self._conexao = sqlite3.connect(caminho)
+        self._conexao.execute("PRAGMA journal_mode=WAL")
+        self._conexao.execute(
+            "CREATE TABLE IF NOT EXISTS cadastros ("
+            " tipo TEXT,"
+            " nome_normalizado TEXT,"
+            " id TEXT,"
+            " nome TEXT,"
+            " PRIMARY KEY (tipo, nome_normalizado, id, nome)"
+            ") WITHOUT ROWID"
+        )
+        self._conexao.execute(
+            "CREATE TABLE IF NOT EXISTS importacoes_cadastros ("
+            " tipo TEXT PRIMARY KEY,"
+            " arquivo TEXT,"
+            " importado_em TEXT,"
+            " registros INTEGER"
+            ")"
+        )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.fechar()
+
+    def importar(self, tipo, ids, nomes, arquivo=""):
+        """Troca o cadastro `tipo` (chave de CADASTROS) pelos registros importados; retorna quantos ficaram"""
+        if tipo not in CADASTROS:
+            raise ValueError(f"Cadastro desconhecido: {tipo} (use {', '.join(CADASTROS)})")
+        normalizados = normalizar_nomes(nomes).tolist()
+        with self._conexao:
+            self._conexao.execute("DELETE FROM cadastros WHERE tipo = ?", (tipo,))
+            self._conexao.executemany(
+                "INSERT OR IGNORE INTO cadastros VALUES (?, ?, ?, ?)",
+                zip([tipo] * len(ids), normalizados, ids, nomes)
+            )
+            registros = self._conexao.execute("SELECT COUNT(*) FROM cadastros WHERE tipo = ?", (tipo,)).fetchone()[0]
+            self._conexao.execute(
+                "INSERT OR REPLACE INTO importacoes_cadastros VALUES (?, ?, ?, ?)",
+                (tipo, arquivo, datetime.now().isoformat(timespec='seconds'), registros)
+            )
+        return registros
+
+    def importacoes(self):
+        """Tipo -> (arquivo, importado_em, registros) de cada cadastro importado; serve de versão para caches"""
+        linhas = self._conexao.execute("SELECT tipo, arquivo, importado_em, registros FROM importacoes_cadastros ORDER BY tipo").fetchall()
+        return {tipo: (arquivo, importado_em, registros) for tipo, arquivo, importado_em, registros in linhas}
+
+    def indices(self):
+        """Coluna da planilha -> índice (indexar_cadastro) de cada cadastro importado"""
+        tabela = pd.read_sql_query("SELECT tipo, nome_normalizado, id, nome FROM cadastros", self._conexao)
+        return {
+            CADASTROS[tipo]: indexar_cadastro(grupo['id'], grupo['nome'], grupo['nome_normalizado'])
+            for tipo, grupo in tabela.groupby('tipo', sort=False) if tipo in CADASTROS
+        }
+
+    def fechar(self):
+        self._conexao.close()
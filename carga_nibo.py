@@ -0,0 +1,177 @@
+"""Teste de carga local: reenvia os artefatos gerados contra o simulador do Nibo
+
+Lê os agendamentos de cada artefato (coleção tradicional, coleções divididas
+em ZIP, dados do Runner em CSV ou JSON, ZIP de JSONs individuais ou o ZIP
+com todos os artefatos, que vira um teste por artefato) e os envia com o
+mesmo cliente do envio direto (envio_nibo). Sem --url, o simulador do Nibo
+(simulador_nibo) sobe no mesmo processo, com a latência e os erros pedidos.
+Mede requisições/s, latência p50/p95/p99 e a taxa de erros, e acrescenta um
+registro por artefato e concorrência em um arquivo JSON Lines, como o
+benchmark.py:
+
+    python carga_nibo.py saida/cli_a_runner_data.csv saida/cli_a_collection.json saida/cli_a_jsons.zip
+    python carga_nibo.py saida/cli_a_artefatos.zip -c 1 8 32 --latencia-ms 80 --variacao-ms 40 --taxa-429 0.02 --semente 1
+    python carga_nibo.py saida/cli_a_collection.json --url http://127.0.0.1:8080/empresas/v1/schedules/debit
+
+O simulador no mesmo processo divide a CPU com o cliente; para cargas altas,
+rode o simulador_nibo.py à parte e passe a URL. Os agendamentos vão no
+corpo compacto, como no envio direto e no Runner (a coleção tradicional tem
+o mesmo JSON, indentado).
+"""
+import io
+import os
+import sys
+import json
+import asyncio
+import zipfile
+import argparse
+from benchmark import contexto_execucao
+from conciliacao_runner import ler_dados_runner
+from envio_nibo import enviar_agendamentos
+from simulador_nibo import adicionar_opcoes, simulador_das_opcoes
+
+# Token enviado quando nem o artefato nem --token trazem um
+TOKEN_PADRAO = "teste-carga"
+
+def _requisicoes(itens):
+    """Itens com requisição de uma coleção do Postman, também os que estão dentro de pastas"""
+    for item in itens:
+        if 'item' in item:
+            yield from _requisicoes(item['item'])
+        else:
+            yield item
+
+def _token_da_requisicao(item):
+    return next((cabecalho['value'] for cabecalho in item['request'].get('header', []) if cabecalho['key'] == 'ApiToken'), None)
+
+def _artefatos_do_zip(nome, conteudo):
+    with zipfile.ZipFile(io.BytesIO(conteudo)) as pacote:
+        membros = [membro for membro in pacote.namelist() if not membro.endswith('/')]
+        individuais = [membro for membro in membros if os.path.basename(membro).startswith('agendamento_')]
+        if individuais:
+            # ZIP de JSONs individuais: o data.json e o README.txt só acompanham
+            return [(nome, 'jsons_zip', [json.loads(pacote.read(membro)) for membro in individuais], None)]
+        artefatos = [artefato for membro in membros for artefato in _artefatos(f"{nome}/{membro}", pacote.read(membro))]
+
+    if 'manifesto.json' in membros:
+        # Coleção dividida em partes: um teste só, com as partes na ordem do ZIP
+        payloads = [payload for _, _, payloads_parte, _ in artefatos for payload in payloads_parte]
+        return [(nome, 'colecoes_divididas', payloads, next((token for *_, token in artefatos if token), None))]
+    return artefatos
+
+def _artefatos(nome, conteudo):
+    minusculo = nome.lower()
+    if minusculo.endswith('.zip'):
+        return _artefatos_do_zip(nome, conteudo)
+    if minusculo.endswith('.csv'):
+        return [(nome, 'dados_runner_csv', ler_dados_runner(io.BytesIO(conteudo), nome), None)]
+    if not minusculo.endswith('.json'):
+        return []
+
+    dados = json.loads(conteudo)
+    if isinstance(dados, list):
+        return [(nome, 'dados_runner_json', ler_dados_runner(io.BytesIO(conteudo), nome), None)]
+    if 'item' not in dados:
+        return []  # manifesto das partes
+    requisicoes = list(_requisicoes(dados['item']))
+    if any(evento.get('listen') == 'prerequest' for item in requisicoes for evento in item.get('event', [])):
+        return []  # coleção do Runner: o pre-request script põe no body o registro do arquivo de dados
+    payloads = [json.loads(item['request']['body']['raw']) for item in requisicoes]
+    return [(nome, 'colecao', payloads, _token_da_requisicao(requisicoes[0]) if requisicoes else None)]
+
+def artefatos_do_arquivo(caminho):
+    """Agendamentos de cada artefato no arquivo: tuplas (nome, modo, payloads, ApiToken ou None)
+
+    O modo é 'colecao', 'colecoes_divididas', 'dados_runner_csv',
+    'dados_runner_json' ou 'jsons_zip'. Um ZIP com todos os artefatos traz um
+    de cada; a coleção do Runner fica de fora (seus bodies vêm do arquivo de dados).
+    """
+    with open(caminho, 'rb') as arquivo:
+        return _artefatos(os.path.basename(caminho), arquivo.read())
+
+def _taxa(parte, total):
+    return parte / total if total else 0.0
+
+async def medir_artefatos(artefatos, args):
+    """Envia cada artefato em cada concorrência e gera um registro de resultados por envio"""
+    simulador = None
+    url = args.url
+    if not url:
+        simulador = simulador_das_opcoes(args, args.token)
+        url = await simulador.iniciar()
+    try:
+        for nome, modo, payloads, token in artefatos:
+            for concorrencia in args.concorrencia:
+                resultado = await enviar_agendamentos(
+                    payloads, args.token or token or TOKEN_PADRAO, url, concorrencia=concorrencia,
+                    requisicoes_por_segundo=args.limite, tentativas=args.tentativas,
+                    espera_base=args.espera_base, total=len(payloads)
+                )
+                status = resultado['status_tentativas']
+                yield {
+                    'artefato': nome,
+                    'modo': modo,
+                    'agendamentos': len(payloads),
+                    'concorrencia': concorrencia,
+                    'limite_por_segundo': args.limite,
+                    'simulador': None if args.url else {
+                        'latencia_ms': args.latencia_ms, 'variacao_ms': args.variacao_ms, 'taxa_429': args.taxa_429,
+                        'taxa_5xx': args.taxa_5xx, 'limite_por_segundo': args.limite_simulador, 'semente': args.semente,
+                    },
+                    'segundos': resultado['duracao'],
+                    'por_segundo': resultado['por_segundo'],
+                    'tentativas': resultado['tentativas'],
+                    'tentativas_por_segundo': _taxa(resultado['tentativas'], resultado['duracao']),
+                    'latencia_p50_ms': resultado['latencia_p50'],
+                    'latencia_p95_ms': resultado['latencia_p95'],
+                    'latencia_p99_ms': resultado['latencia_p99'],
+                    'status_tentativas': {str(codigo): quantidade for codigo, quantidade in status.items()},
+                    'taxa_erros_tentativas': _taxa(sum(q for codigo, q in status.items() if codigo not in (200, 201)), resultado['tentativas']),
+                    'taxa_429': _taxa(status.get(429, 0), resultado['tentativas']),
+                    'taxa_5xx': _taxa(sum(q for codigo, q in status.items() if codigo is not None and codigo >= 500), resultado['tentativas']),
+                    'falhas': resultado['falhas'],
+                    'taxa_falhas': _taxa(resultado['falhas'], resultado['concluidos']),
+                }
+    finally:
+        if simulador is not None:
+            await simulador.parar()
+
+async def _executar(artefatos, args, saida):
+    contexto = contexto_execucao()
+    async for registro in medir_artefatos(artefatos, args):
+        saida.write(json.dumps({**contexto, **registro}, ensure_ascii=False) + '\n')
+        saida.flush()
+        print(f"{registro['artefato'][-40:]:<40} {registro['modo']:<18} {registro['concorrencia']:>5} "
+              f"{registro['agendamentos']:>8} {registro['por_segundo']:10,.1f} {registro['latencia_p50_ms']:8.1f} "
+              f"{registro['latencia_p95_ms']:8.1f} {registro['latencia_p99_ms']:8.1f} "
+              f"{registro['taxa_erros_tentativas']:8.1%} {registro['falhas']:>7}", flush=True)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Teste de carga local dos artefatos gerados contra o simulador do Nibo")
+    parser.add_argument('artefatos', nargs='+', help="Coleções (.json), dados do Runner (.csv/.json) ou ZIPs gerados")
+    parser.add_argument('-c', '--concorrencia', type=int, nargs='+', default=[8], help="Requisições simultâneas (várias: um teste para cada)")
+    parser.add_argument('--limite', type=float, default=0.0, help="Limite de requisições/s do cliente; 0 = sem limite")
+    parser.add_argument('--tentativas', type=int, default=5, help="Novas tentativas em 429/5xx")
+    parser.add_argument('--espera-base', type=float, default=0.5, help="Espera inicial do backoff, em segundos")
+    parser.add_argument('--token', help="ApiToken enviado (e o único aceito pelo simulador); padrão: o da coleção")
+    parser.add_argument('--url', help="Endpoint já em execução (ex.: o simulador_nibo.py à parte); sem ela, o simulador sobe aqui")
+    parser.add_argument('-o', '--saida', default='carga_resultados.jsonl', help="Arquivo JSON Lines onde os resultados são acrescentados")
+    adicionar_opcoes(parser)
+    args = parser.parse_args(argv)
+
+    artefatos = []
+    for caminho in args.artefatos:
+        encontrados = artefatos_do_arquivo(caminho)
+        if not encontrados:
+            print(f"⚠️ {caminho}: nenhum agendamento para reenviar (coleção do Runner? use o arquivo de dados)", file=sys.stderr)
+        artefatos += encontrados
+    if not artefatos:
+        return 1
+
+    print(f"{'artefato':<40} {'modo':<18} {'conc':>5} {'agend.':>8} {'req/s':>10} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'erros':>8} {'falhas':>7}")
+    with open(args.saida, 'a', encoding='utf-8') as saida:
+        asyncio.run(_executar(artefatos, args, saida))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,195 @@
+"""Conciliação dos resultados do Collection Runner com as linhas da planilha
+
+Lê os relatórios JSON de uma execução da coleção do Runner (o do reporter
+json do Newman ou o "Export Results" do Runner do Postman), identifica o
+agendamento de cada iteração e o liga às linhas da planilha por um índice
+de hash (a chave_payload do diário de envios), sem laços aninhados. Gera um
+resumo, a situação de cada agendamento e o lote de reenvio só com os que
+falharam. Os agendamentos que o Runner criou vão para o diário de envios,
+e assim ficam fora do reenvio e das próximas exportações que pulam os já
+confirmados.
+
+O relatório do Newman traz o body enviado em cada iteração; o do Postman
+não, e a iteração é ligada ao registro de mesma posição no arquivo de dados
+usado na execução, que então precisa ser informado (um só, para todos os
+relatórios do Postman). Com vários relatórios, do mais antigo ao mais
+recente (ex.: uma execução e depois o reenvio das falhas), vale o último
+resultado de cada agendamento. As respostas 429/503 que a própria coleção
+repetiu (marcadas pelo teste TESTE_NOVA_TENTATIVA) não contam como iteração.
+"""
+import io
+import csv
+import json
+import pandas as pd
+from diario_envios import chave_payload
+from nibo_core import COLUNA_ORIGEM, COLUNA_LINHA_ORIGEM, TESTE_NOVA_TENTATIVA
+
+SUCESSO = "sucesso"
+FALHA = "falha"
+NAO_EXECUTADO = "não executado"
+
+def ler_dados_runner(arquivo, nome_arquivo):
+    """Payloads de um arquivo de dados do Runner: CSV com requestData em texto JSON, ou JSON"""
+    conteudo = arquivo.read()
+    if nome_arquivo.lower().endswith('.json'):
+        return [
+            registro["requestData"] if isinstance(registro["requestData"], dict) else json.loads(registro["requestData"])
+            for registro in json.loads(conteudo)
+        ]
+    texto = io.StringIO(conteudo.decode('utf-8-sig'), newline='')
+    return [json.loads(registro["requestData"]) for registro in csv.DictReader(texto)]
+
+def _payload_da_iteracao(corpo, dados_runner, iteracao):
+    """Agendamento enviado na iteração: o body registrado ou, sem ele, o registro do arquivo de dados"""
+    if corpo:
+        try:
+            payload = json.loads(corpo)
+        except ValueError:  # body de exemplo da coleção, não substituído
+            payload = None
+        if isinstance(payload, dict):
+            return payload
+    if dados_runner is not None and 0 <= iteracao < len(dados_runner):
+        return dados_runner[iteracao]
+    return None
+
+def _nova_tentativa(nomes_testes):
+    """Se a execução foi repetida pela coleção (429/503), e o resultado vem da próxima"""
+    return any(str(nome).startswith(TESTE_NOVA_TENTATIVA) for nome in nomes_testes)
+
+def _iteracoes_newman(relatorio, dados_runner):
+    for execucao in relatorio['run']['executions']:
+        if _nova_tentativa(assercao.get('assertion', '') for assercao in execucao.get('assertions') or []):
+            continue
+        iteracao = (execucao.get('cursor') or {}).get('iteration', 0)
+        corpo = ((execucao.get('request') or {}).get('body') or {}).get('raw')
+        erros = [
+            assercao['error'].get('message') or assercao['assertion']
+            for assercao in execucao.get('assertions') or [] if assercao.get('error')
+        ]
+        if execucao.get('requestError'):
+            erros.insert(0, execucao['requestError'].get('message') or "Erro na requisição")
+        codigo = (execucao.get('response') or {}).get('code')
+        yield _payload_da_iteracao(corpo, dados_runner, iteracao), not erros, codigo, "; ".join(erros)
+
+def _iteracoes_postman(relatorio, dados_runner):
+    # A coleção do Runner tem uma requisição só, então cada execução é uma iteração;
+    # exportações antigas juntam as iterações em 'allTests', uma entrada por iteração
+    iteracao = 0
+    for resultado in relatorio['results']:
+        codigo = (resultado.get('responseCode') or {}).get('code')
+        for testes in resultado.get('allTests') or [resultado.get('tests') or {}]:
+            if _nova_tentativa(testes):
+                continue
+            falhos = [nome for nome, passou in testes.items() if not passou]
+            sucesso = not falhos if testes else codigo in (200, 201)
+            yield _payload_da_iteracao(None, dados_runner, iteracao), sucesso, codigo, "; ".join(falhos)
+            iteracao += 1
+
+def iteracoes_do_relatorio(relatorio, dados_runner=None):
+    """(payload ou None, sucesso, código HTTP, erros) de cada iteração do relatório, na ordem"""
+    if 'executions' in (relatorio.get('run') or {}):
+        return _iteracoes_newman(relatorio, dados_runner)
+    if 'results' in relatorio:
+        return _iteracoes_postman(relatorio, dados_runner)
+    raise ValueError("Relatório não reconhecido: esperado o JSON do Newman (run.executions) ou o exportado pelo Runner do Postman (results)")
+
+def _chave(payload):
+    try:
+        return chave_payload(payload)
+    except (KeyError, TypeError):  # agendamento incompleto, que não veio desta geração
+        return None
+
+def conciliar(relatorios, payloads, dados_runner=None):
+    """Situação de cada payload segundo os relatórios, do mais antigo ao mais recente
+    
+    O índice vai da chave do agendamento às posições dos payloads com ela;
+    agendamentos repetidos na planilha são ligados, dentro de cada relatório,
+    na ordem em que aparecem. Retorna o resumo e, para cada payload, a
+    situação, o código HTTP e os erros da última iteração que o enviou.
+    """
+    indice = {}
+    for posicao, payload in enumerate(payloads):
+        indice.setdefault(chave_payload(payload), []).append(posicao)
+    
+    situacoes = [(NAO_EXECUTADO, None, "")] * len(payloads)
+    resumo = {'relatorios': len(relatorios), 'iteracoes': 0, 'iteracoes_com_sucesso': 0, 'iteracoes_com_falha': 0, 'sem_correspondencia': 0}
+    for relatorio in relatorios:
+        ocorrencias = {}
+        for payload, sucesso, codigo, erros in iteracoes_do_relatorio(relatorio, dados_runner):
+            resumo['iteracoes'] += 1
+            resumo['iteracoes_com_sucesso' if sucesso else 'iteracoes_com_falha'] += 1
+            chave = _chave(payload) if payload is not None else None
+            posicoes = indice.get(chave, ())
+            ocorrencia = ocorrencias.get(chave, 0)
+            if ocorrencia >= len(posicoes):
+                resumo['sem_correspondencia'] += 1
+                continue
+            ocorrencias[chave] = ocorrencia + 1
+            situacoes[posicoes[ocorrencia]] = (SUCESSO if sucesso else FALHA, codigo, erros)
+    
+    contagem = pd.Series([situacao for situacao, _, _ in situacoes], dtype=object).value_counts()
+    resumo.update({
+        'agendamentos': len(payloads),
+        'com_sucesso': int(contagem.get(SUCESSO, 0)),
+        'com_falha': int(contagem.get(FALHA, 0)),
+        'nao_executados': int(contagem.get(NAO_EXECUTADO, 0)),
+    })
+    return resumo, situacoes
+
+def payloads_com_falha(payloads, situacoes):
+    """Payloads cuja última iteração falhou: o lote de reenvio"""
+    return [payload for payload, (situacao, _, _) in zip(payloads, situacoes) if situacao == FALHA]
+
+def payloads_com_sucesso(payloads, situacoes):
+    """Payloads cuja última iteração teve sucesso: os agendamentos que o Runner criou"""
+    return [payload for payload, (situacao, _, _) in zip(payloads, situacoes) if situacao == SUCESSO]
+
+def registrar_no_diario(diario, resumo, payloads, situacoes):
+    """Confirma no diário os agendamentos que o Runner criou e devolve o lote de reenvio
+
+    O lote deixa de fora as falhas que o diário já tem como confirmadas (ex.:
+    criadas depois pelo envio direto); o resumo recebe em 'registrados_diario'
+    quantos agendamentos foram confirmados e em 'ja_confirmados' quantas
+    falhas saíram do lote.
+    """
+    sucessos = payloads_com_sucesso(payloads, situacoes)
+    diario.confirmar(sucessos)
+    contagem = {}
+    falhas = list(diario.filtrar_pendentes(payloads_com_falha(payloads, situacoes), contagem))
+    resumo['registrados_diario'] = len(sucessos)
+    resumo['ja_confirmados'] = contagem.get('ignorados', 0)
+    return falhas
+
+def tabela_conciliacao(payloads, linhas, situacoes, df=None, so_falhas=False):
+    """Um agendamento por linha da tabela, com as linhas da planilha que o formaram (contando o cabeçalho)
+    
+    Com `df` vindo de várias planilhas/abas, traz a origem e as linhas dentro
+    da aba de origem, como erros_por_linha; um agendamento agrupado com
+    linhas de mais de uma origem traz cada linha como origem:linha.
+    """
+    selecionados = [i for i, (situacao, _, _) in enumerate(situacoes) if not so_falhas or situacao == FALHA]
+    com_origem = df is not None and COLUNA_ORIGEM in df.columns
+    if com_origem:
+        origens, numeros = df[COLUNA_ORIGEM].tolist(), df[COLUNA_LINHA_ORIGEM].tolist()
+    
+    def _origens(posicoes):
+        return list(dict.fromkeys(origens[p] for p in posicoes))
+    
+    def _linhas(posicoes):
+        if not com_origem:
+            return ", ".join(str(p + 2) for p in posicoes)
+        if len(_origens(posicoes)) == 1:
+            return ", ".join(str(numeros[p]) for p in posicoes)
+        return ", ".join(f"{origens[p]}:{numeros[p]}" for p in posicoes)
+    
+    tabela = pd.DataFrame({
+        'Linhas': [_linhas(linhas[i]) for i in selecionados],
+        'Situação': [situacoes[i][0] for i in selecionados],
+        'Código HTTP': pd.array([situacoes[i][1] for i in selecionados], dtype='Int64'),
+        'Erros': [situacoes[i][2] for i in selecionados],
+        'Descrição': [payloads[i]["description"] for i in selecionados],
+        'Referência': [payloads[i]["reference"] for i in selecionados],
+    })
+    if com_origem:
+        tabela.insert(0, 'Origem', [", ".join(_origens(linhas[i])) for i in selecionados])
+    return tabela
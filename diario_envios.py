@@ -0,0 +1,92 @@
+"""Diário local (SQLite) dos agendamentos já confirmados pelo Nibo
+
+Cada agendamento é identificado por um hash estável dos campos que o tornam
+único. Exportações e envios consultam o diário em lote para pular o que já foi
+confirmado, e o envio grava cada confirmação assim que o Nibo responde (um
+commit por agendamento, barato no modo WAL), então uma execução interrompida,
+mesmo à força, pode ser retomada sem criar agendamentos duplicados.
+"""
+import os
+import sqlite3
+import hashlib
+import itertools
+from datetime import datetime
+
+CAMINHO_DIARIO = os.environ.get("NIBO_DIARIO", "nibo_envios.db")
+
+# Payloads consultados por vez no diário
+LOTE_DIARIO = 5000
+
+def chave_payload(payload):
+    """Hash estável do agendamento: stakeholder, referência, vencimento, valores, categorias e centros de custo"""
+    partes = [payload["stakeholderId"], payload["reference"], payload["dueDate"]]
+    for categoria in payload["categories"]:
+        partes += [categoria["categoryId"], repr(categoria["value"])]
+    for centro_custo in payload["costCenters"]:
+        partes.append(centro_custo["costCenterId"])
+    return hashlib.blake2b("\x1f".join(partes).encode('utf-8'), digest_size=16).digest()
+
+class DiarioEnvios:
+    """Acesso ao diário de envios; use com `with` para fechar a conexão ao sair"""
+
+    def __init__(self, caminho=CAMINHO_DIARIO):
+        self._conexao = sqlite3.connect(caminho)
+        self._conexao.execute("PRAGMA journal_mode=WAL")
+        self._conexao.execute("PRAGMA synchronous=NORMAL")
+        self._conexao.execute(
+            "CREATE TABLE IF NOT EXISTS confirmados ("
+            " chave BLOB PRIMARY KEY,"
+            " referencia TEXT,"
+            " confirmado_em TEXT"
+            ") WITHOUT ROWID"
+        )
+        self._conexao.execute("CREATE TEMP TABLE consulta (chave BLOB PRIMARY KEY) WITHOUT ROWID")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.fechar()
+
+    def __len__(self):
+        return self._conexao.execute("SELECT COUNT(*) FROM confirmados").fetchone()[0]
+
+    def confirmadas(self, chaves):
+        """Subconjunto das chaves que já estão no diário, consultado em uma única junção"""
+        with self._conexao:
+            self._conexao.execute("DELETE FROM consulta")
+            self._conexao.executemany("INSERT OR IGNORE INTO consulta VALUES (?)", ((chave,) for chave in chaves))
+            linhas = self._conexao.execute("SELECT chave FROM consulta JOIN confirmados USING (chave)").fetchall()
+        return {chave for chave, in linhas}
+
+    def filtrar_pendentes(self, payloads, contagem=None):
+        """Gera só os payloads ainda não confirmados, consultando o diário em lotes
+
+        Se `contagem` (dict) for informado, recebe em 'ignorados' quantos
+        payloads foram pulados.
+        """
+        payloads = iter(payloads)
+        while lote := list(itertools.islice(payloads, LOTE_DIARIO)):
+            chaves = [chave_payload(payload) for payload in lote]
+            confirmadas = self.confirmadas(chaves)
+            if contagem is not None:
+                contagem['ignorados'] = contagem.get('ignorados', 0) + sum(chave in confirmadas for chave in chaves)
+            for chave, payload in zip(chaves, lote):
+                if chave not in confirmadas:
+                    yield payload
+
+    def registrar_confirmacao(self, payload):
+        """Grava na hora um agendamento confirmado: nem um kill perde a confirmação de um POST aceito"""
+        self.confirmar([payload])
+
+    def confirmar(self, payloads):
+        """Grava de uma vez, em um commit, os agendamentos como confirmados (ex.: os que a conciliação achou criados pelo Runner)"""
+        agora = datetime.now().isoformat(timespec='seconds')
+        with self._conexao:
+            self._conexao.executemany(
+                "INSERT OR REPLACE INTO confirmados VALUES (?, ?, ?)",
+                ((chave_payload(payload), payload["reference"], agora) for payload in payloads)
+            )
+
+    def fechar(self):
+        self._conexao.close()
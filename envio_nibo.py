@@ -0,0 +1,191 @@
+"""Envio direto dos agendamentos para a API do Nibo, sem passar pelo Postman"""
+import os
+import time
+import random
+import asyncio
+import aiohttp
+from collections import Counter
+from nibo_core import serializar_json
+
+# Pode apontar para um servidor local de testes no lugar do Nibo
+URL_AGENDAMENTOS = os.environ.get("NIBO_API_URL", "https://api.nibo.com.br/empresas/v1/schedules/debit")
+
+# Status que valem nova tentativa (além de falhas de conexão e timeouts)
+STATUS_REPETIR = {429, 500, 502, 503, 504}
+
+class LimitadorTaxa:
+    """Token bucket: no máximo `taxa` requisições por segundo, com rajadas de até `capacidade`"""
+
+    def __init__(self, taxa, capacidade=None):
+        self.taxa = taxa
+        self.capacidade = capacidade or max(1.0, taxa or 0)
+        self._fichas = self.capacidade
+        self._ultimo = time.monotonic()
+        self._trava = asyncio.Lock()
+
+    async def aguardar(self):
+        """Espera até haver uma ficha disponível e a consome"""
+        if not self.taxa:
+            return
+
+        async with self._trava:
+            while True:
+                agora = time.monotonic()
+                self._fichas = min(self.capacidade, self._fichas + (agora - self._ultimo) * self.taxa)
+                self._ultimo = agora
+                if self._fichas >= 1:
+                    self._fichas -= 1
+                    return
+                await asyncio.sleep((1 - self._fichas) / self.taxa)
+
+class EstatisticasEnvio:
+    """Acompanha vazão, latência e falhas de um envio em andamento"""
+
+    def __init__(self, total=None, ao_progredir=None, ao_confirmar=None, intervalo=0.25):
+        self.total = total
+        self.concluidos = 0
+        self.sucessos = 0
+        self.tentativas = 0
+        self.falhas = []
+        self.latencias = []
+        self.status_tentativas = Counter()
+        self.inicio = time.perf_counter()
+        self._ao_progredir = ao_progredir
+        self._ao_confirmar = ao_confirmar
+        self._intervalo = intervalo
+        self._ultimo_aviso = 0.0
+
+    def registrar_tentativa(self, latencia, status=None):
+        """Uma requisição feita; `status` None é falha de conexão ou timeout"""
+        self.tentativas += 1
+        self.latencias.append(latencia)
+        self.status_tentativas[status] += 1
+
+    def registrar_resultado(self, indice, payload, status, erro=None):
+        self.concluidos += 1
+        if erro is None:
+            self.sucessos += 1
+            if self._ao_confirmar:
+                self._ao_confirmar(payload)
+        else:
+            self.falhas.append({
+                "indice": indice,
+                "description": payload.get("description", ""),
+                "status": status,
+                "erro": erro,
+            })
+
+        # Avisa o progresso no máximo a cada `intervalo` segundos
+        agora = time.perf_counter()
+        if self._ao_progredir and agora - self._ultimo_aviso >= self._intervalo:
+            self._ultimo_aviso = agora
+            self._ao_progredir(self.resumo())
+
+    def _percentil(self, ordenadas, p):
+        if not ordenadas:
+            return 0.0
+        return ordenadas[min(len(ordenadas) - 1, int(round(p / 100 * (len(ordenadas) - 1))))]
+
+    def resumo(self):
+        """Números do envio até agora; latências em milissegundos"""
+        duracao = time.perf_counter() - self.inicio
+        ordenadas = sorted(self.latencias)
+        return {
+            "total": self.total,
+            "concluidos": self.concluidos,
+            "sucessos": self.sucessos,
+            "falhas": len(self.falhas),
+            "tentativas": self.tentativas,
+            "duracao": duracao,
+            "por_segundo": self.concluidos / duracao if duracao else 0.0,
+            "latencia_p50": self._percentil(ordenadas, 50) * 1000,
+            "latencia_p95": self._percentil(ordenadas, 95) * 1000,
+            "latencia_p99": self._percentil(ordenadas, 99) * 1000,
+            "status_tentativas": dict(self.status_tentativas),
+        }
+
+def _espera_retry_after(valor):
+    """Segundos indicados no header Retry-After (só o formato numérico)"""
+    try:
+        return max(0.0, float(valor))
+    except (TypeError, ValueError):
+        return None
+
+async def _enviar_agendamento(sessao, url, cabecalhos, indice, payload, limitador, estatisticas, tentativas, espera_base):
+    """POST de um agendamento, repetindo em 429/5xx e falhas de conexão"""
+    corpo = serializar_json(payload, compacto=True)
+
+    for tentativa in range(tentativas + 1):
+        await limitador.aguardar()
+
+        status, retry_after = None, None
+        inicio = time.perf_counter()
+        try:
+            async with sessao.post(url, data=corpo, headers=cabecalhos) as resposta:
+                status = resposta.status
+                texto = await resposta.text()
+                retry_after = resposta.headers.get("Retry-After")
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            texto = f"{type(e).__name__}: {e}"
+        estatisticas.registrar_tentativa(time.perf_counter() - inicio, status)
+
+        if status in (200, 201):
+            estatisticas.registrar_resultado(indice, payload, status)
+            return
+
+        if (status is not None and status not in STATUS_REPETIR) or tentativa == tentativas:
+            estatisticas.registrar_resultado(indice, payload, status, texto[:500])
+            return
+
+        # Backoff exponencial com jitter, a menos que o Nibo diga quanto esperar
+        espera = _espera_retry_after(retry_after)
+        if espera is None:
+            espera = espera_base * 2 ** tentativa * random.uniform(0.8, 1.2)
+        await asyncio.sleep(espera)
+
+async def enviar_agendamentos(payloads, token_api, url=URL_AGENDAMENTOS, concorrencia=8,
+                              requisicoes_por_segundo=5.0, tentativas=5, espera_base=0.5,
+                              total=None, ao_progredir=None, ao_confirmar=None, timeout=30):
+    """Envia os payloads para o endpoint de agendamentos do Nibo
+
+    Usa um pool de conexões reaproveitadas com até `concorrencia` requisições
+    simultâneas e um limite de `requisicoes_por_segundo` (token bucket; 0 ou
+    None desliga o limite). Respostas 429/5xx e falhas de conexão são repetidas
+    até `tentativas` vezes, respeitando o Retry-After quando presente.
+    `ao_progredir` recebe o resumo parcial durante o envio e `ao_confirmar`
+    cada payload aceito pelo Nibo. Retorna as estatísticas do envio, com a
+    lista de falhas.
+    """
+    cabecalhos = {"Content-Type": "application/json", "ApiToken": token_api}
+    limitador = LimitadorTaxa(requisicoes_por_segundo)
+    estatisticas = EstatisticasEnvio(total, ao_progredir, ao_confirmar)
+
+    conector = aiohttp.TCPConnector(limit=concorrencia)
+    async with aiohttp.ClientSession(connector=conector, timeout=aiohttp.ClientTimeout(total=timeout)) as sessao:
+        # Fila curta: os payloads vão sendo consumidos conforme as requisições terminam
+        fila = asyncio.Queue(maxsize=concorrencia * 2)
+
+        async def trabalhador():
+            while True:
+                item = await fila.get()
+                if item is None:
+                    return
+                indice, payload = item
+                await _enviar_agendamento(sessao, url, cabecalhos, indice, payload, limitador,
+                                          estatisticas, tentativas, espera_base)
+
+        trabalhadores = [asyncio.create_task(trabalhador()) for _ in range(concorrencia)]
+        try:
+            for item in enumerate(payloads):
+                await fila.put(item)
+            for _ in trabalhadores:
+                await fila.put(None)
+            await asyncio.gather(*trabalhadores)
+        finally:
+            for tarefa in trabalhadores:
+                tarefa.cancel()
+
+    if ao_progredir:
+        ao_progredir(estatisticas.resumo())
+
+    return {**estatisticas.resumo(), "lista_falhas": estatisticas.falhas}
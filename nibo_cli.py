@@ -0,0 +1,403 @@
+"""Geração em lote pela linha de comando, sem a interface do Streamlit
+
+Processa várias planilhas de uma vez, uma por processo, e grava os artefatos
+do Postman no diretório de saída:
+
+    python nibo_cli.py planilhas/ -s saida/ -t runner --token SEU_TOKEN
+    python nibo_cli.py "clientes/*.xlsx" outra.csv -s saida/ -t zip -p 4
+    python nibo_cli.py grande.xlsx -s saida/ -t colecao --max-itens 5000 --pastas stakeholder
+    python nibo_cli.py planilha.xlsx -s saida/ -t reenvio --relatorios newman.json --token SEU_TOKEN
+    python nibo_cli.py nomes.xlsx -s saida/ --cadastro stakeholders stakeholders.json --cadastro categorias categorias.csv
+
+Como no app, os agendamentos já confirmados no diário de envios (NIBO_DIARIO)
+ficam fora dos artefatos, a não ser com --incluir-confirmados.
+
+Sai com status 1 se alguma planilha tiver erros de validação ou falhar.
+"""
+import os
+import sys
+import glob
+import json
+import time
+import argparse
+import contextlib
+import itertools
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from versoes_planilha import VersoesPlanilha
+from cache_planilhas import ler_planilha_com_cache
+from conciliacao_runner import ler_dados_runner, conciliar, registrar_no_diario, tabela_conciliacao
+from cadastros_nibo import CADASTROS, CadastrosNibo, ler_cadastro
+from diario_envios import DiarioEnvios
+from nibo_core import (
+    OPCOES_COMPRESSAO_ZIP,
+    colunas_faltando,
+    mensagens_validacao,
+    erros_por_linha,
+    ler_planilha,
+    ler_planilha_em_blocos,
+    resumir_em_blocos,
+    payloads_da_planilha,
+    escrever_colecao_postman,
+    criar_zip_com_jsons,
+    estrutura_colecao_runner,
+    escrever_dados_runner,
+    escrever_dados_runner_json,
+    exportar_todos_artefatos,
+    impressoes_linhas,
+    comparar_versoes,
+    linhas_a_regenerar,
+    dividir_colecao_postman,
+    payloads_com_linhas,
+    resolver_nomes,
+    resolver_blocos,
+    nova_resolucao,
+    tabela_nomes_sem_id,
+    CRITERIOS_PASTA,
+)
+
+EXTENSOES_PLANILHA = ('.xlsx', '.xls', '.csv')
+
+TIPOS_SAIDA = {
+    'runner': "Coleção para Collection Runner + CSV de dados",
+    'colecao': "Coleção tradicional (uma requisição por agendamento; com --max-itens, --max-mb ou --pastas, dividida em um ZIP com manifesto)",
+    'zip': "ZIP com JSONs individuais",
+    'todos': "Os três artefatos acima, gerados em uma passada só e juntos em um ZIP",
+    'reenvio': "Concilia os relatórios de uma execução do Runner (--relatorios) com a planilha: CSV da conciliação e coleção do Runner + dados só com as falhas",
+}
+
+# Nomes curtos, para a linha de comando, das opções de compressão do ZIP
+COMPRESSOES_ZIP = dict(zip(['padrao', 'rapida', 'maxima', 'nenhuma'], OPCOES_COMPRESSAO_ZIP))
+
+def listar_planilhas(entradas):
+    """Expande diretórios e padrões glob nas planilhas a processar, sem repetir arquivos"""
+    encontrados = []
+    for entrada in entradas:
+        if os.path.isdir(entrada):
+            candidatos = sorted(os.path.join(entrada, nome) for nome in os.listdir(entrada))
+        else:
+            candidatos = sorted(glob.glob(entrada)) or [entrada]
+        encontrados += [c for c in candidatos if c.lower().endswith(EXTENSOES_PLANILHA) and os.path.isfile(c)]
+    return list(dict.fromkeys(os.path.abspath(c) for c in encontrados))
+
+def nomes_de_saida(planilhas):
+    """Prefixo dos artefatos de cada planilha; usa a extensão no nome só quando há conflito"""
+    bases = [os.path.splitext(os.path.basename(c))[0] for c in planilhas]
+    repetidas = {base for base in bases if bases.count(base) > 1}
+    return {
+        caminho: os.path.basename(caminho).replace('.', '_') if base in repetidas else base
+        for caminho, base in zip(planilhas, bases)
+    }
+
+def processar_planilha(caminho, prefixo, opcoes):
+    """Valida uma planilha e grava os artefatos pedidos; roda em um processo do pool"""
+    resultado = {'arquivo': caminho, 'status': 'ok', 'linhas': 0, 'agendamentos': 0, 'erros': [], 'artefatos': []}
+
+    def destino(sufixo):
+        return os.path.join(opcoes['saida'], f"{prefixo}{sufixo}")
+
+    # Nomes nas colunas de ID viram IDs pelos cadastros importados, antes da validação
+    indices = opcoes['cadastros']
+    resolucao = nova_resolucao()
+    # Aberto durante a escrita dos artefatos, que consome os payloads filtrados à medida que os grava
+    diario = DiarioEnvios() if opcoes['pular_confirmados'] else contextlib.nullcontext()
+    contagem_diario = {}
+
+    with open(caminho, 'rb') as arquivo, diario:
+        if opcoes['streaming']:
+            blocos = ler_planilha_em_blocos(arquivo, caminho)
+            if indices:
+                blocos = resolver_blocos(blocos, indices, resolucao)
+            df = next(blocos, None)
+        else:
+            if opcoes['cache']:
+                df, _ = ler_planilha_com_cache(arquivo, caminho)
+            else:
+                df = ler_planilha(arquivo, caminho)
+            if indices:
+                df = resolver_nomes(df, indices, resolucao)
+            blocos = iter([])
+
+        faltando = colunas_faltando(df) if df is not None else []
+        if df is None or faltando:
+            resultado['status'] = 'colunas'
+            resultado['linhas'] = len(df) if df is not None else 0
+            resultado['erros'] = [f"Colunas obrigatórias não encontradas: {', '.join(faltando) or 'planilha vazia'}"]
+            return resultado
+
+        resumo, relatorio, conversoes = resumir_em_blocos(itertools.chain([df], blocos), list(indices or ()))
+        resultado['linhas'] = resumo['linhas']
+        resultado['erros'] = mensagens_validacao(relatorio)
+        if indices:
+            resultado['nomes_traduzidos'] = sum(resolucao['linhas_resolvidas'].values())
+            resultado['nomes_sem_id'] = len(resolucao['sem_id'])
+            if resolucao['sem_id']:
+                caminho_nomes = destino('_nomes_sem_id.csv')
+                tabela_nomes_sem_id(resolucao).to_csv(caminho_nomes, index=False, encoding='utf-8-sig')
+                resultado['artefatos'].append(caminho_nomes)
+        if resultado['erros']:
+            resultado['status'] = 'invalida'
+            caminho_erros = destino('_erros.csv')
+            erros_por_linha(relatorio).to_csv(caminho_erros, index=False, encoding='utf-8-sig')
+            resultado['artefatos'].append(caminho_erros)
+            if not opcoes['forcar']:
+                return resultado
+
+        if opcoes['tipo'] == 'reenvio':
+            return conciliar_planilha(df, conversoes, prefixo, opcoes, destino, resultado)
+
+        # Versão corrigida de uma planilha já gerada: só as linhas novas ou alteradas viram artefatos
+        incremental = opcoes['incremental'] and not opcoes['streaming']
+        if incremental:
+            impressoes = impressoes_linhas(df, conversoes)
+            with VersoesPlanilha() as versoes:
+                anterior = versoes.ultima(os.path.basename(caminho))
+            if anterior is not None:
+                diferencas = comparar_versoes(anterior, impressoes)
+                resultado['diferencas'] = {
+                    'versao_anterior': anterior['gerada_em'],
+                    'novas': len(diferencas['novas']),
+                    'alteradas': len(diferencas['alteradas']),
+                    'removidas': diferencas['removidas'],
+                    'inalteradas': diferencas['inalteradas'],
+                }
+                df, conversoes = df.iloc[linhas_a_regenerar(impressoes, diferencas, opcoes['agrupar'])], None
+
+        # No modo streaming a planilha é lida de novo, bloco a bloco, enquanto os artefatos são gravados
+        payloads = payloads_da_planilha(arquivo, df, opcoes['streaming'], None if opcoes['streaming'] else conversoes, opcoes['agrupar'], indices)
+        if opcoes['pular_confirmados']:
+            payloads = diario.filtrar_pendentes(payloads, contagem_diario)
+
+        if opcoes['tipo'] == 'colecao' and (opcoes['max_itens'] or opcoes['max_mb'] or opcoes['pastas']):
+            caminho_partes = destino('_collections.zip')
+            with open(caminho_partes, 'wb') as saida:
+                _, manifesto = dividir_colecao_postman(payloads, opcoes['token'], f"{opcoes['nome']} - {prefixo}",
+                                                       opcoes['max_itens'], int((opcoes['max_mb'] or 0) * 2 ** 20) or None,
+                                                       opcoes['pastas'], opcoes['compacto'], destino=saida)
+            resultado['agendamentos'] = manifesto['total_agendamentos']
+            resultado['artefatos'].append(caminho_partes)
+
+        elif opcoes['tipo'] == 'colecao':
+            caminho_colecao = destino('_collection.json')
+            with open(caminho_colecao, 'wb') as saida:
+                resultado['agendamentos'] = escrever_colecao_postman(saida, payloads, opcoes['token'], f"{opcoes['nome']} - {prefixo}", opcoes['compacto'])
+            resultado['artefatos'].append(caminho_colecao)
+
+        elif opcoes['tipo'] == 'runner':
+            # Mesmos bytes do app: dados escritos registro a registro direto dos payloads, sem BOM
+            caminho_colecao, caminho_dados = destino('_runner_collection.json'), destino(f"_runner_data.{opcoes['dados_runner']}")
+            with open(caminho_dados, 'wb') as saida:
+                escrever = escrever_dados_runner_json if opcoes['dados_runner'] == 'json' else escrever_dados_runner
+                resultado['agendamentos'] = escrever(saida, payloads)
+            with open(caminho_colecao, 'w', encoding='utf-8') as saida:
+                json.dump(estrutura_colecao_runner(opcoes['token'], f"{opcoes['nome']} - {prefixo}"), saida, indent=2, ensure_ascii=False)
+            resultado['artefatos'] += [caminho_colecao, caminho_dados]
+
+        elif opcoes['tipo'] == 'todos':
+            compressao, nivel = OPCOES_COMPRESSAO_ZIP[COMPRESSOES_ZIP[opcoes['compressao']]]
+            caminho_pacote = destino('_artefatos.zip')
+            with open(caminho_pacote, 'wb') as saida:
+                _, resultado['agendamentos'] = exportar_todos_artefatos(payloads, opcoes['token'], f"{opcoes['nome']} - {prefixo}",
+                                                                        opcoes['compacto'], compressao, nivel, destino=saida)
+            resultado['artefatos'].append(caminho_pacote)
+
+        else:
+            compressao, nivel = OPCOES_COMPRESSAO_ZIP[COMPRESSOES_ZIP[opcoes['compressao']]]
+            caminho_zip = destino('_jsons.zip')
+            with open(caminho_zip, 'wb') as saida:
+                _, resultado['agendamentos'] = criar_zip_com_jsons(payloads, compressao, nivel, destino=saida, compacto=opcoes['compacto'])
+            resultado['artefatos'].append(caminho_zip)
+
+    if contagem_diario.get('ignorados'):
+        resultado['ja_confirmados'] = contagem_diario['ignorados']
+    if incremental:
+        with VersoesPlanilha() as versoes:
+            versoes.guardar(os.path.basename(caminho), impressoes)
+    return resultado
+
+def conciliar_planilha(df, conversoes, prefixo, opcoes, destino, resultado):
+    """Concilia os relatórios com a planilha e grava a conciliação e o lote de reenvio só com as falhas
+
+    Os agendamentos que o Runner criou são confirmados no diário de envios
+    (NIBO_DIARIO, o mesmo do app) e as falhas que ele já confirmou ficam fora
+    do lote.
+    """
+    relatorios = []
+    for caminho_relatorio in opcoes['relatorios']:
+        with open(caminho_relatorio, 'rb') as arquivo:
+            relatorios.append(json.load(arquivo))
+    dados_execucao = None
+    if opcoes['dados_execucao']:
+        with open(opcoes['dados_execucao'], 'rb') as arquivo:
+            dados_execucao = ler_dados_runner(arquivo, opcoes['dados_execucao'])
+
+    payloads, linhas = payloads_com_linhas(df, conversoes, opcoes['agrupar'])
+    resultado['conciliacao'], situacoes = conciliar(relatorios, payloads, dados_execucao)
+    caminho_conciliacao = destino('_conciliacao.csv')
+    tabela_conciliacao(payloads, linhas, situacoes, df).to_csv(caminho_conciliacao, index=False, encoding='utf-8-sig')
+    resultado['artefatos'].append(caminho_conciliacao)
+
+    with DiarioEnvios() as diario:
+        falhas = registrar_no_diario(diario, resultado['conciliacao'], payloads, situacoes)
+    resultado['agendamentos'] = len(falhas)
+    if falhas:
+        caminho_colecao, caminho_dados = destino('_reenvio_collection.json'), destino(f"_reenvio_data.{opcoes['dados_runner']}")
+        with open(caminho_dados, 'wb') as saida:
+            (escrever_dados_runner_json if opcoes['dados_runner'] == 'json' else escrever_dados_runner)(saida, falhas)
+        with open(caminho_colecao, 'w', encoding='utf-8') as saida:
+            json.dump(estrutura_colecao_runner(opcoes['token'], f"{opcoes['nome']} - {prefixo} - reenvio"), saida, indent=2, ensure_ascii=False)
+        resultado['artefatos'] += [caminho_colecao, caminho_dados]
+    return resultado
+
+def _processar_com_captura(caminho, prefixo, opcoes):
+    """Como processar_planilha, mas transforma exceções em resultado com status 'falha'"""
+    inicio = time.perf_counter()
+    try:
+        resultado = processar_planilha(caminho, prefixo, opcoes)
+    except Exception as e:
+        resultado = {'arquivo': caminho, 'status': 'falha', 'linhas': 0, 'agendamentos': 0,
+                     'erros': [f"{type(e).__name__}: {e}"], 'artefatos': []}
+    resultado['duracao'] = time.perf_counter() - inicio
+    return resultado
+
+def processar_lote(planilhas, opcoes, processos=None, ao_concluir=None):
+    """Processa as planilhas em paralelo, uma por processo; devolve os resultados na ordem de entrada"""
+    prefixos = nomes_de_saida(planilhas)
+    processos = max(1, min(processos or os.cpu_count() or 1, len(planilhas) or 1))
+    resultados = {}
+
+    if processos == 1:
+        # Uma planilha só (ou um processo): sem o custo de subir o pool
+        for caminho in planilhas:
+            resultados[caminho] = _processar_com_captura(caminho, prefixos[caminho], opcoes)
+            if ao_concluir:
+                ao_concluir(resultados[caminho])
+    else:
+        with ProcessPoolExecutor(max_workers=processos) as executor:
+            futuros = {executor.submit(_processar_com_captura, caminho, prefixos[caminho], opcoes): caminho for caminho in planilhas}
+            for futuro in as_completed(futuros):
+                resultados[futuros[futuro]] = futuro.result()
+                if ao_concluir:
+                    ao_concluir(resultados[futuros[futuro]])
+
+    return [resultados[caminho] for caminho in planilhas]
+
+def _mostrar_resultado(resultado):
+    simbolo = {'ok': '✅', 'invalida': '⚠️', 'colunas': '❌', 'falha': '❌'}[resultado['status']]
+    print(f"{simbolo} {os.path.basename(resultado['arquivo'])}: {resultado['linhas']} linha(s), "
+          f"{resultado['agendamentos']} agendamento(s)", flush=True)
+    if 'diferencas' in resultado:
+        diferencas = resultado['diferencas']
+        print(f"    ♻️ desde {diferencas['versao_anterior']}: {diferencas['novas']} nova(s), {diferencas['alteradas']} alterada(s), "
+              f"{diferencas['removidas']} removida(s), {diferencas['inalteradas']} sem mudança", flush=True)
+    if 'nomes_traduzidos' in resultado:
+        print(f"    🔎 {resultado['nomes_traduzidos']} célula(s) com nome traduzida(s) em ID; "
+              f"{resultado['nomes_sem_id']} nome(s) sem ID nos cadastros", flush=True)
+    if 'ja_confirmados' in resultado:
+        print(f"    🧾 {resultado['ja_confirmados']} agendamento(s) já confirmado(s) no diário de envios ficaram de fora", flush=True)
+    if 'conciliacao' in resultado:
+        conciliacao = resultado['conciliacao']
+        print(f"    🧾 {conciliacao['iteracoes']} iteração(ões) em {conciliacao['relatorios']} relatório(s): "
+              f"{conciliacao['com_sucesso']} agendamento(s) com sucesso, {conciliacao['com_falha']} com falha (no lote de reenvio), "
+              f"{conciliacao['nao_executados']} não executado(s); {conciliacao['sem_correspondencia']} iteração(ões) sem linha na planilha", flush=True)
+        print(f"    🧾 {conciliacao['registrados_diario']} agendamento(s) registrado(s) no diário de envios; "
+              f"{conciliacao['ja_confirmados']} falha(s) já confirmada(s) no diário fora do lote de reenvio", flush=True)
+    for erro in resultado['erros']:
+        print(f"    {erro}", flush=True)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Gera coleções do Postman para a API do Nibo a partir de várias planilhas")
+    parser.add_argument('entradas', nargs='+', help="Planilhas (.xlsx/.xls/.csv), diretórios ou padrões glob")
+    parser.add_argument('-s', '--saida', required=True, help="Diretório onde os artefatos são gravados")
+    parser.add_argument('-t', '--tipo', choices=list(TIPOS_SAIDA), default='runner',
+                        help="; ".join(f"{tipo}: {descricao}" for tipo, descricao in TIPOS_SAIDA.items()))
+    parser.add_argument('--token', default=os.environ.get('NIBO_API_TOKEN'), help="Token da API Nibo (padrão: $NIBO_API_TOKEN)")
+    parser.add_argument('--nome', default="Nibo Agendamentos Automáticos", help="Nome base das coleções")
+    parser.add_argument('-p', '--processos', type=int, default=None, help="Planilhas processadas em paralelo (padrão: número de CPUs)")
+    parser.add_argument('--streaming', action='store_true', help="Lê as planilhas em blocos, para arquivos muito grandes")
+    parser.add_argument('--compressao', choices=list(COMPRESSOES_ZIP), default='padrao',
+                        help="; ".join(f"{nome}: {opcao}" for nome, opcao in COMPRESSOES_ZIP.items()) + " (só para -t zip e -t todos)")
+    parser.add_argument('--agrupar', action='store_true',
+                        help="Junta as linhas com stakeholderId, reference, date e Vencimento iguais em um só agendamento")
+    parser.add_argument('--incremental', action='store_true',
+                        help="Gera só as linhas novas ou alteradas desde a última geração da planilha (pelo nome do arquivo); não vale com --streaming")
+    parser.add_argument('--sem-cache', action='store_true',
+                        help="Não usa o cache em disco das planilhas já lidas (diretório em NIBO_CACHE_PLANILHAS)")
+    parser.add_argument('--compacto', action='store_true', help="JSON compacto nos bodies das requisições e nos arquivos do ZIP")
+    parser.add_argument('--dados-runner', choices=['csv', 'json'], default='csv',
+                        help="Formato do arquivo de dados do Runner; o JSON leva cada agendamento como objeto (só para -t runner e -t reenvio)")
+    parser.add_argument('--relatorios', nargs='+', default=[],
+                        help="Relatórios JSON da execução (Newman -r json ou 'Export Results' do Runner), do mais antigo ao mais recente (só para -t reenvio)")
+    parser.add_argument('--dados-execucao',
+                        help="Arquivo de dados usado na execução; necessário para os relatórios do Runner do Postman, que não trazem o body (só para -t reenvio)")
+    parser.add_argument('--max-itens', type=int, help="Divide a coleção em partes de até N requisições (só para -t colecao)")
+    parser.add_argument('--max-mb', type=float, help="Divide a coleção em arquivos de até N MB (só para -t colecao)")
+    parser.add_argument('--pastas', choices=list(CRITERIOS_PASTA), help="Agrupa as requisições em pastas do Postman (só para -t colecao)")
+    parser.add_argument('--cadastro', nargs=2, action='append', default=[], metavar=('TIPO', 'ARQUIVO'),
+                        help=f"Importa a exportação (CSV, Excel ou JSON) de um cadastro do Nibo ({', '.join(CADASTROS)}), que fica guardada "
+                             "para as próximas execuções; os nomes nas colunas de ID viram IDs pelos cadastros importados")
+    parser.add_argument('--sem-cadastros', action='store_true', help="Não traduz os nomes das colunas de ID pelos cadastros importados")
+    parser.add_argument('--incluir-confirmados', action='store_true',
+                        help="Não consulta o diário de envios (NIBO_DIARIO): gera também os agendamentos que o Nibo já confirmou")
+    parser.add_argument('--forcar', action='store_true', help="Gera os artefatos mesmo com erros de validação")
+    args = parser.parse_args(argv)
+
+    if args.tipo != 'zip' and not args.token:
+        parser.error("informe o token da API Nibo com --token ou NIBO_API_TOKEN")
+
+    if args.tipo == 'reenvio' and not args.relatorios:
+        parser.error("-t reenvio precisa dos relatórios da execução em --relatorios")
+    if args.tipo == 'reenvio' and args.streaming:
+        parser.error("-t reenvio lê a planilha inteira; não vale com --streaming")
+
+    planilhas = listar_planilhas(args.entradas)
+    if not planilhas:
+        parser.error("nenhuma planilha .xlsx/.xls/.csv encontrada nas entradas")
+    os.makedirs(args.saida, exist_ok=True)
+
+    with CadastrosNibo() as cadastros:
+        for tipo, caminho in args.cadastro:
+            try:
+                with open(caminho, 'rb') as arquivo:
+                    registros = cadastros.importar(tipo, *ler_cadastro(arquivo, caminho), os.path.basename(caminho))
+            except (OSError, ValueError) as e:
+                parser.error(f"não foi possível importar o cadastro {caminho}: {e}")
+            print(f"📇 Cadastro de {tipo}: {registros} registro(s) importado(s) de {caminho}", flush=True)
+        # Montados uma vez aqui e levados a cada processo junto com as opções
+        indices = None if args.sem_cadastros else cadastros.indices() or None
+
+    opcoes = {
+        'saida': os.path.abspath(args.saida),
+        'tipo': args.tipo,
+        'token': args.token,
+        'nome': args.nome,
+        'streaming': args.streaming,
+        'compressao': args.compressao,
+        'compacto': args.compacto,
+        'agrupar': args.agrupar,
+        'incremental': args.incremental,
+        'cache': not args.sem_cache,
+        'dados_runner': args.dados_runner,
+        'relatorios': [os.path.abspath(caminho) for caminho in args.relatorios],
+        'dados_execucao': os.path.abspath(args.dados_execucao) if args.dados_execucao else None,
+        'max_itens': args.max_itens,
+        'max_mb': args.max_mb,
+        'pastas': args.pastas,
+        'cadastros': indices,
+        'pular_confirmados': not args.incluir_confirmados,
+        'forcar': args.forcar,
+    }
+
+    inicio = time.perf_counter()
+    resultados = processar_lote(planilhas, opcoes, args.processos, ao_concluir=_mostrar_resultado)
+
+    # Resumo do lote legível por máquina, ao lado dos artefatos
+    with open(os.path.join(opcoes['saida'], 'resumo_lote.json'), 'w', encoding='utf-8') as arquivo:
+        json.dump(resultados, arquivo, indent=2, ensure_ascii=False)
+
+    com_problema = [r for r in resultados if r['status'] != 'ok']
+    print(f"\n{len(resultados) - len(com_problema)}/{len(resultados)} planilha(s) sem erros, "
+          f"{sum(r['agendamentos'] for r in resultados)} agendamento(s) em {time.perf_counter() - inicio:.1f}s")
+    return 1 if com_problema else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
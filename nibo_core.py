@@ -0,0 +1,1504 @@
+"""Núcleo da conversão planilha -> agendamentos do Nibo, sem dependência do Streamlit
+
+Leitura, validação, montagem dos payloads e geração dos artefatos do Postman
+(coleção tradicional, coleção do Collection Runner e ZIP com JSONs). Usado pela
+interface em app.py e pela linha de comando em nibo_cli.py.
+"""
+import pandas as pd
+import numpy as np
+import os
+import io
+import csv
+import json
+import queue
+import shutil
+import zipfile
+import zlib
+import time
+import itertools
+import functools
+import collections
+import tempfile
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+import openpyxl
+from datetime import datetime
+
+try:
+    # Opcional: serialização JSON bem mais rápida quando instalado
+    import orjson
+except ImportError:
+    orjson = None
+
+BACKEND_JSON = "orjson" if orjson is not None else "json"
+
+COLUNAS_OBRIGATORIAS = [
+    'stakeholderId', 'description', 'reference', 'date', 
+    'Vencimento', 'categoryId', 'value', 'costCenterId'
+]
+
+# Quantidade de linhas lidas por vez no modo streaming
+TAMANHO_BLOCO = 10000
+
+# Acima deste tamanho os artefatos gerados vão para o disco em vez da memória
+LIMITE_ARTEFATO_EM_MEMORIA = 32 * 1024 * 1024
+
+# JSONs comprimidos por tarefa do pool de threads ao montar o ZIP
+LOTE_COMPRESSAO_ZIP = 500
+
+# Payloads repassados por vez a cada artefato no modo "todos os artefatos"
+LOTE_DISTRIBUICAO = 500
+THREADS_COMPRESSAO_ZIP = min(32, (os.cpu_count() or 1) + 4)
+
+# Opções de compressão do ZIP: (método, nível)
+OPCOES_COMPRESSAO_ZIP = {
+    "Padrão (deflate nível 6)": (zipfile.ZIP_DEFLATED, 6),
+    "Rápida (deflate nível 1)": (zipfile.ZIP_DEFLATED, 1),
+    "Máxima (deflate nível 9)": (zipfile.ZIP_DEFLATED, 9),
+    "Sem compressão (ZIP_STORED, mais rápida)": (zipfile.ZIP_STORED, None),
+}
+
+# Códigos de erro da validação por linha (bits; uma linha pode ter vários)
+ERRO_LINHA_VAZIA = 1 << 0
+ERRO_STAKEHOLDER_VAZIO = 1 << 1
+ERRO_DESCRICAO_VAZIA = 1 << 2
+ERRO_DATA_VAZIA = 1 << 3
+ERRO_VENCIMENTO_VAZIO = 1 << 4
+ERRO_VALOR_NAO_NUMERICO = 1 << 5
+ERRO_DATA_INVALIDA = 1 << 6
+ERRO_VENCIMENTO_INVALIDO = 1 << 7
+ERRO_VENCIMENTO_ANTES_DA_DATA = 1 << 8
+ERRO_STAKEHOLDER_ID_INVALIDO = 1 << 9
+ERRO_CATEGORIA_ID_INVALIDO = 1 << 10
+ERRO_CENTRO_CUSTO_ID_INVALIDO = 1 << 11
+ERRO_STAKEHOLDER_SEM_ID = 1 << 12
+ERRO_CATEGORIA_SEM_ID = 1 << 13
+ERRO_CENTRO_CUSTO_SEM_ID = 1 << 14
+
+ERROS_CAMPO_VAZIO = {
+    'stakeholderId': ERRO_STAKEHOLDER_VAZIO,
+    'description': ERRO_DESCRICAO_VAZIA,
+    'date': ERRO_DATA_VAZIA,
+    'Vencimento': ERRO_VENCIMENTO_VAZIO,
+}
+
+# IDs do Nibo são GUIDs
+PADRAO_ID_NIBO = r'[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}'
+ERROS_FORMATO_ID = {
+    'stakeholderId': ERRO_STAKEHOLDER_ID_INVALIDO,
+    'categoryId': ERRO_CATEGORIA_ID_INVALIDO,
+    'costCenterId': ERRO_CENTRO_CUSTO_ID_INVALIDO,
+}
+
+# Nas colunas traduzidas pelos cadastros do Nibo, o que não é GUID é um nome sem ID
+ERROS_NOME_SEM_ID = {
+    'stakeholderId': ERRO_STAKEHOLDER_SEM_ID,
+    'categoryId': ERRO_CATEGORIA_SEM_ID,
+    'costCenterId': ERRO_CENTRO_CUSTO_SEM_ID,
+}
+
+# Aviso agregado de cada erro ({n} = quantidade de linhas)
+DESCRICAO_ERROS = {
+    ERRO_LINHA_VAZIA: "🔍 {n} linha(s) completamente vazia(s) encontrada(s)",
+    ERRO_STAKEHOLDER_VAZIO: "📅 {n} valor(es) nulo(s) na coluna 'stakeholderId'",
+    ERRO_DESCRICAO_VAZIA: "📅 {n} valor(es) nulo(s) na coluna 'description'",
+    ERRO_DATA_VAZIA: "📅 {n} valor(es) nulo(s) na coluna 'date'",
+    ERRO_VENCIMENTO_VAZIO: "📅 {n} valor(es) nulo(s) na coluna 'Vencimento'",
+    ERRO_VALOR_NAO_NUMERICO: "💰 {n} valor(es) não numérico(s) na coluna 'value'",
+    ERRO_DATA_INVALIDA: "📅 {n} data(s) inválida(s) na coluna 'date'",
+    ERRO_VENCIMENTO_INVALIDO: "📅 {n} data(s) inválida(s) na coluna 'Vencimento'",
+    ERRO_VENCIMENTO_ANTES_DA_DATA: "📅 {n} linha(s) com Vencimento anterior à data",
+    ERRO_STAKEHOLDER_ID_INVALIDO: "🆔 {n} ID(s) fora do formato GUID na coluna 'stakeholderId'",
+    ERRO_CATEGORIA_ID_INVALIDO: "🆔 {n} ID(s) fora do formato GUID na coluna 'categoryId'",
+    ERRO_CENTRO_CUSTO_ID_INVALIDO: "🆔 {n} ID(s) fora do formato GUID na coluna 'costCenterId'",
+    ERRO_STAKEHOLDER_SEM_ID: "🔎 {n} nome(s) sem ID nos cadastros na coluna 'stakeholderId'",
+    ERRO_CATEGORIA_SEM_ID: "🔎 {n} nome(s) sem ID nos cadastros na coluna 'categoryId'",
+    ERRO_CENTRO_CUSTO_SEM_ID: "🔎 {n} nome(s) sem ID nos cadastros na coluna 'costCenterId'",
+}
+
+# Descrição curta de cada erro na tabela de linhas com problema
+ROTULOS_ERROS = {
+    ERRO_LINHA_VAZIA: "linha vazia",
+    ERRO_STAKEHOLDER_VAZIO: "stakeholderId vazio",
+    ERRO_DESCRICAO_VAZIA: "description vazia",
+    ERRO_DATA_VAZIA: "date vazia",
+    ERRO_VENCIMENTO_VAZIO: "Vencimento vazio",
+    ERRO_VALOR_NAO_NUMERICO: "value não numérico",
+    ERRO_DATA_INVALIDA: "date inválida",
+    ERRO_VENCIMENTO_INVALIDO: "Vencimento inválido",
+    ERRO_VENCIMENTO_ANTES_DA_DATA: "Vencimento anterior à date",
+    ERRO_STAKEHOLDER_ID_INVALIDO: "stakeholderId fora do formato GUID",
+    ERRO_CATEGORIA_ID_INVALIDO: "categoryId fora do formato GUID",
+    ERRO_CENTRO_CUSTO_ID_INVALIDO: "costCenterId fora do formato GUID",
+    ERRO_STAKEHOLDER_SEM_ID: "stakeholderId sem ID nos cadastros",
+    ERRO_CATEGORIA_SEM_ID: "categoryId sem ID nos cadastros",
+    ERRO_CENTRO_CUSTO_SEM_ID: "costCenterId sem ID nos cadastros",
+}
+
+# Linhas com problema exibidas na tela (o CSV para download traz todas)
+LIMITE_LINHAS_COM_ERRO = 1000
+
+# Linhas com estes campos iguais viram um só agendamento quando as linhas são agrupadas
+CHAVES_AGRUPAMENTO = ['stakeholderId', 'reference', 'date', 'Vencimento']
+
+# Colunas acrescentadas ao juntar várias planilhas/abas, para rastrear a linha até a origem
+COLUNA_ORIGEM = 'origem'
+COLUNA_LINHA_ORIGEM = 'linha_origem'
+COLUNAS_RASTREIO = [COLUNA_ORIGEM, COLUNA_LINHA_ORIGEM]
+
+def colunas_faltando(df):
+    """Colunas obrigatórias ausentes na planilha"""
+    return [col for col in COLUNAS_OBRIGATORIAS if col not in df.columns]
+
+def _sem_rastreio(df):
+    """A planilha sem as colunas de origem, que não contam como dados da linha"""
+    if COLUNA_ORIGEM not in df.columns:
+        return df
+    return df.drop(columns=COLUNAS_RASTREIO, errors='ignore')
+
+def _converter_datas(serie):
+    """Converte uma coluna de datas de uma só vez; o que não for data vira NaT"""
+    if serie.dtype.kind == 'M':
+        return serie
+    datas = pd.to_datetime(serie, errors='coerce', format='ISO8601')
+    
+    # O que não estiver em ISO ainda pode estar no formato brasileiro (dd/mm/aaaa)
+    restantes = datas.isna() & serie.notna()
+    if restantes.any():
+        datas[restantes] = pd.to_datetime(serie[restantes].astype(str), errors='coerce', dayfirst=True, format='mixed')
+    return datas
+
+def _converter_valores(serie, preenchida):
+    """Converte a coluna de valores para float, com 0.0 nas células vazias
+    
+    Retorna os valores e a máscara das células que não são números. A conversão
+    segue float() célula a célula, como na geração dos payloads.
+    """
+    try:
+        return np.asarray(_coluna_valor(serie, preenchida)), np.zeros(len(serie), dtype=bool)
+    except (ValueError, TypeError):
+        numericos = pd.to_numeric(serie, errors='coerce').to_numpy(dtype='float64', na_value=np.nan)
+        invalidos = preenchida & np.isnan(numericos)
+        return np.where(preenchida & ~invalidos, numericos, 0.0), invalidos
+
+def validar_planilha(df, inicio=0, colunas_resolvidas=()):
+    """Valida a planilha (ou um bloco dela) em uma única passada por coluna
+    
+    Retorna o relatório por linha e as conversões já feitas, que a geração dos
+    payloads reaproveita. No relatório, `linhas` traz a posição (somada a
+    `inicio`) de cada linha com problema e `codigos` os bits ERRO_* da linha.
+    Nas `colunas_resolvidas` (já passadas por resolver_nomes), o que não for
+    GUID é apontado como nome sem ID nos cadastros.
+    """
+    vazias = _sem_rastreio(df).isna().all(axis=1).to_numpy()
+    preenchidas = {coluna: df[coluna].notna().to_numpy() for coluna in COLUNAS_OBRIGATORIAS}
+    codigos = np.zeros(len(df), dtype=np.uint16)
+    
+    # Campos obrigatórios
+    for coluna, codigo in ERROS_CAMPO_VAZIO.items():
+        codigos[~preenchidas[coluna]] |= codigo
+    
+    # Valores monetários
+    valores, invalidos = _converter_valores(df['value'], preenchidas['value'])
+    codigos[invalidos] |= ERRO_VALOR_NAO_NUMERICO
+    
+    # Datas legíveis e Vencimento não anterior à data
+    datas = _converter_datas(df['date'])
+    vencimentos = _converter_datas(df['Vencimento'])
+    codigos[preenchidas['date'] & datas.isna().to_numpy()] |= ERRO_DATA_INVALIDA
+    codigos[preenchidas['Vencimento'] & vencimentos.isna().to_numpy()] |= ERRO_VENCIMENTO_INVALIDO
+    codigos[(vencimentos < datas).to_numpy()] |= ERRO_VENCIMENTO_ANTES_DA_DATA
+    
+    # IDs do Nibo (GUID)
+    for coluna, codigo in ERROS_FORMATO_ID.items():
+        if coluna in colunas_resolvidas:
+            codigo = ERROS_NOME_SEM_ID[coluna]
+        formato_ok = df[coluna].astype(str).str.fullmatch(PADRAO_ID_NIBO).to_numpy(dtype=bool, na_value=False)
+        codigos[preenchidas[coluna] & ~formato_ok] |= codigo
+    
+    # Linhas vazias são ignoradas na geração; só esse aviso vale para elas
+    codigos[vazias] = ERRO_LINHA_VAZIA
+    
+    linhas = np.flatnonzero(codigos)
+    relatorio = {
+        'linhas': linhas + inicio,
+        'codigos': codigos[linhas],
+        'contagem': {codigo: int(np.count_nonzero(codigos & codigo)) for codigo in DESCRICAO_ERROS},
+    }
+    conversoes = {
+        'vazias': vazias,
+        'preenchidas': preenchidas,
+        'valores': None if invalidos.any() else valores,
+        'valor_total': float(valores[~vazias].sum()),
+    }
+    return relatorio, conversoes
+
+def juntar_relatorios(relatorios):
+    """Junta os relatórios de validação dos blocos de uma mesma planilha"""
+    relatorios = list(relatorios)
+    return {
+        'linhas': np.concatenate([r['linhas'] for r in relatorios] or [np.zeros(0, dtype=np.int64)]),
+        'codigos': np.concatenate([r['codigos'] for r in relatorios] or [np.zeros(0, dtype=np.uint16)]),
+        'contagem': {codigo: sum(r['contagem'][codigo] for r in relatorios) for codigo in DESCRICAO_ERROS},
+    }
+
+def mensagens_validacao(relatorio):
+    """Transforma as contagens do relatório nas mensagens exibidas ao usuário"""
+    return [
+        DESCRICAO_ERROS[codigo].format(n=n)
+        for codigo, n in relatorio['contagem'].items()
+        if n > 0
+    ]
+
+def erros_por_linha(relatorio, limite=None, df=None):
+    """Tabela com a linha da planilha (contando o cabeçalho) e os erros encontrados nela
+    
+    Com `df` vindo de várias planilhas/abas, a tabela traz a origem e a linha
+    dentro da aba de origem.
+    """
+    linhas, codigos = relatorio['linhas'][:limite], relatorio['codigos'][:limite]
+    tabela = pd.DataFrame({
+        'Linha': linhas + 2,
+        'Erros': [
+            "; ".join(ROTULOS_ERROS[bit] for bit in ROTULOS_ERROS if codigo & bit)
+            for codigo in codigos.tolist()
+        ],
+    })
+    if df is not None and COLUNA_ORIGEM in df.columns:
+        tabela['Linha'] = df[COLUNA_LINHA_ORIGEM].to_numpy()[linhas]
+        tabela.insert(0, 'Origem', df[COLUNA_ORIGEM].to_numpy()[linhas])
+    return tabela
+
+def validar_dados(df):
+    """Valida os dados da planilha"""
+    return mensagens_validacao(validar_planilha(df)[0])
+
+def normalizar_nomes(nomes):
+    """Nomes sem acentos, em minúsculas e com os espaços colapsados, para a comparação aproximada"""
+    nomes = pd.Series(nomes, dtype=object).astype(str)
+    return (
+        nomes.str.normalize('NFKD').str.replace('[\u0300-\u036f]', '', regex=True)
+        .str.casefold().str.replace(r'\s+', ' ', regex=True).str.strip()
+    )
+
+def _indice_unico(chaves, ids):
+    """Série chave -> ID só com as chaves de um único ID, e as chaves com mais de um (ambíguas)"""
+    tabela = pd.DataFrame({'chave': np.asarray(chaves, dtype=object), 'id': np.asarray(ids, dtype=object)}).drop_duplicates()
+    repetidas = tabela['chave'].duplicated(keep=False).to_numpy()
+    return tabela[~repetidas].set_index('chave')['id'], set(tabela.loc[repetidas, 'chave'])
+
+def indexar_cadastro(ids, nomes, nomes_normalizados=None):
+    """Índice de um cadastro do Nibo para resolver_nomes: nome -> ID, exato e normalizado
+    
+    Nomes que levam a mais de um ID ficam de fora e são apontados como ambíguos.
+    """
+    nomes = pd.Series(nomes, dtype=object).astype(str).str.strip()
+    if nomes_normalizados is None:
+        nomes_normalizados = normalizar_nomes(nomes)
+    # Um nome exato com mais de um ID também é ambíguo depois de normalizado
+    exato, _ = _indice_unico(nomes, ids)
+    normalizado, ambiguos = _indice_unico(nomes_normalizados, ids)
+    return {'exato': exato, 'normalizado': normalizado, 'ambiguos': ambiguos}
+
+def _resolver_coluna(serie, indice, coluna, resolucao):
+    """Coluna com os nomes trocados pelos IDs, ou None se nada mudou; a junção é feita sobre os valores distintos"""
+    codigos, distintos = pd.factorize(serie)
+    originais = np.asarray(distintos, dtype=object)
+    nomes = pd.Series(originais).astype(str).str.strip()
+    guid = nomes.str.fullmatch(PADRAO_ID_NIBO).to_numpy(dtype=bool)
+    
+    # Primeiro o nome exato; o que faltar, pelo nome normalizado
+    ids = nomes.map(indice['exato']).to_numpy(dtype=object)
+    faltando = pd.isna(ids) & ~guid
+    normalizados = normalizar_nomes(nomes[faltando])
+    ids[faltando] = normalizados.map(indice['normalizado']).to_numpy(dtype=object)
+    resolvidos = ~pd.isna(ids) & ~guid
+    
+    linhas = np.bincount(codigos[codigos >= 0], minlength=len(originais))
+    resolucao['linhas_resolvidas'][coluna] = resolucao['linhas_resolvidas'].get(coluna, 0) + int(linhas[resolvidos].sum())
+    sem_id = resolucao['sem_id']
+    for posicao, normalizado in zip(np.flatnonzero(faltando), normalizados.tolist()):
+        if resolvidos[posicao]:
+            continue
+        chave = (coluna, nomes[posicao])
+        motivo = "ambíguo" if normalizado in indice['ambiguos'] else "não encontrado"
+        sem_id[chave] = (sem_id.get(chave, (0,))[0] + int(linhas[posicao]), motivo)
+    
+    if not resolvidos.any():
+        return None
+    valores = np.where(resolvidos, ids, originais)
+    # O código -1 (célula vazia) cai no None acrescentado ao fim
+    return pd.Series(np.append(valores, None)[codigos], index=serie.index, name=serie.name)
+
+def resolver_nomes(df, indices, resolucao=None):
+    """Troca, nas colunas de ID, os nomes dos cadastros do Nibo pelos IDs
+    
+    `indices` vai da coluna (stakeholderId, categoryId, costCenterId) ao
+    indexar_cadastro do cadastro correspondente. Valores que já são GUIDs e
+    nomes sem ID ficam como estão (a validação aponta esses últimos, com
+    `colunas_resolvidas`). `resolucao` (dict, de nova_resolucao) acumula as
+    linhas traduzidas por coluna e os nomes sem ID, com as linhas de cada um.
+    """
+    if resolucao is None:
+        resolucao = nova_resolucao()
+    colunas = {
+        coluna: _resolver_coluna(df[coluna], indice, coluna, resolucao)
+        for coluna, indice in indices.items() if coluna in df.columns
+    }
+    alteradas = {coluna: serie for coluna, serie in colunas.items() if serie is not None}
+    return df.assign(**alteradas) if alteradas else df
+
+def nova_resolucao():
+    """Acumulador de resolver_nomes"""
+    return {'linhas_resolvidas': {}, 'sem_id': {}}
+
+def resolver_blocos(blocos, indices, resolucao=None):
+    """resolver_nomes bloco a bloco, acumulando tudo na mesma `resolucao`"""
+    if resolucao is None:
+        resolucao = nova_resolucao()
+    for bloco in blocos:
+        yield resolver_nomes(bloco, indices, resolucao)
+
+def tabela_nomes_sem_id(resolucao):
+    """Nomes sem ID nos cadastros, com as linhas em que aparecem, dos mais frequentes aos menos"""
+    tabela = pd.DataFrame(
+        [(coluna, nome, linhas, motivo) for (coluna, nome), (linhas, motivo) in resolucao['sem_id'].items()],
+        columns=['Coluna', 'Nome', 'Linhas', 'Motivo']
+    )
+    return tabela.sort_values(['Linhas', 'Coluna', 'Nome'], ascending=[False, True, True], ignore_index=True)
+
+def ler_planilha(arquivo, nome_arquivo):
+    """Lê a planilha inteira (CSV ou Excel)"""
+    if nome_arquivo.endswith('.csv'):
+        return pd.read_csv(arquivo)
+    return pd.read_excel(arquivo)
+
+def ler_planilha_em_blocos(arquivo, nome_arquivo, tamanho_bloco=TAMANHO_BLOCO):
+    """Lê a planilha em blocos de linhas, sem carregar o arquivo inteiro na memória"""
+    if nome_arquivo.endswith('.csv'):
+        yield from pd.read_csv(arquivo, chunksize=tamanho_bloco)
+        return
+    
+    if nome_arquivo.endswith('.xls'):
+        # O openpyxl não lê o formato .xls antigo; nesse caso o arquivo vai inteiro
+        yield pd.read_excel(arquivo)
+        return
+    
+    # Modo somente leitura do openpyxl: as linhas são lidas sob demanda
+    workbook = openpyxl.load_workbook(arquivo, read_only=True, data_only=True)
+    try:
+        linhas = workbook.active.iter_rows(values_only=True)
+        cabecalho = next(linhas, None)
+        if cabecalho is None:
+            yield pd.DataFrame()
+            return
+        cabecalho = [f"Unnamed: {i}" if nome is None else nome for i, nome in enumerate(cabecalho)]
+        
+        bloco = []
+        for linha in linhas:
+            bloco.append(linha)
+            if len(bloco) == tamanho_bloco:
+                yield pd.DataFrame(bloco, columns=cabecalho)
+                bloco = []
+        if bloco:
+            yield pd.DataFrame(bloco, columns=cabecalho)
+    finally:
+        workbook.close()
+
+def abas_da_planilha(arquivo, nome_arquivo):
+    """Nomes das abas de uma planilha Excel, na ordem do arquivo; [None] para CSV"""
+    if nome_arquivo.endswith('.csv'):
+        return [None]
+    if nome_arquivo.endswith('.xls'):
+        with pd.ExcelFile(arquivo) as excel:
+            return excel.sheet_names
+    workbook = openpyxl.load_workbook(arquivo, read_only=True)
+    try:
+        return workbook.sheetnames
+    finally:
+        workbook.close()
+
+def _ler_aba(nome_arquivo, dados, aba):
+    """Lê uma aba (ou o CSV inteiro) a partir do conteúdo ou do caminho do arquivo; roda em um processo do pool"""
+    em_disco = isinstance(dados, str)
+    arquivo = dados if em_disco else io.BytesIO(dados)
+    if aba is None:
+        return pd.read_csv(arquivo, memory_map=em_disco)
+    return pd.read_excel(arquivo, sheet_name=aba)
+
+def ler_varias_planilhas(arquivos, processos=None):
+    """Lê várias planilhas, com todas as abas de cada uma, em um único DataFrame
+    
+    `arquivos` são pares (nome do arquivo, conteúdo em bytes ou caminho em
+    disco, que cada processo abre sem copiar o conteúdo). Cada aba é lida em
+    um processo do pool, então o tempo acompanha a maior aba, e não a soma
+    de todas. Abas sem as colunas obrigatórias (ex.: um resumo) ficam de fora;
+    as demais são empilhadas na ordem dos arquivos e abas, com as colunas
+    `origem` ("arquivo › aba") e `linha_origem` (linha na aba, contando o
+    cabeçalho). Retorna o DataFrame e a lista das abas lidas, com as linhas e
+    as colunas faltando de cada uma.
+    """
+    unidades = [
+        (nome, dados, aba) for nome, dados in arquivos
+        for aba in abas_da_planilha(dados if isinstance(dados, str) else io.BytesIO(dados), nome)
+    ]
+    processos = max(1, min(processos or os.cpu_count() or 1, len(unidades)))
+    if processos == 1:
+        # Uma aba só (ou um processo): sem o custo de subir o pool
+        lidas = [_ler_aba(*unidade) for unidade in unidades]
+    else:
+        with ProcessPoolExecutor(max_workers=processos) as executor:
+            lidas = list(executor.map(_ler_aba, *zip(*unidades)))
+    
+    fontes, partes = [], []
+    for (nome, _, aba), df in zip(unidades, lidas):
+        origem = nome if aba is None else f"{nome} › {aba}"
+        faltando = colunas_faltando(df)
+        fontes.append({'origem': origem, 'linhas': len(df), 'faltando': faltando})
+        if not faltando:
+            partes.append(df.assign(**{COLUNA_ORIGEM: origem, COLUNA_LINHA_ORIGEM: np.arange(2, len(df) + 2)}))
+    
+    if not partes:
+        # Nenhuma aba aproveitável: devolve a primeira, para o aviso de colunas faltando
+        return (lidas[0] if lidas else pd.DataFrame()), fontes
+    return pd.concat(partes, ignore_index=True), fontes
+
+def resumir_em_blocos(blocos, colunas_resolvidas=()):
+    """Valida e resume a planilha bloco a bloco, sem manter os dados em memória
+    
+    Retorna o resumo, o relatório de validação e as conversões do último bloco
+    (quando a planilha vem em um bloco só, servem para gerar os payloads).
+    """
+    resumo = {'linhas': 0, 'valor_total': 0.0}
+    stakeholders, categorias = set(), set()
+    relatorios, conversoes = [], None
+    
+    for bloco in blocos:
+        relatorio, conversoes = validar_planilha(bloco, resumo['linhas'], colunas_resolvidas)
+        relatorios.append(relatorio)
+        resumo['linhas'] += len(bloco)
+        resumo['valor_total'] += conversoes['valor_total']
+        stakeholders.update(bloco['stakeholderId'].dropna().unique())
+        categorias.update(bloco['categoryId'].dropna().unique())
+    
+    resumo['stakeholders_unicos'] = len(stakeholders)
+    resumo['categorias_unicas'] = len(categorias)
+    return resumo, juntar_relatorios(relatorios), conversoes
+
+def _coluna_texto(serie, preenchida):
+    """Converte uma coluna inteira para texto, com "" nas células vazias"""
+    # Datas passam por objeto para manter o formato de str(Timestamp)
+    if serie.dtype.kind in 'mM':
+        serie = serie.astype(object)
+    return serie.astype(str).where(preenchida, "").tolist()
+
+def _coluna_valor(serie, preenchida):
+    """Converte uma coluna inteira para float, com 0.0 nas células vazias"""
+    valores = np.zeros(len(serie))
+    valores[preenchida] = serie[preenchida].astype('float64').to_numpy()
+    return valores.tolist()
+
+def preparar_colunas(df, conversoes=None):
+    """Converte de uma só vez as colunas usadas nos payloads de agendamento
+    
+    `conversoes` (de validar_planilha) evita refazer as máscaras de células
+    vazias e a conversão dos valores.
+    """
+    df = _sem_rastreio(df)
+    if conversoes is None or conversoes['valores'] is None:
+        vazias = df.isna().all(axis=1).to_numpy()
+        preenchidas = {coluna: df[coluna].notna().to_numpy() for coluna in COLUNAS_OBRIGATORIAS}
+        valores = None
+    else:
+        vazias, preenchidas, valores = conversoes['vazias'], conversoes['preenchidas'], conversoes['valores']
+    
+    # Pular linhas completamente vazias
+    df = df[~vazias]
+    preenchidas = {coluna: mascara[~vazias] for coluna, mascara in preenchidas.items()}
+    
+    # O antigo df.iterrows() convertia a linha para um tipo comum quando todas
+    # as colunas eram numéricas (ex.: int -> float); mantemos a mesma saída
+    if len(df.columns) and all(isinstance(t, np.dtype) and t.kind in 'iuf' for t in df.dtypes):
+        df = df.astype(np.result_type(*df.dtypes))
+    
+    colunas = {}
+    for coluna in ['stakeholderId', 'description', 'reference', 'date', 'Vencimento', 'categoryId', 'costCenterId']:
+        colunas[coluna] = _coluna_texto(df[coluna], preenchidas[coluna])
+    if valores is None:
+        colunas['value'] = _coluna_valor(df['value'], preenchidas['value'])
+    else:
+        colunas['value'] = valores[~vazias].tolist()
+    
+    return colunas
+
+def montar_payloads(colunas):
+    """Monta em lote os payloads de agendamento a partir das colunas convertidas"""
+    return [
+        {
+            "stakeholderId": stakeholder_id,
+            "description": descricao,
+            "reference": referencia,
+            "scheduleDate": data,
+            "dueDate": vencimento,
+            "accrualDate": data,
+            "categories": [
+                {
+                    "categoryId": categoria_id,
+                    "value": valor
+                }
+            ],
+            "costCenterValueType": 0,
+            "costCenters": [
+                {
+                    "costCenterId": centro_custo_id,
+                    "value": valor
+                }
+            ]
+        }
+        for stakeholder_id, descricao, referencia, data, vencimento, categoria_id, valor, centro_custo_id in zip(
+            colunas['stakeholderId'], colunas['description'], colunas['reference'], colunas['date'],
+            colunas['Vencimento'], colunas['categoryId'], colunas['value'], colunas['costCenterId']
+        )
+    ]
+
+def _rateio_por_grupo(tabela, coluna):
+    """Entradas {coluna: id, "value": soma} de cada grupo, na ordem em que os ids aparecem
+    
+    Só as somas de mais de uma linha são arredondadas em centavos, para tirar
+    o resíduo de ponto flutuante; o valor de uma linha sozinha sai como está,
+    igual ao da geração sem agrupar.
+    """
+    somas = tabela.groupby(['grupo', coluna], sort=False).agg(soma=('value', 'sum'), linhas=('linhas', 'sum')).reset_index()
+    somas = somas.sort_values('grupo', kind='stable')
+    valores = somas['soma'].where(somas['linhas'] == 1, somas['soma'].round(2))
+    entradas = [{coluna: id_, "value": valor} for id_, valor in zip(somas[coluna].tolist(), valores.tolist())]
+    limites = np.cumsum(np.bincount(somas['grupo'].to_numpy())).tolist()
+    return [entradas[inicio:fim] for inicio, fim in zip([0] + limites[:-1], limites)]
+
+def montar_payloads_agrupados(colunas):
+    """Monta um payload por grupo de linhas com os mesmos CHAVES_AGRUPAMENTO
+    
+    Cada grupo vira um agendamento com uma entrada em `categories` por
+    categoria e uma em `costCenters` por centro de custo, com os valores das
+    linhas somados. A descrição é a da primeira linha do grupo, e os grupos
+    saem na ordem em que aparecem. Agrupamento e somas são feitos de uma vez,
+    com groupby, sobre as colunas de preparar_colunas ou sobre a tabela de
+    _reduzir_linhas, que traz em 'linhas' quantas linhas cada uma soma.
+    """
+    tabela = pd.DataFrame(colunas)
+    if tabela.empty:
+        return []
+    if 'linhas' not in tabela:
+        tabela['linhas'] = 1
+    tabela['grupo'] = tabela.groupby(CHAVES_AGRUPAMENTO, sort=False).ngroup()
+    # Os grupos são numerados na ordem em que aparecem, então a primeira linha de cada um sai em ordem
+    primeiras = tabela.drop_duplicates('grupo')
+    
+    return [
+        {
+            "stakeholderId": stakeholder_id,
+            "description": descricao,
+            "reference": referencia,
+            "scheduleDate": data,
+            "dueDate": vencimento,
+            "accrualDate": data,
+            "categories": categorias,
+            "costCenterValueType": 0,
+            "costCenters": centros_custo
+        }
+        for stakeholder_id, descricao, referencia, data, vencimento, categorias, centros_custo in zip(
+            primeiras['stakeholderId'].tolist(), primeiras['description'].tolist(), primeiras['reference'].tolist(),
+            primeiras['date'].tolist(), primeiras['Vencimento'].tolist(),
+            _rateio_por_grupo(tabela, 'categoryId'), _rateio_por_grupo(tabela, 'costCenterId')
+        )
+    ]
+
+def construir_payloads(df, conversoes=None, agrupar=False):
+    """Gera os payloads de agendamento para todas as linhas da planilha
+    
+    Com `agrupar`, as linhas de um mesmo agendamento (ver montar_payloads_agrupados)
+    viram um payload só, com várias categorias e centros de custo.
+    """
+    colunas = preparar_colunas(df, conversoes)
+    return montar_payloads_agrupados(colunas) if agrupar else montar_payloads(colunas)
+
+def payloads_com_linhas(df, conversoes=None, agrupar=False):
+    """construir_payloads e, para cada payload, as posições no df das linhas que o formaram"""
+    colunas = preparar_colunas(df, conversoes)
+    vazias = conversoes['vazias'] if conversoes is not None else _sem_rastreio(df).isna().all(axis=1).to_numpy()
+    posicoes = np.flatnonzero(~vazias)
+    if not agrupar:
+        return montar_payloads(colunas), [[posicao] for posicao in posicoes.tolist()]
+    
+    if not len(posicoes):
+        return [], []
+    
+    # Mesma numeração de grupos de montar_payloads_agrupados
+    grupos = pd.DataFrame({coluna: colunas[coluna] for coluna in CHAVES_AGRUPAMENTO}).groupby(CHAVES_AGRUPAMENTO, sort=False).ngroup().to_numpy()
+    linhas = np.split(posicoes[np.argsort(grupos, kind='stable')], np.cumsum(np.bincount(grupos))[:-1])
+    return montar_payloads_agrupados(colunas), [grupo.tolist() for grupo in linhas]
+
+def serializar_json(dados, compacto=False):
+    """JSON em bytes UTF-8, indentado com 2 espaços ou compacto (sem espaços)
+    
+    Usa o orjson quando instalado; a saída é a mesma do json da biblioteca
+    padrão, a não ser pela notação de floats com expoente muito grande.
+    """
+    if orjson is not None:
+        return orjson.dumps(dados) if compacto else orjson.dumps(dados, option=orjson.OPT_INDENT_2)
+    if compacto:
+        return json.dumps(dados, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    return json.dumps(dados, indent=2, ensure_ascii=False).encode('utf-8')
+
+def serializar_payloads(payloads, compacto=False):
+    """Pares (payload, JSON em bytes), com cada payload serializado uma única vez
+    
+    O mesmo JSON serve de body na coleção tradicional e de arquivo no ZIP (e,
+    no modo compacto, de requestData no Runner).
+    """
+    for payload in payloads:
+        yield payload, serializar_json(payload, compacto)
+
+def _texto_json(texto):
+    """String JSON (com aspas e escapes) do texto"""
+    return json.dumps(texto, ensure_ascii=False)
+
+def _reduzir_linhas(tabela):
+    """Junta as linhas de mesmo grupo, categoria e centro de custo, somando os valores e as 'linhas'
+    
+    A ordem em que aparecem e a descrição da primeira linha se mantêm, então
+    montar_payloads_agrupados dá com a tabela reduzida o mesmo resultado.
+    """
+    return tabela.groupby(CHAVES_AGRUPAMENTO + ['categoryId', 'costCenterId'], sort=False).agg(
+        description=('description', 'first'), value=('value', 'sum'), linhas=('linhas', 'sum')
+    ).reset_index()
+
+def construir_payloads_em_blocos(blocos, agrupar=False):
+    """Gera os payloads de agendamento bloco a bloco, à medida que a planilha é lida
+    
+    Com `agrupar`, uma linha adiante pode entrar em qualquer grupo, como na
+    geração da planilha inteira: cada bloco é reduzido a uma linha por grupo,
+    categoria e centro de custo, as somas parciais se acumulam entre os blocos
+    e os agendamentos saem no fim. Na memória fica só a tabela reduzida.
+    """
+    if not agrupar:
+        for bloco in blocos:
+            yield from construir_payloads(bloco)
+        return
+    
+    # A primeira parte é a junção das anteriores; uma nova junção só quando as
+    # partes passam do dobro dela, para o custo crescer com o total de linhas
+    partes = []
+    for bloco in blocos:
+        tabela = pd.DataFrame(preparar_colunas(bloco))
+        if tabela.empty:
+            continue
+        tabela['linhas'] = 1
+        partes.append(_reduzir_linhas(tabela))
+        if len(partes) > 1 and sum(len(parte) for parte in partes) > 2 * len(partes[0]):
+            partes = [_reduzir_linhas(pd.concat(partes, ignore_index=True))]
+    if partes:
+        yield from montar_payloads_agrupados(_reduzir_linhas(pd.concat(partes, ignore_index=True)) if len(partes) > 1 else partes[0])
+
+def _combinar_hashes(hashes):
+    """Hash de 64 bits por linha a partir dos hashes de cada coluna (a multiplicação estoura de propósito)"""
+    resultado = np.full(len(hashes[0]), 0x345678, dtype=np.uint64)
+    for hash_coluna in hashes:
+        resultado = (resultado ^ hash_coluna) * np.uint64(1000003)
+    return resultado
+
+def impressoes_linhas(df, conversoes=None):
+    """Impressões digitais (hashes de 64 bits) das linhas com dados, das colunas usadas no payload
+    
+    'chaves' identifica a linha entre versões da planilha: stakeholderId e
+    reference, mais a ocorrência do par (1ª, 2ª... linha com esses valores).
+    'conteudos' cobre todas as colunas obrigatórias e 'grupos' as
+    CHAVES_AGRUPAMENTO. 'linhas' traz a posição de cada linha no df. Os
+    valores são os lidos da planilha, sem a conversão para texto dos
+    payloads, que custaria tanto quanto gerá-los; se a leitura mudar o tipo
+    de uma coluna entre versões, as linhas aparecem como alteradas.
+    """
+    vazias = conversoes['vazias'] if conversoes is not None else _sem_rastreio(df).isna().all(axis=1).to_numpy()
+    tabela = df.loc[~vazias, COLUNAS_OBRIGATORIAS]
+    # Cada coluna é hasheada uma vez só e combinada nas três impressões
+    hashes = {coluna: pd.util.hash_pandas_object(tabela[coluna], index=False).to_numpy() for coluna in COLUNAS_OBRIGATORIAS}
+    par = _combinar_hashes([hashes['stakeholderId'], hashes['reference']])
+    ocorrencia = pd.Series(par).groupby(par, sort=False).cumcount().to_numpy()
+    return {
+        'linhas': np.flatnonzero(~vazias),
+        'chaves': _combinar_hashes([par, pd.util.hash_array(ocorrencia)]),
+        'conteudos': _combinar_hashes([hashes[coluna] for coluna in COLUNAS_OBRIGATORIAS]),
+        'grupos': _combinar_hashes([hashes[coluna] for coluna in CHAVES_AGRUPAMENTO]),
+    }
+
+def comparar_versoes(anterior, atual):
+    """Junção por hash das impressões de duas versões da planilha, pela chave de cada linha
+    
+    Retorna as posições (nas linhas de `atual`) das linhas novas e das
+    alteradas, as quantidades de inalteradas e removidas e os grupos
+    (CHAVES_AGRUPAMENTO) das linhas removidas.
+    """
+    unicas = ~pd.Index(anterior['chaves']).duplicated()
+    indice = pd.Index(anterior['chaves'][unicas])
+    posicoes = indice.get_indexer(atual['chaves'])
+    existentes = posicoes >= 0
+    
+    alteradas = np.zeros(len(posicoes), dtype=bool)
+    alteradas[existentes] = anterior['conteudos'][unicas][posicoes[existentes]] != atual['conteudos'][existentes]
+    mantidas = np.zeros(len(indice), dtype=bool)
+    mantidas[posicoes[existentes]] = True
+    return {
+        'novas': np.flatnonzero(~existentes),
+        'alteradas': np.flatnonzero(alteradas),
+        'inalteradas': int(np.count_nonzero(existentes & ~alteradas)),
+        'removidas': int(np.count_nonzero(~mantidas)),
+        'grupos_removidos': anterior['grupos'][unicas][~mantidas],
+    }
+
+def linhas_a_regenerar(atual, diferencas, agrupar=False):
+    """Posições no df das linhas novas e alteradas, que precisam virar artefatos de novo
+    
+    Com `agrupar`, entram todas as linhas dos grupos que ganharam, mudaram
+    ou perderam alguma linha, já que o agendamento do grupo inteiro muda.
+    """
+    selecionadas = np.zeros(len(atual['chaves']), dtype=bool)
+    selecionadas[diferencas['novas']] = True
+    selecionadas[diferencas['alteradas']] = True
+    if agrupar:
+        grupos = np.concatenate([atual['grupos'][selecionadas], diferencas['grupos_removidos']])
+        selecionadas |= np.isin(atual['grupos'], grupos)
+    return atual['linhas'][selecionadas]
+
+def payloads_da_planilha(arquivo, df, modo_streaming, conversoes=None, agrupar=False, indices=None):
+    """Payloads da planilha enviada; no modo streaming são gerados bloco a bloco
+    
+    No modo streaming, com `indices` (de resolver_nomes), os nomes dos blocos
+    lidos de novo são traduzidos em IDs como na análise.
+    """
+    if modo_streaming:
+        # Nova leitura em blocos: os payloads são gerados à medida que a planilha é lida
+        arquivo.seek(0)
+        blocos = ler_planilha_em_blocos(arquivo, arquivo.name)
+        if indices:
+            blocos = resolver_blocos(blocos, indices)
+        return construir_payloads_em_blocos(blocos, agrupar)
+    return construir_payloads(df, conversoes, agrupar)
+
+def converter_planilha_para_json(df, token_api, nome_colecao):
+    """Converte a planilha em formato JSON para coleção Postman"""
+    return montar_colecao_postman(construir_payloads(df), token_api, nome_colecao)
+
+def _info_colecao_postman(nome_colecao):
+    """Cabeçalho "info" da coleção Postman tradicional"""
+    return {
+        "name": nome_colecao,
+        "_postman_id": f"auto-generated-{datetime.now().strftime('%Y%m%d-%H%M%S')}",
+        "schema": "https://schema.getpostman.com/json/collection/v2.1.0/collection.json",
+        "description": f"Coleção gerada automaticamente em {datetime.now().strftime('%d/%m/%Y às %H:%M')}\n\nEndpoint: https://api.nibo.com.br/empresas/v1/schedules/debit"
+    }
+
+def _nome_item_postman(i, item):
+    return f"Agendamento {i+1} - {item['description'][:50]}{'...' if len(item['description']) > 50 else ''}"
+
+def _item_postman(nome, token_api, corpo):
+    """Requisição da coleção tradicional, com o body (JSON já serializado) em `corpo`"""
+    return {
+        "name": nome,
+        "request": {
+            "method": "POST",
+            "header": [
+                {"key": "Content-Type", "value": "application/json"},
+                {"key": "ApiToken", "value": token_api, "type": "text"}
+            ],
+            "url": {
+                "raw": "https://api.nibo.com.br/empresas/v1/schedules/debit",
+                "protocol": "https",
+                "host": ["api", "nibo", "com", "br"],
+                "path": ["empresas", "v1", "schedules", "debit"]
+            },
+            "body": {
+                "mode": "raw",
+                "raw": corpo,
+                "options": {
+                    "raw": {
+                        "language": "json"
+                    }
+                }
+            }
+        },
+        "response": []
+    }
+
+def montar_colecao_postman(json_list, token_api, nome_colecao, compacto=False):
+    """Monta a coleção Postman tradicional a partir dos payloads já gerados"""
+    # Criar coleção Postman
+    colecao_postman = {
+        "info": _info_colecao_postman(nome_colecao),
+        "item": [
+            _item_postman(_nome_item_postman(i, item), token_api, corpo.decode('utf-8'))
+            for i, (item, corpo) in enumerate(serializar_payloads(json_list, compacto))
+        ]
+    }
+    
+    return colecao_postman, len(json_list), json_list
+
+def _json_indentado(dados, nivel):
+    """json.dumps(indent=2) já recuado para o nível em que será escrito"""
+    return json.dumps(dados, indent=2, ensure_ascii=False).replace('\n', '\n' + ' ' * nivel)
+
+def _modelo_item_postman(token_api, nivel=4):
+    """Texto de um item da coleção tradicional, partido onde entram o nome e o body
+    
+    Todos os itens têm a mesma estrutura; só o nome e o body mudam. Montar o
+    texto a partir do modelo evita serializar o dicionário inteiro de cada item.
+    `nivel` é o recuo do item (8 dentro de uma pasta).
+    """
+    modelo = _json_indentado(_item_postman("@@nome@@", token_api, "@@corpo@@"), nivel)
+    antes_nome, resto = modelo.split('"@@nome@@"')
+    antes_corpo, depois_corpo = resto.split('"@@corpo@@"')
+    return antes_nome.encode('utf-8'), antes_corpo.encode('utf-8'), depois_corpo.encode('utf-8')
+
+def escrever_colecao_postman(destino, payloads, token_api, nome_colecao, compacto=False):
+    """Escreve a coleção tradicional item a item em um arquivo binário
+    
+    O resultado é idêntico a json.dumps(colecao, indent=2, ensure_ascii=False),
+    mas só um item fica em memória por vez. Com `compacto`, o body de cada
+    requisição vai em JSON compacto. Retorna o total de requisições.
+    """
+    return _escrever_colecao_serializada(destino, serializar_payloads(payloads, compacto), token_api, nome_colecao)
+
+def _escrever_colecao_serializada(destino, serializados, token_api, nome_colecao):
+    """escrever_colecao_postman a partir dos pares (payload, JSON) de serializar_payloads"""
+    destino.write(f'{{\n  "info": {_json_indentado(_info_colecao_postman(nome_colecao), 2)},\n  "item": ['.encode('utf-8'))
+    antes_nome, antes_corpo, depois_corpo = _modelo_item_postman(token_api)
+    
+    total = 0
+    for i, (item, corpo) in enumerate(serializados):
+        destino.write(b''.join([
+            b',\n    ' if i else b'\n    ',
+            antes_nome, _texto_json(_nome_item_postman(i, item)).encode('utf-8'),
+            antes_corpo, _texto_json(corpo.decode('utf-8')).encode('utf-8'),
+            depois_corpo,
+        ]))
+        total += 1
+    
+    destino.write(('\n  ]\n}' if total else ']\n}').encode('utf-8'))
+    return total
+
+def criar_jsons_individuais(df):
+    """Cria JSONs individuais para cada linha da planilha"""
+    return construir_payloads(df)
+
+def nome_arquivo_json(i, json_data):
+    """Nome do arquivo do i-ésimo JSON individual dentro do ZIP"""
+    # Nome do arquivo baseado na descrição
+    descricao_limpa = "".join(c for c in json_data["description"] if c.isalnum() or c in (' ', '-', '_')).rstrip()
+    return f"agendamento_{i+1:03d}_{descricao_limpa[:30]}.json"
+
+def _comprimir_membro_zip(nome_arquivo, dados, compressao, nivel):
+    """Comprime um JSON individual já serializado (executado nas threads do pool)"""
+    # Mesmos metadados que ZipFile.writestr usaria
+    zinfo = zipfile.ZipInfo(nome_arquivo, date_time=time.localtime(time.time())[:6])
+    zinfo.compress_type = compressao
+    zinfo.external_attr = 0o600 << 16
+    zinfo.file_size = len(dados)
+    zinfo.CRC = zlib.crc32(dados)
+    
+    if compressao == zipfile.ZIP_DEFLATED:
+        # Deflate "cru" (wbits negativo), como o zipfile grava os membros
+        compressor = zlib.compressobj(nivel, zlib.DEFLATED, -15)
+        dados = compressor.compress(dados) + compressor.flush()
+    zinfo.compress_size = len(dados)
+    
+    # O cabeçalho local não depende da posição no ZIP e já sai pronto da thread
+    return zinfo, zinfo.FileHeader() + dados
+
+def _comprimir_lote_zip(inicio, lote, compressao, nivel):
+    """Comprime um lote de pares (payload, JSON); `inicio` é a posição do primeiro no ZIP"""
+    return [
+        _comprimir_membro_zip(nome_arquivo_json(inicio + i, json_data), dados, compressao, nivel)
+        for i, (json_data, dados) in enumerate(lote)
+    ]
+
+def _info_membro_zip(nome, compressao, nivel):
+    """ZipInfo datado, para gravar um membro aos poucos com ZipFile.open(membro, 'w')"""
+    membro = zipfile.ZipInfo(nome, date_time=time.localtime(time.time())[:6])
+    membro.compress_type = compressao
+    # Nível por membro: `compress_level` a partir do Python 3.13, `_compresslevel` antes
+    setattr(membro, 'compress_level' if hasattr(membro, 'compress_level') else '_compresslevel', nivel)
+    membro.external_attr = 0o600 << 16
+    return membro
+
+def _gravar_membro_zip(zip_file, zinfo, membro):
+    """Grava no ZIP um membro já comprimido (cabeçalho local + dados) na posição atual"""
+    zinfo.header_offset = zip_file.fp.tell()
+    zip_file.fp.write(membro)
+    
+    # O diretório central é escrito pelo próprio zipfile ao fechar o arquivo
+    zip_file.start_dir = zip_file.fp.tell()
+    zip_file.filelist.append(zinfo)
+    zip_file.NameToInfo[zinfo.filename] = zinfo
+
+def criar_zip_com_jsons(json_list, compressao=zipfile.ZIP_DEFLATED, nivel=None, destino=None, compacto=False):
+    """Cria arquivo ZIP com JSONs individuais
+    
+    Os JSONs são comprimidos em lotes por um pool de threads (o zlib libera o
+    GIL) e gravados no ZIP na ordem original, com poucos lotes pendentes por
+    vez. O ZIP vai para um temporário que passa para o disco quando fica grande
+    (ou para `destino`, se informado). Com `compacto`, os JSONs vão sem
+    indentação. Retorna o arquivo, posicionado no início, e a quantidade de JSONs.
+    """
+    return _criar_zip_serializado(serializar_payloads(json_list, compacto), compressao, nivel, destino)
+
+def _criar_zip_serializado(serializados, compressao=zipfile.ZIP_DEFLATED, nivel=None, destino=None):
+    """criar_zip_com_jsons a partir dos pares (payload, JSON) de serializar_payloads"""
+    if destino is None:
+        destino = tempfile.SpooledTemporaryFile(max_size=LIMITE_ARTEFATO_EM_MEMORIA)
+    if nivel is None:
+        nivel = zlib.Z_DEFAULT_COMPRESSION
+    
+    with zipfile.ZipFile(destino, 'w', compressao, compresslevel=nivel) as zip_file, ThreadPoolExecutor(THREADS_COMPRESSAO_ZIP) as executor:
+        # Criar arquivo de controle para Collection Runner
+        control_data = []
+        
+        def gravar_lote(futuro):
+            for zinfo, membro in futuro.result():
+                _gravar_membro_zip(zip_file, zinfo, membro)
+                control_data.append({"file": zinfo.filename})
+        
+        # Fila de lotes em compressão; gravados sempre na ordem em que foram enviados
+        pendentes = collections.deque()
+        inicio = 0
+        serializados = iter(serializados)
+        while lote := list(itertools.islice(serializados, LOTE_COMPRESSAO_ZIP)):
+            pendentes.append(executor.submit(_comprimir_lote_zip, inicio, lote, compressao, nivel))
+            inicio += len(lote)
+            if len(pendentes) > 2 * THREADS_COMPRESSAO_ZIP:
+                gravar_lote(pendentes.popleft())
+        while pendentes:
+            gravar_lote(pendentes.popleft())
+        
+        # Criar arquivo de controle data.json
+        control_json = json.dumps(control_data, indent=2, ensure_ascii=False)
+        zip_file.writestr("data.json", control_json)
+        
+        # Criar arquivo README com instruções
+        readme_text = f"""# Nibo API - JSONs Individuais
+Gerado em: {datetime.now().strftime('%d/%m/%Y às %H:%M')}
+
+## IMPORTANTE - API Nibo usa ApiToken no Header
+
+CORRETO: ApiToken: SEU_TOKEN_AQUI
+ERRADO: Authorization: Bearer SEU_TOKEN_AQUI
+
+## Endpoint da API:
+POST https://api.nibo.com.br/empresas/v1/schedules/debit
+
+## Headers necessarios:
+Content-Type: application/json
+ApiToken: SEU_TOKEN_AQUI
+
+## Arquivos inclusos:
+- {len(control_data)} arquivos JSON individuais
+- data.json: Arquivo de controle para Collection Runner
+
+## Como usar no Postman Collection Runner:
+
+1. Crie uma requisicao POST para o endpoint acima
+2. Adicione os headers mencionados
+3. No Pre-request Script, adicione o codigo para ler os arquivos
+4. No Collection Runner, selecione o arquivo data.json
+5. Execute a colecao
+
+Veja o README completo no ZIP para instrucoes detalhadas.
+"""
+        zip_file.writestr("README.txt", readme_text)
+    
+    destino.seek(0)
+    return destino, len(control_data)
+
+def criar_colecao_com_runner(df, token_api, nome_colecao):
+    """Cria coleção otimizada para Collection Runner com arquivo de dados"""
+    return montar_colecao_runner(construir_payloads(df), token_api, nome_colecao)
+
+def montar_colecao_runner(json_list, token_api, nome_colecao):
+    """Monta a coleção do Collection Runner a partir dos payloads já gerados"""
+    # Arquivo de dados para o Runner
+    data_file_list = [
+        {
+            "requestData": serializar_json(json_data, compacto=True).decode('utf-8'),
+            "description": json_data["description"]
+        }
+        for json_data in json_list
+    ]
+    
+    return estrutura_colecao_runner(token_api, nome_colecao), data_file_list, len(data_file_list)
+
+# Ritmo adaptativo da coleção do Runner (em ms): o atraso antes de cada requisição
+# cai a cada resposta saudável e dobra a cada 429/503, que é repetido na mesma iteração
+ATRASO_INICIAL_RUNNER_MS = 200
+ATRASO_MINIMO_AUMENTO_RUNNER_MS = 100
+ATRASO_MAXIMO_RUNNER_MS = 30000
+REDUCAO_ATRASO_RUNNER = 0.9
+ESPERA_BASE_RUNNER_MS = 500
+TENTATIVAS_RUNNER = 5
+STATUS_REPETIR_RUNNER = (429, 503)
+
+# Nome (prefixo) do teste que marca, nos relatórios, uma resposta que será repetida
+TESTE_NOVA_TENTATIVA = "↻ Nova tentativa"
+
+def _configuracao_ritmo_runner():
+    """Constantes do ritmo adaptativo, no topo dos scripts da coleção do Runner"""
+    return (
+        f"const ATRASO_INICIAL_MS = {ATRASO_INICIAL_RUNNER_MS};\n"
+        f"const ATRASO_MINIMO_AUMENTO_MS = {ATRASO_MINIMO_AUMENTO_RUNNER_MS};\n"
+        f"const ATRASO_MAXIMO_MS = {ATRASO_MAXIMO_RUNNER_MS};\n"
+        f"const REDUCAO_ATRASO = {REDUCAO_ATRASO_RUNNER};\n"
+        f"const ESPERA_BASE_MS = {ESPERA_BASE_RUNNER_MS};\n"
+        f"const TENTATIVAS = {TENTATIVAS_RUNNER};\n"
+        f"const STATUS_REPETIR = {json.dumps(list(STATUS_REPETIR_RUNNER))};\n"
+        f"const TESTE_NOVA_TENTATIVA = {json.dumps(TESTE_NOVA_TENTATIVA, ensure_ascii=False)};\n"
+    )
+
+def estrutura_colecao_runner(token_api, nome_colecao):
+    """Coleção do Collection Runner: uma única requisição, com o body vindo do arquivo de dados
+    
+    Os scripts controlam o ritmo sozinhos (o Delay do Runner pode ficar em 0):
+    esperam o atraso atual antes de cada requisição, repetem a iteração em
+    429/503 (respeitando o Retry-After ou com backoff exponencial) e guardam
+    o atraso e a vazão da execução nas variáveis da coleção (nibo_*).
+    """
+    # Coleção otimizada com Pre-request Script
+    pre_request_script = _configuracao_ritmo_runner() + '''
+// Início da execução: zera as estatísticas e volta ao atraso inicial
+const tentativa = Number(pm.collectionVariables.get("nibo_tentativa") || 0);
+if (pm.info.iteration === 0 && tentativa === 0) {
+    ["nibo_enviadas", "nibo_sucessos", "nibo_falhas", "nibo_novas_tentativas"].forEach(function (nome) {
+        pm.collectionVariables.set(nome, 0);
+    });
+    pm.collectionVariables.set("nibo_inicio_ms", Date.now());
+    pm.collectionVariables.set("nibo_atraso_ms", ATRASO_INICIAL_MS);
+    pm.collectionVariables.set("nibo_espera_ms", 0);
+}
+
+// Ritmo adaptativo: espera o atraso atual ou, em uma nova tentativa, o que o servidor pediu
+const atraso = Number(pm.collectionVariables.get("nibo_atraso_ms") || 0);
+const espera = Math.max(atraso, Number(pm.collectionVariables.get("nibo_espera_ms") || 0));
+pm.collectionVariables.set("nibo_espera_ms", 0);
+if (espera > 0) {
+    setTimeout(function () {}, espera);
+}
+
+// Script para carregar dados dinamicamente no Collection Runner
+// No arquivo de dados CSV o requestData é um texto JSON; no arquivo JSON, já é o objeto
+const requestData = pm.iterationData.get("requestData");
+
+if (requestData) {
+    const isText = typeof requestData === "string";
+    
+    // Define o body da requisição com os dados da iteração atual
+    pm.request.body.raw = isText ? requestData : JSON.stringify(requestData);
+    
+    // Log para debug
+    const data = isText ? JSON.parse(requestData) : requestData;
+    console.log("✅ Enviando agendamento:", data.description);
+    console.log("Valor:", data.categories[0].value);
+} else {
+    console.error("❌ Dados não encontrados para esta iteração");
+}'''
+    
+    test_script = _configuracao_ritmo_runner() + '''
+function contar(nome) {
+    const valor = Number(pm.collectionVariables.get(nome) || 0) + 1;
+    pm.collectionVariables.set(nome, valor);
+    return valor;
+}
+
+// Espera pedida no Retry-After (segundos ou data HTTP), em ms
+function esperaRetryAfter(valor) {
+    if (!valor) {
+        return null;
+    }
+    const segundos = Number(valor);
+    if (!isNaN(segundos)) {
+        return Math.max(0, segundos * 1000);
+    }
+    const data = Date.parse(valor);
+    return isNaN(data) ? null : Math.max(0, data - Date.now());
+}
+
+const codigo = pm.response.code;
+const tentativa = Number(pm.collectionVariables.get("nibo_tentativa") || 0);
+let atraso = Number(pm.collectionVariables.get("nibo_atraso_ms") || 0);
+const enviadas = contar("nibo_enviadas");
+
+if (STATUS_REPETIR.includes(codigo) && tentativa < TENTATIVAS) {
+    // API sobrecarregada: desacelera e repete a mesma iteração
+    let espera = esperaRetryAfter(pm.response.headers.get("Retry-After"));
+    if (espera === null) {
+        espera = Math.round(ESPERA_BASE_MS * Math.pow(2, tentativa) * (0.8 + Math.random() * 0.4));
+    }
+    atraso = Math.min(ATRASO_MAXIMO_MS, Math.max(atraso * 2, ATRASO_MINIMO_AUMENTO_MS));
+    pm.collectionVariables.set("nibo_atraso_ms", atraso);
+    pm.collectionVariables.set("nibo_espera_ms", espera);
+    pm.collectionVariables.set("nibo_tentativa", tentativa + 1);
+    contar("nibo_novas_tentativas");
+    
+    // Teste que sempre passa: marca a resposta repetida para a conciliação dos relatórios
+    pm.test(TESTE_NOVA_TENTATIVA + " " + (tentativa + 1) + "/" + TENTATIVAS + " (HTTP " + codigo + ", espera de " + espera + " ms)", function () {});
+    console.warn("⏳ HTTP " + codigo + ": nova tentativa em " + espera + " ms; atraso agora " + atraso + " ms");
+    pm.execution.setNextRequest(pm.info.requestName);
+} else {
+    pm.collectionVariables.set("nibo_tentativa", 0);
+    if (codigo === 200 || codigo === 201) {
+        // Resposta saudável: acelera
+        atraso = Math.floor(atraso * REDUCAO_ATRASO);
+        pm.collectionVariables.set("nibo_atraso_ms", atraso);
+        contar("nibo_sucessos");
+    } else {
+        contar("nibo_falhas");
+    }
+    
+    // Test Script para validar a resposta
+    pm.test("Status code é 200 ou 201", function () {
+        pm.expect(pm.response.code).to.be.oneOf([200, 201]);
+    });
+    
+    pm.test("Resposta não contém erro", function () {
+        const jsonData = pm.response.json();
+        pm.expect(jsonData.error).to.be.undefined;
+    });
+    
+    // Log da resposta
+    console.log("Resposta:", pm.response.text());
+}
+
+// Vazão da execução até aqui, nas variáveis da coleção
+const segundos = Math.max(0.001, (Date.now() - Number(pm.collectionVariables.get("nibo_inicio_ms") || Date.now())) / 1000);
+const sucessos = Number(pm.collectionVariables.get("nibo_sucessos") || 0);
+pm.collectionVariables.set("nibo_requisicoes_por_segundo", (enviadas / segundos).toFixed(2));
+pm.collectionVariables.set("nibo_sucessos_por_segundo", (sucessos / segundos).toFixed(2));
+if (enviadas % 100 === 0) {
+    console.log("📈 " + enviadas + " requisições, " + sucessos + " agendamentos criados, "
+        + (sucessos / segundos).toFixed(2) + "/s, atraso atual " + atraso + " ms");
+}'''
+    
+    colecao_runner = {
+        "info": {
+            "name": f"{nome_colecao} - Collection Runner",
+            "_postman_id": f"runner-generated-{datetime.now().strftime('%Y%m%d-%H%M%S')}",
+            "schema": "https://schema.getpostman.com/json/collection/v2.1.0/collection.json",
+            "description": f"Coleção otimizada para Collection Runner - {datetime.now().strftime('%d/%m/%Y às %H:%M')}\n\n⚠️ IMPORTANTE: Use 'ApiToken' no header, não 'Authorization'\n\n⏱️ O ritmo é adaptativo: deixe o Delay do Runner em 0; o atraso atual e a vazão ficam nas variáveis da coleção (nibo_*)\n\nEndpoint: https://api.nibo.com.br/empresas/v1/schedules/debit"
+        },
+        "item": [
+            {
+                "name": "Criar Agendamento Nibo",
+                "event": [
+                    {
+                        "listen": "prerequest",
+                        "script": {
+                            "exec": pre_request_script.split('\n'),
+                            "type": "text/javascript"
+                        }
+                    },
+                    {
+                        "listen": "test",
+                        "script": {
+                            "exec": test_script.split('\n'),
+                            "type": "text/javascript"
+                        }
+                    }
+                ],
+                "request": {
+                    "method": "POST",
+                    "header": [
+                        {"key": "Content-Type", "value": "application/json", "type": "text"},
+                        {"key": "ApiToken", "value": token_api, "type": "text"}
+                    ],
+                    "url": {
+                        "raw": "https://api.nibo.com.br/empresas/v1/schedules/debit",
+                        "protocol": "https",
+                        "host": ["api", "nibo", "com", "br"],
+                        "path": ["empresas", "v1", "schedules", "debit"]
+                    },
+                    "body": {
+                        "mode": "raw",
+                        "raw": "// Este body será substituído pelo Pre-request Script\n{\n  \"stakeholderId\": \"\",\n  \"description\": \"\"\n}",
+                        "options": {
+                            "raw": {
+                                "language": "json"
+                            }
+                        }
+                    }
+                },
+                "response": []
+            }
+        ],
+        # Estado do ritmo adaptativo e vazão da execução, atualizados pelos scripts
+        "variable": [
+            {"key": "nibo_atraso_ms", "value": str(ATRASO_INICIAL_RUNNER_MS)},
+            {"key": "nibo_espera_ms", "value": "0"},
+            {"key": "nibo_tentativa", "value": "0"},
+            {"key": "nibo_inicio_ms", "value": ""},
+            {"key": "nibo_enviadas", "value": "0"},
+            {"key": "nibo_sucessos", "value": "0"},
+            {"key": "nibo_falhas", "value": "0"},
+            {"key": "nibo_novas_tentativas", "value": "0"},
+            {"key": "nibo_requisicoes_por_segundo", "value": ""},
+            {"key": "nibo_sucessos_por_segundo", "value": ""}
+        ]
+    }
+    
+    return colecao_runner
+
+def escrever_dados_runner(destino, payloads, compacto=True):
+    """Escreve o CSV de dados do Runner em um arquivo binário, linha a linha
+
+    Mesmo conteúdo de pd.DataFrame(data_file_list).to_csv(index=False), sem
+    montar a lista inteira. Retorna a quantidade de linhas.
+    """
+    return _escrever_dados_runner_serializado(destino, serializar_payloads(payloads, compacto), compacto)
+
+def _escrever_dados_runner_serializado(destino, serializados, compacto):
+    """escrever_dados_runner a partir dos pares (payload, JSON) de serializar_payloads"""
+    texto = io.TextIOWrapper(destino, encoding='utf-8', newline='')
+    escritor = csv.writer(texto, lineterminator=os.linesep)
+    escritor.writerow(["requestData", "description"])
+    total = 0
+    for json_data, dados in serializados:
+        # O requestData vai sempre compacto; no modo compacto o JSON já serializado é reaproveitado
+        if not compacto:
+            dados = serializar_json(json_data, compacto=True)
+        escritor.writerow([dados.decode('utf-8'), json_data["description"]])
+        total += 1
+    texto.flush()
+    texto.detach()
+    return total
+
+def escrever_dados_runner_json(destino, payloads):
+    """Escreve os dados do Runner como JSON de iteração do Postman, um registro por linha
+
+    Cada registro traz o payload como objeto em "requestData", e não como
+    texto JSON escapado dentro de uma célula de CSV: o arquivo fica menor e o
+    Runner não precisa reinterpretar o texto a cada iteração. Nada é montado
+    em memória além do registro atual. Retorna a quantidade de registros.
+    """
+    total = 0
+    destino.write(b'[')
+    for json_data, dados in serializar_payloads(payloads, compacto=True):
+        destino.write(b''.join([
+            b',\n' if total else b'\n',
+            b'{"requestData":', dados,
+            b',"description":', _texto_json(json_data["description"]).encode('utf-8'), b'}',
+        ]))
+        total += 1
+    destino.write(b'\n]\n' if total else b']\n')
+    return total
+
+class _FilaLotes:
+    """Fila limitada de lotes entre a passada pelos payloads e um artefato gravado em outra thread"""
+
+    def __init__(self, tamanho=4):
+        self._fila = queue.Queue(tamanho)
+        self._terminou = False
+
+    def __iter__(self):
+        while (lote := self._fila.get()) is not None:
+            yield from lote
+        self._terminou = True
+
+    def entregar(self, lote):
+        self._fila.put(lote)
+
+    def descartar_resto(self):
+        """Esvazia a fila até o fim, para a passada não travar se o artefato parou no meio (erro)"""
+        while not self._terminou:
+            self._terminou = self._fila.get() is None
+
+def _gravar_da_fila(fila, gravacao):
+    try:
+        return gravacao(fila)
+    finally:
+        fila.descartar_resto()
+
+def exportar_todos_artefatos(payloads, token_api, nome_colecao, compacto=False,
+                             compressao=zipfile.ZIP_DEFLATED, nivel=None, destino=None):
+    """Gera a coleção tradicional, a coleção do Runner com o CSV e o ZIP de JSONs de uma vez
+
+    Os payloads são percorridos e serializados uma única vez; cada lote é
+    repassado aos três artefatos, gravados em paralelo, cada um em sua thread
+    (a compressão do ZIP de JSONs segue no pool de threads dele). Os
+    artefatos vão juntos em um ZIP, gravado em `destino` ou em um temporário.
+    Retorna esse ZIP, posicionado no início, e a quantidade de agendamentos.
+    """
+    if destino is None:
+        destino = tempfile.SpooledTemporaryFile(max_size=LIMITE_ARTEFATO_EM_MEMORIA)
+    if nivel is None:
+        nivel = zlib.Z_DEFAULT_COMPRESSION
+
+    with tempfile.SpooledTemporaryFile(max_size=LIMITE_ARTEFATO_EM_MEMORIA) as arquivo_colecao, \
+         tempfile.SpooledTemporaryFile(max_size=LIMITE_ARTEFATO_EM_MEMORIA) as arquivo_dados, \
+         tempfile.SpooledTemporaryFile(max_size=LIMITE_ARTEFATO_EM_MEMORIA) as arquivo_jsons:
+        gravacoes = [
+            lambda serializados: _escrever_colecao_serializada(arquivo_colecao, serializados, token_api, nome_colecao),
+            lambda serializados: _escrever_dados_runner_serializado(arquivo_dados, serializados, compacto),
+            lambda serializados: _criar_zip_serializado(serializados, compressao, nivel, arquivo_jsons)[1],
+        ]
+        filas = [_FilaLotes() for _ in gravacoes]
+
+        with ThreadPoolExecutor(len(gravacoes)) as executor:
+            futuros = [executor.submit(_gravar_da_fila, fila, gravacao) for fila, gravacao in zip(filas, gravacoes)]
+            try:
+                serializados = serializar_payloads(payloads, compacto)
+                while lote := list(itertools.islice(serializados, LOTE_DISTRIBUICAO)):
+                    for fila in filas:
+                        fila.entregar(lote)
+            finally:
+                for fila in filas:
+                    fila.entregar(None)
+            totais = [futuro.result() for futuro in futuros]
+
+        # JSONs e CSV com a compressão escolhida; o ZIP de JSONs já vem comprimido e vai armazenado
+        with zipfile.ZipFile(destino, 'w', compressao, compresslevel=nivel) as pacote:
+            pacote.writestr("nibo_runner_collection.json", json.dumps(estrutura_colecao_runner(token_api, nome_colecao), indent=2, ensure_ascii=False))
+            for nome, arquivo, compressao_membro in [
+                ("nibo_collection.json", arquivo_colecao, compressao),
+                ("nibo_runner_data.csv", arquivo_dados, compressao),
+                ("nibo_jsons.zip", arquivo_jsons, zipfile.ZIP_STORED),
+            ]:
+                arquivo.seek(0)
+                with pacote.open(_info_membro_zip(nome, compressao_membro, nivel), 'w', force_zip64=True) as saida:
+                    shutil.copyfileobj(arquivo, saida, 1024 * 1024)
+
+    destino.seek(0)
+    return destino, totais[0]
+
+@functools.lru_cache(maxsize=4096)
+def _mes_vencimento(vencimento):
+    data = _converter_datas(pd.Series([vencimento], dtype=object))[0] if vencimento else pd.NaT
+    return f"Vencimento {data:%Y-%m}" if not pd.isna(data) else "Sem vencimento"
+
+# Critérios de agrupamento em pastas do Postman: nome da pasta de cada payload
+CRITERIOS_PASTA = {
+    'stakeholder': lambda item: item['stakeholderId'] or "Sem stakeholder",
+    'mes_vencimento': lambda item: _mes_vencimento(item['dueDate']),
+}
+
+class _ParticaoColecao:
+    """Itens já renderizados de uma parte da coleção, por pasta (None quando sem pastas)"""
+
+    # Recuo dos itens e texto em volta de cada pasta, no formato de json.dumps(indent=2)
+    SEPARADOR_ITEM = b',\n    '
+    SEPARADOR_ITEM_PASTA = b',\n        '
+    FECHAMENTO = b'\n  ]\n}'
+
+    def __init__(self, numero, nome_colecao, agrupar):
+        self.numero = numero
+        self.arquivo = f"nibo_collection_{numero:03d}.json"
+        self.nome = f"{nome_colecao} - parte {numero:03d}"
+        self.cabecalho = f'{{\n  "info": {_json_indentado(_info_colecao_postman(self.nome), 2)},\n  "item": ['.encode('utf-8')
+        self.agrupar = agrupar
+        self.pastas = {}
+        self.itens = 0
+        self.tamanho = len(self.cabecalho) + len(self.FECHAMENTO)
+        self.primeiro = self.ultimo = None
+
+    def _abertura_pasta(self, pasta):
+        return b'{\n      "name": ' + _texto_json(pasta).encode('utf-8') + b',\n      "item": [\n        '
+
+    def crescimento(self, pasta, texto):
+        """Bytes a mais na partição se o item entrar (limite superior: conta sempre o separador)"""
+        if not self.agrupar:
+            return len(self.SEPARADOR_ITEM) + len(texto)
+        if pasta in self.pastas:
+            return len(self.SEPARADOR_ITEM_PASTA) + len(texto)
+        return len(self.SEPARADOR_ITEM) + len(self._abertura_pasta(pasta)) + len(texto) + len(b'\n      ]\n    }')
+
+    def adicionar(self, indice, pasta, texto):
+        self.tamanho += self.crescimento(pasta, texto)
+        self.pastas.setdefault(pasta, []).append(texto)
+        self.itens += 1
+        self.primeiro = indice if self.primeiro is None else self.primeiro
+        self.ultimo = indice
+
+    def gravar(self, destino):
+        """Escreve a partição como coleção Postman; retorna os bytes escritos"""
+        if self.agrupar:
+            corpo = self.SEPARADOR_ITEM.join(
+                b''.join([self._abertura_pasta(pasta), self.SEPARADOR_ITEM_PASTA.join(itens), b'\n      ]\n    }'])
+                for pasta, itens in self.pastas.items()
+            )
+        else:
+            corpo = self.SEPARADOR_ITEM.join(self.pastas[None])
+        partes = [self.cabecalho, b'\n    ', corpo, self.FECHAMENTO]
+        for parte in partes:
+            destino.write(parte)
+        return sum(map(len, partes))
+
+def dividir_colecao_postman(payloads, token_api, nome_colecao, max_itens=None, max_bytes=None, agrupar_por=None,
+                            compacto=False, compressao=zipfile.ZIP_DEFLATED, nivel=None, destino=None):
+    """Divide a coleção tradicional em várias coleções menores, em um ZIP com um manifesto
+
+    Em uma passada pelos payloads, cada parte recebe itens até chegar a
+    `max_itens` ou até o próximo item fazer o arquivo passar de `max_bytes`
+    (um item maior que o limite fica sozinho em uma parte). Com `agrupar_por`
+    (chave de CRITERIOS_PASTA), os itens de cada parte ficam em pastas do
+    Postman. Só a parte atual fica em memória; sem limites, a coleção inteira
+    vira uma parte só. O manifesto.json lista as partes, na ordem.
+    Retorna o ZIP, posicionado no início, e o manifesto.
+    """
+    if destino is None:
+        destino = tempfile.SpooledTemporaryFile(max_size=LIMITE_ARTEFATO_EM_MEMORIA)
+    if nivel is None:
+        nivel = zlib.Z_DEFAULT_COMPRESSION
+    pasta_do_item = CRITERIOS_PASTA[agrupar_por] if agrupar_por else (lambda item: None)
+    antes_nome, antes_corpo, depois_corpo = _modelo_item_postman(token_api, 8 if agrupar_por else 4)
+
+    manifesto = {
+        "colecao": nome_colecao,
+        "gerado_em": datetime.now().isoformat(timespec='seconds'),
+        "max_itens": max_itens,
+        "max_bytes": max_bytes,
+        "agrupar_por": agrupar_por,
+        "total_agendamentos": 0,
+        "partes": [],
+    }
+
+    with zipfile.ZipFile(destino, 'w', compressao, compresslevel=nivel) as pacote:
+        def gravar(particao):
+            with pacote.open(_info_membro_zip(particao.arquivo, compressao, nivel), 'w', force_zip64=True) as saida:
+                tamanho = particao.gravar(saida)
+            manifesto["partes"].append({
+                "arquivo": particao.arquivo,
+                "nome": particao.nome,
+                "agendamentos": particao.itens,
+                "primeiro": particao.primeiro + 1,
+                "ultimo": particao.ultimo + 1,
+                "bytes": tamanho,
+                "pastas": {pasta: len(itens) for pasta, itens in particao.pastas.items()} if agrupar_por else None,
+            })
+
+        particao = None
+        for i, (item, corpo) in enumerate(serializar_payloads(payloads, compacto)):
+            texto = b''.join([
+                antes_nome, _texto_json(_nome_item_postman(i, item)).encode('utf-8'),
+                antes_corpo, _texto_json(corpo.decode('utf-8')).encode('utf-8'),
+                depois_corpo,
+            ])
+            pasta = pasta_do_item(item)
+            if particao is not None and (
+                (max_itens and particao.itens >= max_itens)
+                or (max_bytes and particao.tamanho + particao.crescimento(pasta, texto) > max_bytes)
+            ):
+                gravar(particao)
+                particao = None
+            if particao is None:
+                particao = _ParticaoColecao(len(manifesto["partes"]) + 1, nome_colecao, bool(agrupar_por))
+            particao.adicionar(i, pasta, texto)
+            manifesto["total_agendamentos"] += 1
+        if particao is not None:
+            gravar(particao)
+
+        pacote.writestr("manifesto.json", json.dumps(manifesto, indent=2, ensure_ascii=False))
+
+    destino.seek(0)
+    return destino, manifesto
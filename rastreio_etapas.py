@@ -0,0 +1,108 @@
+"""Rastreio de tempo e memória das etapas da geração
+
+Barato o bastante para ficar sempre ligado: cada etapa mede o tempo de
+relógio e de CPU e, por uma thread que amostra a memória do processo (RSS)
+algumas vezes por segundo, o pico de memória enquanto a etapa roda. Não usa
+tracemalloc, que deixaria o pandas e o json visivelmente mais lentos.
+
+A CPU é a da thread que roda a etapa (time.thread_time), e não conta outras
+gerações simultâneas no mesmo processo nem o pool de threads do pyarrow. A
+memória não tem medida por thread: é a do processo inteiro, e inclui o que
+outras gerações simultâneas alocarem no período.
+"""
+import os
+import sys
+import time
+import threading
+import contextlib
+from datetime import datetime
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Intervalo entre as amostras de memória, em segundos
+INTERVALO_AMOSTRAGEM = 0.05
+
+_TAMANHO_PAGINA = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+
+def memoria_rss():
+    """Memória residente do processo em bytes, ou None se não der para medir nesta plataforma"""
+    try:
+        with open('/proc/self/statm', 'rb') as statm:
+            return int(statm.read().split()[1]) * _TAMANHO_PAGINA
+    except (OSError, ValueError, IndexError):
+        pass
+    if resource is None:
+        return None
+    # Fora do Linux só há o pico do processo inteiro (em bytes no macOS)
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return pico if sys.platform == 'darwin' else pico * 1024
+
+class _AmostradorMemoria(threading.Thread):
+    """Thread que guarda o maior RSS visto até ser parada"""
+
+    def __init__(self, intervalo=INTERVALO_AMOSTRAGEM):
+        super().__init__(daemon=True)
+        self.intervalo = intervalo
+        self.pico = memoria_rss()
+        self._parar = threading.Event()
+
+    def run(self):
+        while not self._parar.wait(self.intervalo):
+            self._registrar()
+
+    def _registrar(self):
+        atual = memoria_rss()
+        if atual is not None and (self.pico is None or atual > self.pico):
+            self.pico = atual
+
+    def parar(self):
+        self._parar.set()
+        self.join()
+        self._registrar()
+        return self.pico
+
+class RastreioEtapas:
+    """Lista de etapas medidas de uma geração, exportável como JSON"""
+
+    def __init__(self, **contexto):
+        self.contexto = contexto
+        self.etapas = []
+        self.inicio = datetime.now()
+
+    @contextlib.contextmanager
+    def etapa(self, nome, linhas=None):
+        """Mede o bloco `with`; o registro devolvido pode ter 'linhas' ajustado dentro do bloco"""
+        registro = {'etapa': nome, 'linhas': linhas}
+        memoria_inicial = memoria_rss()
+        amostrador = _AmostradorMemoria()
+        amostrador.start()
+        inicio, inicio_cpu = time.perf_counter(), time.thread_time()
+        try:
+            yield registro
+        finally:
+            segundos = time.perf_counter() - inicio
+            cpu = time.thread_time() - inicio_cpu
+            pico = amostrador.parar()
+            registro.update({
+                'segundos': segundos,
+                'cpu_segundos': cpu,
+                'linhas_por_segundo': registro['linhas'] / segundos if registro['linhas'] and segundos else None,
+                'memoria_inicial_mb': memoria_inicial / 2 ** 20 if memoria_inicial is not None else None,
+                'pico_memoria_mb': pico / 2 ** 20 if pico is not None else None,
+                'aumento_memoria_mb': (pico - memoria_inicial) / 2 ** 20 if None not in (pico, memoria_inicial) else None,
+            })
+            self.etapas.append(registro)
+
+    def total_segundos(self):
+        return sum(registro['segundos'] for registro in self.etapas)
+
+    def para_dict(self):
+        return {
+            'inicio': self.inicio.isoformat(timespec='seconds'),
+            **self.contexto,
+            'total_segundos': self.total_segundos(),
+            'etapas': self.etapas,
+        }
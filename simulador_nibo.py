@@ -0,0 +1,199 @@
+"""Simulador local do endpoint de agendamentos do Nibo, para testes de carga
+
+Imita o POST /empresas/v1/schedules/debit: confere o header ApiToken (401),
+valida o formato do agendamento (400, com a lista de problemas) e responde
+201. Latência, respostas 429 (com Retry-After) e erros 5xx podem ser
+injetados, e um limite de requisições por segundo devolve 429 como o Nibo
+faz quando o cliente passa da conta. Nada sai da máquina:
+
+    python simulador_nibo.py --porta 8080 --latencia-ms 80 --taxa-429 0.02 --taxa-5xx 0.01
+    NIBO_API_URL=http://127.0.0.1:8080/empresas/v1/schedules/debit streamlit run app.py
+
+O carga_nibo.py sobe o simulador no mesmo processo quando não recebe --url.
+"""
+import re
+import sys
+import json
+import math
+import time
+import uuid
+import random
+import asyncio
+import argparse
+from datetime import datetime
+from collections import Counter
+from aiohttp import web
+from nibo_core import PADRAO_ID_NIBO
+
+ROTA_AGENDAMENTOS = "/empresas/v1/schedules/debit"
+
+# Erros de servidor sorteados pela taxa de 5xx
+STATUS_ERRO_SERVIDOR = (500, 502, 503)
+
+def _id_valido(valor):
+    return isinstance(valor, str) and re.fullmatch(PADRAO_ID_NIBO, valor) is not None
+
+def _data_valida(valor):
+    """Data ISO, só a data ou com hora (planilhas Excel levam "AAAA-MM-DD 00:00:00" aos payloads)"""
+    if not isinstance(valor, str):
+        return False
+    try:
+        datetime.fromisoformat(valor)
+    except ValueError:
+        return False
+    return True
+
+def _numero(valor):
+    return isinstance(valor, (int, float)) and not isinstance(valor, bool) and math.isfinite(valor)
+
+def _rateio(payload, campo, campo_id, obrigatorio):
+    """Problemas na lista de categorias ou de centros de custo do agendamento"""
+    itens = payload.get(campo)
+    if itens is None and not obrigatorio:
+        return []
+    if not isinstance(itens, list):
+        return [f"{campo}: lista esperada"]
+    if obrigatorio and not itens:
+        return [f"{campo}: ao menos um item obrigatório"]
+    problemas = []
+    for i, item in enumerate(itens):
+        if not isinstance(item, dict):
+            problemas.append(f"{campo}[{i}]: objeto esperado")
+            continue
+        if not _id_valido(item.get(campo_id)):
+            problemas.append(f"{campo}[{i}].{campo_id}: GUID esperado")
+        if not _numero(item.get("value")):
+            problemas.append(f"{campo}[{i}].value: número esperado")
+    return problemas
+
+def validar_agendamento(payload):
+    """Problemas no formato de um agendamento, como o Nibo os recusaria; lista vazia se ele é aceito"""
+    if not isinstance(payload, dict):
+        return ["o corpo deve ser um objeto JSON"]
+    problemas = []
+    if not _id_valido(payload.get("stakeholderId")):
+        problemas.append("stakeholderId: GUID esperado")
+    if not isinstance(payload.get("description"), str) or not payload["description"].strip():
+        problemas.append("description: texto obrigatório")
+    for campo in ("scheduleDate", "dueDate"):
+        if not _data_valida(payload.get(campo)):
+            problemas.append(f"{campo}: data AAAA-MM-DD obrigatória")
+    if payload.get("accrualDate") is not None and not _data_valida(payload["accrualDate"]):
+        problemas.append("accrualDate: data AAAA-MM-DD esperada")
+    problemas += _rateio(payload, "categories", "categoryId", obrigatorio=True)
+    problemas += _rateio(payload, "costCenters", "costCenterId", obrigatorio=False)
+    return problemas
+
+class SimuladorNibo:
+    """Endpoint de agendamentos do Nibo em um servidor aiohttp, com falhas injetáveis
+
+    `token` None aceita qualquer ApiToken não vazio. A latência de cada
+    resposta é sorteada entre `latencia_ms` ± `variacao_ms`; `taxa_429` e
+    `taxa_5xx` são as frações de requisições respondidas com esses erros;
+    acima de `limite_por_segundo` (token bucket) a resposta é 429. Os
+    sorteios usam `semente`, para execuções repetíveis.
+    """
+
+    def __init__(self, token=None, latencia_ms=0.0, variacao_ms=0.0, taxa_429=0.0, taxa_5xx=0.0,
+                 limite_por_segundo=None, retry_after=1, semente=None):
+        self.token = token
+        self.latencia_ms = latencia_ms
+        self.variacao_ms = variacao_ms
+        self.taxa_429 = taxa_429
+        self.taxa_5xx = taxa_5xx
+        self.limite_por_segundo = limite_por_segundo
+        self.retry_after = retry_after
+        self.status = Counter()
+        self._sorteio = random.Random(semente)
+        self._fichas = limite_por_segundo or 0
+        self._ultimo = time.monotonic()
+        self._servidor = None
+
+    def aplicacao(self):
+        aplicacao = web.Application()
+        aplicacao.router.add_post(ROTA_AGENDAMENTOS, self._agendar)
+        return aplicacao
+
+    def _dentro_do_limite(self):
+        """Consome uma ficha do token bucket; False se o limite por segundo foi excedido"""
+        if not self.limite_por_segundo:
+            return True
+
+        agora = time.monotonic()
+        self._fichas = min(self.limite_por_segundo, self._fichas + (agora - self._ultimo) * self.limite_por_segundo)
+        self._ultimo = agora
+        if self._fichas < 1:
+            return False
+        self._fichas -= 1
+        return True
+
+    def _responder(self, status, corpo, cabecalhos=None):
+        self.status[status] += 1
+        return web.json_response(corpo, status=status, headers=cabecalhos)
+
+    async def _agendar(self, request):
+        latencia = self.latencia_ms + self._sorteio.uniform(-self.variacao_ms, self.variacao_ms)
+        if latencia > 0:
+            await asyncio.sleep(latencia / 1000)
+
+        token = request.headers.get("ApiToken")
+        if not token or (self.token is not None and token != self.token):
+            return self._responder(401, {"message": "ApiToken ausente ou inválido"})
+        if not self._dentro_do_limite() or self._sorteio.random() < self.taxa_429:
+            return self._responder(429, {"message": "Limite de requisições excedido"}, {"Retry-After": str(self.retry_after)})
+        if self._sorteio.random() < self.taxa_5xx:
+            return self._responder(self._sorteio.choice(STATUS_ERRO_SERVIDOR), {"message": "Erro simulado"})
+
+        try:
+            payload = json.loads(await request.read())
+        except ValueError:
+            return self._responder(400, {"message": "JSON inválido"})
+        problemas = validar_agendamento(payload)
+        if problemas:
+            return self._responder(400, {"message": "Agendamento inválido", "errors": problemas})
+        return self._responder(201, {"id": str(uuid.uuid4())})
+
+    async def iniciar(self, host="127.0.0.1", porta=0):
+        """Sobe o simulador no loop atual (porta 0: uma porta livre) e devolve a URL do endpoint"""
+        self._servidor = web.AppRunner(self.aplicacao(), access_log=None)
+        await self._servidor.setup()
+        await web.TCPSite(self._servidor, host, porta).start()
+        return f"http://{host}:{self._servidor.addresses[0][1]}{ROTA_AGENDAMENTOS}"
+
+    async def parar(self):
+        if self._servidor is not None:
+            await self._servidor.cleanup()
+            self._servidor = None
+
+def adicionar_opcoes(parser):
+    """Opções do simulador na linha de comando (também as do carga_nibo.py)"""
+    grupo = parser.add_argument_group("simulador")
+    grupo.add_argument('--latencia-ms', type=float, default=0.0, help="Latência de cada resposta, em ms")
+    grupo.add_argument('--variacao-ms', type=float, default=0.0, help="Variação sorteada em torno da latência, em ms")
+    grupo.add_argument('--taxa-429', type=float, default=0.0, help="Fração das requisições respondida com 429")
+    grupo.add_argument('--taxa-5xx', type=float, default=0.0, help="Fração das requisições respondida com 500/502/503")
+    grupo.add_argument('--limite-simulador', type=float, help="Requisições por segundo aceitas; acima disso, 429")
+    grupo.add_argument('--retry-after', type=int, default=1, help="Segundos no Retry-After dos 429")
+    grupo.add_argument('--semente', type=int, help="Semente dos sorteios, para execuções repetíveis")
+    return grupo
+
+def simulador_das_opcoes(args, token=None):
+    return SimuladorNibo(token, args.latencia_ms, args.variacao_ms, args.taxa_429, args.taxa_5xx,
+                         args.limite_simulador, args.retry_after, args.semente)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Simulador local do endpoint de agendamentos do Nibo")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--porta', type=int, default=8080)
+    parser.add_argument('--token', help="Único ApiToken aceito (padrão: qualquer um não vazio)")
+    adicionar_opcoes(parser)
+    args = parser.parse_args(argv)
+
+    simulador = simulador_das_opcoes(args, args.token)
+    print(f"Simulador do Nibo em http://{args.host}:{args.porta}{ROTA_AGENDAMENTOS} (Ctrl+C para parar)", flush=True)
+    web.run_app(simulador.aplicacao(), host=args.host, port=args.porta, access_log=None, print=None)
+    print("Respostas por status:", dict(sorted(simulador.status.items())))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,37 @@
+import io
+import pandas as pd
+from nibo_core import ler_planilha, ler_planilha_em_blocos, construir_payloads, construir_payloads_em_blocos
+
+def _planilha(linhas):
+    """Planilha com as colunas obrigatórias a partir de tuplas (stakeholderId, reference, categoryId, costCenterId, value)"""
+    return pd.DataFrame({
+        'stakeholderId': [linha[0] for linha in linhas],
+        'description': [f"Linha {i}" for i in range(len(linhas))],
+        'reference': [linha[1] for linha in linhas],
+        'date': ["2024-02-21"] * len(linhas),
+        'Vencimento': ["2024-03-14"] * len(linhas),
+        'categoryId': [linha[2] for linha in linhas],
+        'costCenterId': [linha[3] for linha in linhas],
+        'value': [linha[4] for linha in linhas],
+    })
+
+def test_agrupar_so_arredonda_somas_de_varias_linhas():
+    df = _planilha([("s1", "NF-1", "c1", "k1", 0.1), ("s1", "NF-1", "c1", "k2", 0.2), ("s2", "NF-2", "c2", "k1", 1.2345)])
+    primeiro, segundo = construir_payloads(df, agrupar=True)
+    
+    assert primeiro['categories'] == [{"categoryId": "c1", "value": 0.3}]
+    assert primeiro['costCenters'] == [{"costCenterId": "k1", "value": 0.1}, {"costCenterId": "k2", "value": 0.2}]
+    # Uma linha sozinha sai com o mesmo valor da geração sem agrupar
+    assert segundo['categories'] == [{"categoryId": "c2", "value": 1.2345}]
+    assert construir_payloads(df)[2]['categories'] == segundo['categories']
+
+def test_agrupar_em_blocos_igual_a_planilha_inteira():
+    # Linhas do mesmo agendamento espalhadas: a mesma chave volta em blocos distantes
+    df = _planilha([(f"s{i % 7}", f"NF-{i % 5}", f"c{i % 3}", f"k{i % 2}", round(10 + i * 1.37, 3)) for i in range(60)])
+    conteudo = df.to_csv(index=False).encode('utf-8')
+    inteira = construir_payloads(ler_planilha(io.BytesIO(conteudo), "p.csv"), agrupar=True)
+    
+    em_blocos = list(construir_payloads_em_blocos(ler_planilha_em_blocos(io.BytesIO(conteudo), "p.csv", tamanho_bloco=4), agrupar=True))
+    
+    assert len(inteira) == 35
+    assert em_blocos == inteira
@@ -0,0 +1,20 @@
+import pandas as pd
+import pytest
+from benchmark import planilha_sintetica
+from cache_planilhas import ler_planilha_com_cache
+from nibo_core import ler_planilha
+
+@pytest.mark.parametrize("formato", ["csv", "xlsx"])
+def test_leitura_do_cache_igual_a_leitura_da_planilha(tmp_path, formato):
+    caminho = planilha_sintetica(str(tmp_path), 300, formato, taxa_erros=0.1)
+    with open(caminho, 'rb') as arquivo:
+        lida = ler_planilha(arquivo, caminho)
+    
+    resultados = []
+    for _ in range(2):
+        with open(caminho, 'rb') as arquivo:
+            resultados.append(ler_planilha_com_cache(arquivo, caminho, diretorio=str(tmp_path / "cache")))
+    
+    assert [do_cache for _, do_cache in resultados] == [False, True]
+    # Mesmos valores e mesmos tipos: as colunas de IDs não voltam como categóricas
+    pd.testing.assert_frame_equal(resultados[1][0], lida, check_exact=True)
@@ -0,0 +1,127 @@
+import io
+import json
+import pandas as pd
+from nibo_core import (
+    ERRO_STAKEHOLDER_SEM_ID,
+    indexar_cadastro,
+    resolver_nomes,
+    resolver_blocos,
+    nova_resolucao,
+    tabela_nomes_sem_id,
+    validar_planilha,
+)
+from cadastros_nibo import CadastrosNibo, ler_cadastro
+
+def _id(n):
+    return f"5f3c0000-aaaa-bbbb-cccc-{n:012d}"
+
+# "Mercado Central" tem ID único pelo nome exato, mas colide com outro
+# cadastro depois de normalizado; "Posto Bom" tem dois IDs já no nome exato
+CADASTRO = [
+    (_id(1), "Padaria São João"),
+    (_id(2), "Mercado Central"),
+    (_id(3), "mercado  central"),
+    (_id(4), "Posto Bom"),
+    (_id(5), "Posto Bom"),
+]
+
+NOMES = [
+    "Padaria São João",     # 0: nome exato
+    " PADARIA sao  joao",   # 1: só pelo nome normalizado
+    _id(9),                 # 2: já é um GUID, mesmo fora do cadastro
+    "Mercado Central",      # 3: exato, apesar da colisão normalizada
+    "MERCADO CENTRAL",      # 4: ambíguo normalizado
+    "Posto Bom",            # 5: ambíguo exato
+    "Desconhecido",         # 6: não encontrado
+    None,                   # 7: vazio
+    "Desconhecido",         # 8: não encontrado de novo
+]
+
+def _indices():
+    ids, nomes = zip(*CADASTRO)
+    return {'stakeholderId': indexar_cadastro(list(ids), list(nomes))}
+
+def _valores(serie):
+    """Valores da coluna com None nas células vazias, seja qual for o tipo (object ou str)"""
+    return [None if pd.isna(valor) else valor for valor in serie.tolist()]
+
+def _planilha():
+    return pd.DataFrame({
+        'stakeholderId': NOMES,
+        'description': "Pagamento",
+        'reference': [f"NF-{i}" for i in range(len(NOMES))],
+        'date': "2024-03-01",
+        'Vencimento': "2024-03-10",
+        'categoryId': "ca7e0000-aaaa-bbbb-cccc-000000000000",
+        'value': "10.5",
+        'costCenterId': None,
+    }, dtype=object)
+
+def test_indice_deixa_ambiguos_de_fora():
+    indice = _indices()['stakeholderId']
+    
+    assert indice['exato'].to_dict() == {"Padaria São João": _id(1), "Mercado Central": _id(2), "mercado  central": _id(3)}
+    assert indice['normalizado'].to_dict() == {"padaria sao joao": _id(1)}
+    assert indice['ambiguos'] == {"mercado central", "posto bom"}
+
+def test_nomes_trocados_pelos_ids():
+    resolucao = nova_resolucao()
+    df = _planilha()
+    resolvido = resolver_nomes(df, _indices(), resolucao)
+    
+    assert _valores(resolvido['stakeholderId']) == [
+        _id(1), _id(1), _id(9), _id(2), "MERCADO CENTRAL", "Posto Bom", "Desconhecido", None, "Desconhecido",
+    ]
+    # O df original não é alterado e as outras colunas passam intactas
+    assert df['stakeholderId'].tolist() == NOMES
+    assert resolvido['reference'].tolist() == df['reference'].tolist()
+    assert resolucao['linhas_resolvidas'] == {'stakeholderId': 3}
+    assert resolucao['sem_id'] == {
+        ('stakeholderId', "MERCADO CENTRAL"): (1, "ambíguo"),
+        ('stakeholderId', "Posto Bom"): (1, "ambíguo"),
+        ('stakeholderId', "Desconhecido"): (2, "não encontrado"),
+    }
+    assert tabela_nomes_sem_id(resolucao).values.tolist() == [
+        ['stakeholderId', "Desconhecido", 2, "não encontrado"],
+        ['stakeholderId', "MERCADO CENTRAL", 1, "ambíguo"],
+        ['stakeholderId', "Posto Bom", 1, "ambíguo"],
+    ]
+
+def test_nomes_sem_id_apontados_na_validacao():
+    resolvido = resolver_nomes(_planilha(), _indices())
+    relatorio, _ = validar_planilha(resolvido, colunas_resolvidas=['stakeholderId'])
+    
+    sem_id = {
+        linha for linha, codigo in zip(relatorio['linhas'].tolist(), relatorio['codigos'].tolist())
+        if codigo & ERRO_STAKEHOLDER_SEM_ID
+    }
+    assert sem_id == {4, 5, 6, 8}
+    assert relatorio['contagem'][ERRO_STAKEHOLDER_SEM_ID] == 4
+
+def test_em_blocos_acumula_como_a_planilha_inteira():
+    inteira = nova_resolucao()
+    esperado = resolver_nomes(_planilha(), _indices(), inteira)
+    df = _planilha()
+    
+    em_blocos = nova_resolucao()
+    blocos = list(resolver_blocos((df.iloc[i:i + 4] for i in range(0, len(df), 4)), _indices(), em_blocos))
+    # O tipo da coluna traduzida depende do que cada bloco resolveu; os valores não
+    juntos = pd.concat(blocos)
+    assert {coluna: _valores(juntos[coluna]) for coluna in juntos} == {coluna: _valores(esperado[coluna]) for coluna in esperado}
+    assert em_blocos == inteira
+
+def test_cadastro_importado_resolve_igual(tmp_path):
+    exportacao = json.dumps({'items': [{'id': id_, 'name': nome} for id_, nome in CADASTRO]})
+    ids, nomes = ler_cadastro(io.BytesIO(exportacao.encode('utf-8')), "stakeholders.JSON")
+    
+    caminho = str(tmp_path / "diario.db")
+    with CadastrosNibo(caminho) as cadastros:
+        assert cadastros.importar('stakeholders', ids, nomes, "stakeholders.json") == len(CADASTRO)
+    with CadastrosNibo(caminho) as cadastros:
+        indices = cadastros.indices()
+    
+    resolucao = nova_resolucao()
+    resolvido = resolver_nomes(_planilha(), indices, resolucao)
+    esperado = nova_resolucao()
+    pd.testing.assert_frame_equal(resolvido, resolver_nomes(_planilha(), _indices(), esperado))
+    assert resolucao == esperado
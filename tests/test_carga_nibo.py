@@ -0,0 +1,41 @@
+import json
+import pytest
+from benchmark import planilha_sintetica
+from carga_nibo import artefatos_do_arquivo, main
+from simulador_nibo import validar_agendamento
+from nibo_core import ler_planilha, construir_payloads, escrever_dados_runner, exportar_todos_artefatos
+
+@pytest.mark.parametrize("data", ["2024-05-05", "2024-05-05 00:00:00", "2024-05-05T00:00:00"])
+def test_simulador_aceita_datas_que_o_app_gera(data):
+    payload = {
+        "stakeholderId": "5f3c0000-aaaa-bbbb-cccc-000000000000",
+        "description": "Pagamento",
+        "scheduleDate": data,
+        "dueDate": data,
+        "categories": [{"categoryId": "ca7e0000-aaaa-bbbb-cccc-000000000000", "value": 10.0}],
+    }
+    assert validar_agendamento(payload) == []
+    assert validar_agendamento({**payload, "dueDate": "05/05/2024"}) == ["dueDate: data AAAA-MM-DD obrigatória"]
+
+def test_reenvio_de_artefatos_de_planilha_xlsx(tmp_path):
+    caminho = planilha_sintetica(str(tmp_path), 50, 'xlsx')
+    with open(caminho, 'rb') as arquivo:
+        df = ler_planilha(arquivo, caminho)
+    dados_runner, pacote = tmp_path / "dados.csv", tmp_path / "todos.zip"
+    with open(dados_runner, 'wb') as destino:
+        escrever_dados_runner(destino, construir_payloads(df))
+    with open(pacote, 'wb') as destino:
+        exportar_todos_artefatos(construir_payloads(df), "tok", "Carga", destino=destino)
+    
+    # As datas do Excel chegam aos payloads com a hora
+    _, _, payloads, _ = artefatos_do_arquivo(str(dados_runner))[0]
+    assert payloads[0]["scheduleDate"].endswith(" 00:00:00")
+    
+    resultados = tmp_path / "resultados.jsonl"
+    assert main([str(dados_runner), str(pacote), "-c", "4", "-o", str(resultados)]) == 0
+    registros = [json.loads(linha) for linha in resultados.read_text(encoding='utf-8').splitlines()]
+    assert sorted(registro['modo'] for registro in registros) == ['colecao', 'dados_runner_csv', 'dados_runner_csv', 'jsons_zip']
+    for registro in registros:
+        assert registro['agendamentos'] == 50
+        assert registro['falhas'] == 0
+        assert registro['status_tentativas'] == {"201": 50}
@@ -0,0 +1,44 @@
+import os
+import sys
+import subprocess
+from diario_envios import DiarioEnvios
+from conciliacao_runner import SUCESSO, FALHA, NAO_EXECUTADO, registrar_no_diario
+
+AGENDAMENTO = {
+    "stakeholderId": "5f3c0000-aaaa-bbbb-cccc-000000000000",
+    "reference": "NF-1",
+    "dueDate": "2024-03-14",
+    "categories": [{"categoryId": "ca7e0000-aaaa-bbbb-cccc-000000000000", "value": 10.0}],
+    "costCenters": [],
+}
+
+def test_confirmacoes_sobrevivem_a_um_kill(tmp_path):
+    caminho = str(tmp_path / "diario.db")
+    # O processo morre sem fechar o diário (como um kill): nenhuma confirmação pode se perder
+    script = (
+        "import os, sys\n"
+        "from diario_envios import DiarioEnvios\n"
+        f"diario = DiarioEnvios({caminho!r})\n"
+        f"base = {AGENDAMENTO!r}\n"
+        "for i in range(7):\n"
+        "    diario.registrar_confirmacao({**base, 'reference': f'NF-{i}'})\n"
+        "os._exit(0)\n"
+    )
+    subprocess.run([sys.executable, "-c", script], check=True, cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    
+    with DiarioEnvios(caminho) as diario:
+        assert len(diario) == 7
+        pendentes = [{**AGENDAMENTO, "reference": f"NF-{i}"} for i in range(9)]
+        assert [payload["reference"] for payload in diario.filtrar_pendentes(pendentes)] == ["NF-7", "NF-8"]
+
+def test_conciliacao_confirma_sucessos_do_runner(tmp_path):
+    payloads = [{**AGENDAMENTO, "reference": f"NF-{i}"} for i in range(4)]
+    situacoes = [(SUCESSO, 201, ""), (FALHA, 400, "erro"), (FALHA, 500, "erro"), (NAO_EXECUTADO, None, "")]
+    with DiarioEnvios(str(tmp_path / "diario.db")) as diario:
+        diario.registrar_confirmacao(payloads[2])  # reenviado depois pelo envio direto
+        resumo = {}
+        falhas = registrar_no_diario(diario, resumo, payloads, situacoes)
+        
+        assert [payload["reference"] for payload in falhas] == ["NF-1"]
+        assert resumo == {"registrados_diario": 1, "ja_confirmados": 1}
+        assert [payload["reference"] for payload in diario.filtrar_pendentes(payloads)] == ["NF-1", "NF-3"]
@@ -0,0 +1,97 @@
+import json
+import zipfile
+import pytest
+from nibo_core import dividir_colecao_postman
+
+def _payloads(n, descricao="d"):
+    return [{
+        "stakeholderId": f"s{i % 3}" if i % 5 else "",
+        "description": descricao,
+        "reference": str(i),
+        "scheduleDate": "2024-01-01",
+        "dueDate": f"2024-0{i % 2 + 1}-10" if i % 4 else "",
+        "accrualDate": "2024-01-01",
+        "categories": [{"categoryId": "c", "value": float(i)}],
+        "costCenterValueType": 0,
+        "costCenters": [{"costCenterId": "cc", "value": float(i)}],
+    } for i in range(n)]
+
+def _partes(pacote, manifesto):
+    """As coleções do ZIP na ordem do manifesto, com os itens achatados (sem as pastas)"""
+    partes = []
+    for parte in manifesto["partes"]:
+        colecao = json.loads(pacote.read(parte["arquivo"]))
+        itens = []
+        for item in colecao["item"]:
+            itens.extend(item["item"] if "item" in item else [item])
+        partes.append((colecao, itens))
+    return partes
+
+def _referencias(itens):
+    return [json.loads(item["request"]["body"]["raw"])["reference"] for item in itens]
+
+@pytest.mark.parametrize("total, max_itens, tamanhos", [
+    (7, 3, [3, 3, 1]),
+    (6, 3, [3, 3]),
+    (2, 3, [2]),
+    (1, 1, [1]),
+    (5, None, [5]),
+])
+def test_max_itens_corta_nas_fronteiras(total, max_itens, tamanhos):
+    destino, manifesto = dividir_colecao_postman(_payloads(total), "tok", "C", max_itens=max_itens)
+    pacote = zipfile.ZipFile(destino)
+    partes = _partes(pacote, manifesto)
+    
+    assert [parte["agendamentos"] for parte in manifesto["partes"]] == tamanhos
+    assert [len(itens) for _, itens in partes] == tamanhos
+    assert manifesto["total_agendamentos"] == total
+    # Nada perdido nem repetido, na ordem da planilha, com primeiro/ultimo batendo
+    referencias = [ref for _, itens in partes for ref in _referencias(itens)]
+    assert referencias == [str(i) for i in range(total)]
+    inicio = 1
+    for parte in manifesto["partes"]:
+        assert (parte["primeiro"], parte["ultimo"]) == (inicio, inicio + parte["agendamentos"] - 1)
+        inicio += parte["agendamentos"]
+    assert sorted(pacote.namelist()) == sorted([p["arquivo"] for p in manifesto["partes"]] + ["manifesto.json"])
+    assert json.loads(pacote.read("manifesto.json")) == manifesto
+
+def test_max_bytes_respeitado_e_item_grande_sozinho():
+    payloads = _payloads(12)
+    payloads[5]["description"] = "x" * 5000
+    destino, manifesto = dividir_colecao_postman(payloads, "tok", "C", max_bytes=4000)
+    pacote = zipfile.ZipFile(destino)
+    
+    for parte in manifesto["partes"]:
+        tamanho = pacote.getinfo(parte["arquivo"]).file_size
+        assert parte["bytes"] == tamanho
+        assert tamanho <= 4000 or parte["agendamentos"] == 1
+    assert len(manifesto["partes"]) > 2
+    grande = [p for p in manifesto["partes"] if p["primeiro"] <= 6 <= p["ultimo"]]
+    assert grande[0]["agendamentos"] == 1 and grande[0]["bytes"] > 4000
+    referencias = [ref for _, itens in _partes(pacote, manifesto) for ref in _referencias(itens)]
+    assert referencias == [str(i) for i in range(12)]
+
+def test_limite_que_chegar_primeiro():
+    destino, manifesto = dividir_colecao_postman(_payloads(10), "tok", "C", max_itens=4, max_bytes=10**6)
+    assert [p["agendamentos"] for p in manifesto["partes"]] == [4, 4, 2]
+    
+    por_bytes, _ = dividir_colecao_postman(_payloads(1), "tok", "C")
+    tamanho_item = zipfile.ZipFile(por_bytes).infolist()[0].file_size
+    _, manifesto = dividir_colecao_postman(_payloads(10), "tok", "C", max_itens=4, max_bytes=tamanho_item + 10)
+    assert [p["agendamentos"] for p in manifesto["partes"]] == [1] * 10
+
+@pytest.mark.parametrize("agrupar_por, pasta_esperada", [
+    ("stakeholder", lambda i: f"s{i % 3}" if i % 5 else "Sem stakeholder"),
+    ("mes_vencimento", lambda i: f"Vencimento 2024-0{i % 2 + 1}" if i % 4 else "Sem vencimento"),
+])
+def test_pastas_por_parte(agrupar_por, pasta_esperada):
+    destino, manifesto = dividir_colecao_postman(_payloads(9), "tok", "C", max_itens=4, agrupar_por=agrupar_por)
+    pacote = zipfile.ZipFile(destino)
+    
+    for parte, (colecao, _) in zip(manifesto["partes"], _partes(pacote, manifesto)):
+        pastas = {pasta["name"]: _referencias(pasta["item"]) for pasta in colecao["item"]}
+        esperado = {}
+        for i in range(parte["primeiro"] - 1, parte["ultimo"]):
+            esperado.setdefault(pasta_esperada(i), []).append(str(i))
+        assert pastas == esperado
+        assert parte["pastas"] == {pasta: len(refs) for pasta, refs in esperado.items()}
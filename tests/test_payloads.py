@@ -0,0 +1,93 @@
+import io
+import json
+import zipfile
+import numpy as np
+import pandas as pd
+import pytest
+from nibo_core import (
+    ler_planilha,
+    construir_payloads,
+    converter_planilha_para_json,
+    criar_zip_com_jsons,
+    criar_colecao_com_runner,
+)
+
+def _payloads_linha_a_linha(df):
+    """O montador antigo, com df.iterrows(): a referência da saída byte a byte"""
+    json_list = []
+    for _, row in df.iterrows():
+        if pd.isna(row).all():
+            continue
+        json_list.append({
+            "stakeholderId": str(row["stakeholderId"]) if pd.notna(row["stakeholderId"]) else "",
+            "description": str(row["description"]) if pd.notna(row["description"]) else "",
+            "reference": str(row["reference"]) if pd.notna(row["reference"]) else "",
+            "scheduleDate": str(row["date"]) if pd.notna(row["date"]) else "",
+            "dueDate": str(row["Vencimento"]) if pd.notna(row["Vencimento"]) else "",
+            "accrualDate": str(row["date"]) if pd.notna(row["date"]) else "",
+            "categories": [
+                {
+                    "categoryId": str(row["categoryId"]) if pd.notna(row["categoryId"]) else "",
+                    "value": float(row["value"]) if pd.notna(row["value"]) else 0.0
+                }
+            ],
+            "costCenterValueType": 0,
+            "costCenters": [
+                {
+                    "costCenterId": str(row["costCenterId"]) if pd.notna(row["costCenterId"]) else "",
+                    "value": float(row["value"]) if pd.notna(row["value"]) else 0.0
+                }
+            ]
+        })
+    return json_list
+
+CSV = (
+    "stakeholderId,description,reference,date,Vencimento,categoryId,value,costCenterId\n"
+    "5f3c0000-aaaa-bbbb-cccc-000000000001,Aluguel de março com uma descrição bem mais longa que cinquenta caracteres,NF-1,2024-03-01,2024-03-10,ca7e0000-aaaa-bbbb-cccc-000000000001,1500.5,cc000000-aaaa-bbbb-cccc-000000000001\n"
+    ",,,,,,,\n"
+    "5f3c0000-aaaa-bbbb-cccc-000000000002,,NF-2,2024-03-02,,ca7e0000-aaaa-bbbb-cccc-000000000002,,\n"
+    "5f3c0000-aaaa-bbbb-cccc-000000000003,\"Energia, \"\"ção\"\" / 10%\",3,2024-03-03,2024-03-13,ca7e0000-aaaa-bbbb-cccc-000000000003,7,cc000000-aaaa-bbbb-cccc-000000000003\n"
+)
+
+def _planilhas():
+    lida = ler_planilha(io.BytesIO(CSV.encode('utf-8')), "p.csv")
+    # Como o Excel entrega: datas como Timestamp e valores inteiros
+    excel = pd.DataFrame({
+        'stakeholderId': ["s1", None, "s3"],
+        'description': ["Um", "Dois", None],
+        'reference': [1, 2, 3],
+        'date': pd.to_datetime(["2024-01-05", "2024-01-06", None]),
+        'Vencimento': pd.to_datetime(["2024-02-05", None, "2024-02-07"]),
+        'categoryId': ["c1", "c2", "c3"],
+        'value': [10, 20, 30],
+        'costCenterId': ["k1", np.nan, "k3"],
+    })
+    # Só colunas numéricas: o iterrows convertia a linha inteira para float
+    numerica = pd.DataFrame({coluna: [1, 2] for coluna in excel.columns}).astype({'value': float})
+    return {'csv': lida, 'excel': excel, 'numerica': numerica}
+
+@pytest.fixture(params=["csv", "excel", "numerica"])
+def planilha(request):
+    return _planilhas()[request.param]
+
+def test_payloads_iguais_aos_do_iterrows(planilha):
+    esperados = [json.dumps(payload, indent=2, ensure_ascii=False) for payload in _payloads_linha_a_linha(planilha)]
+    
+    assert [json.dumps(payload, indent=2, ensure_ascii=False) for payload in construir_payloads(planilha)] == esperados
+
+def test_artefatos_iguais_aos_do_iterrows(planilha):
+    esperados = _payloads_linha_a_linha(planilha)
+    corpos = [json.dumps(payload, indent=2, ensure_ascii=False) for payload in esperados]
+    
+    colecao, total, _ = converter_planilha_para_json(planilha, "tok", "Teste")
+    assert total == len(esperados)
+    assert [item['request']['body']['raw'] for item in colecao['item']] == corpos
+    
+    arquivo, total = criar_zip_com_jsons(construir_payloads(planilha))
+    with zipfile.ZipFile(arquivo) as pacote:
+        membros = [nome for nome in pacote.namelist() if nome.startswith('agendamento_')]
+        assert [pacote.read(nome) for nome in membros] == [corpo.encode('utf-8') for corpo in corpos]
+    
+    # O requestData do Runner é o JSON compacto dos mesmos payloads
+    _, dados_runner, _ = criar_colecao_com_runner(planilha, "tok", "Teste")
+    assert [json.loads(registro['requestData']) for registro in dados_runner] == esperados
@@ -0,0 +1,80 @@
+import numpy as np
+import pandas as pd
+from nibo_core import (
+    ERRO_LINHA_VAZIA,
+    ERRO_STAKEHOLDER_VAZIO,
+    ERRO_VALOR_NAO_NUMERICO,
+    ERRO_DATA_INVALIDA,
+    ERRO_VENCIMENTO_ANTES_DA_DATA,
+    ERRO_CATEGORIA_ID_INVALIDO,
+    ERRO_CATEGORIA_SEM_ID,
+    validar_planilha,
+    erros_por_linha,
+    mensagens_validacao,
+    construir_payloads,
+)
+
+STAKEHOLDER = "5f3c0000-aaaa-bbbb-cccc-000000000000"
+CATEGORIA = "ca7e0000-aaaa-bbbb-cccc-000000000000"
+
+def _linha(**campos):
+    return {
+        'stakeholderId': STAKEHOLDER, 'description': "Pagamento", 'reference': "NF-1",
+        'date': "2024-03-01", 'Vencimento': "2024-03-10", 'categoryId': CATEGORIA,
+        'value': "10.5", 'costCenterId': None, **campos,
+    }
+
+def _planilha():
+    return pd.DataFrame([
+        _linha(),                                               # 0: válida
+        dict.fromkeys(_linha()),                                # 1: vazia
+        _linha(stakeholderId=None, value="abc"),                # 2: dois erros na mesma linha
+        _linha(date="31/02/2024", Vencimento="01/04/2024"),     # 3: data que não existe; vencimento em dd/mm/aaaa
+        _linha(date="10/03/2024", Vencimento="2024-03-01"),     # 4: vencimento antes da data
+        _linha(categoryId="Aluguel"),                           # 5: categoria fora do formato GUID
+    ], dtype=object)
+
+def test_codigos_por_linha():
+    relatorio, _ = validar_planilha(_planilha(), inicio=100)
+    
+    assert relatorio['linhas'].tolist() == [101, 102, 103, 104, 105]
+    assert relatorio['codigos'].tolist() == [
+        ERRO_LINHA_VAZIA,
+        ERRO_STAKEHOLDER_VAZIO | ERRO_VALOR_NAO_NUMERICO,
+        ERRO_DATA_INVALIDA,
+        ERRO_VENCIMENTO_ANTES_DA_DATA,
+        ERRO_CATEGORIA_ID_INVALIDO,
+    ]
+    assert {codigo: n for codigo, n in relatorio['contagem'].items() if n} == {
+        ERRO_LINHA_VAZIA: 1, ERRO_STAKEHOLDER_VAZIO: 1, ERRO_VALOR_NAO_NUMERICO: 1,
+        ERRO_DATA_INVALIDA: 1, ERRO_VENCIMENTO_ANTES_DA_DATA: 1, ERRO_CATEGORIA_ID_INVALIDO: 1,
+    }
+    assert len(mensagens_validacao(relatorio)) == 6
+
+def test_tabela_de_erros_aponta_a_linha_da_planilha():
+    relatorio, _ = validar_planilha(_planilha())
+    
+    tabela = erros_por_linha(relatorio)
+    
+    # Linha da planilha: posição + 2 (cabeçalho e contagem a partir de 1)
+    assert tabela['Linha'].tolist() == [3, 4, 5, 6, 7]
+    assert tabela['Erros'].tolist()[1] == "stakeholderId vazio; value não numérico"
+
+def test_coluna_resolvida_aponta_nome_sem_id():
+    relatorio, _ = validar_planilha(_planilha(), colunas_resolvidas=['categoryId'])
+    
+    assert relatorio['codigos'][-1] == ERRO_CATEGORIA_SEM_ID
+
+def test_conversoes_reaproveitadas_na_geracao():
+    df = _planilha().drop(index=[2]).reset_index(drop=True)
+    _, conversoes = validar_planilha(df)
+    
+    assert conversoes['vazias'].tolist() == [False, True, False, False, False]
+    assert np.allclose(conversoes['valores'], [10.5, 0.0, 10.5, 10.5, 10.5])
+    assert conversoes['valor_total'] == 42.0
+    assert construir_payloads(df, conversoes) == construir_payloads(df)
+
+def test_valor_nao_numerico_desliga_o_reaproveitamento():
+    _, conversoes = validar_planilha(_planilha())
+    
+    assert conversoes['valores'] is None
@@ -0,0 +1,91 @@
+import io
+import numpy as np
+from nibo_core import ler_planilha, impressoes_linhas, comparar_versoes, linhas_a_regenerar
+from versoes_planilha import VersoesPlanilha
+
+CABECALHO = "stakeholderId,description,reference,date,Vencimento,categoryId,value,costCenterId\n"
+
+ANTERIOR = [
+    "s1,Aluguel,NF-1,2024-03-01,2024-03-10,c1,10.5,cc1",
+    "s1,Energia,NF-2,2024-03-01,2024-03-10,c1,20.5,cc1",
+    "s2,Parcela,NF-3,2024-03-02,2024-03-12,c2,30.5,cc2",
+    "s2,Parcela,NF-3,2024-03-02,2024-03-12,c2,31.5,cc2",
+    "s3,Frete,NF-4,2024-03-03,2024-03-13,c3,40.5,cc3",
+    "s3,Frete,NF-4,2024-03-03,2024-03-13,c3,41.5,cc3",
+    "s5,Água,NF-6,2024-03-05,2024-03-15,c5,60.5,cc5",
+]
+
+# NF-2 muda de valor, a 2ª NF-4 e a NF-6 saem, entram a NF-5 e uma 3ª NF-3,
+# e uma linha em branco desloca as posições no df (valores com centavos nas
+# duas versões: a linha em branco não muda o tipo da coluna)
+ATUAL = [
+    "s1,Aluguel,NF-1,2024-03-01,2024-03-10,c1,10.5,cc1",
+    ",,,,,,,",
+    "s1,Energia,NF-2,2024-03-01,2024-03-10,c1,25.5,cc1",
+    "s2,Parcela,NF-3,2024-03-02,2024-03-12,c2,30.5,cc2",
+    "s2,Parcela,NF-3,2024-03-02,2024-03-12,c2,31.5,cc2",
+    "s3,Frete,NF-4,2024-03-03,2024-03-13,c3,40.5,cc3",
+    "s4,Seguro,NF-5,2024-03-04,2024-03-14,c4,50.5,cc4",
+    "s2,Parcela,NF-3,2024-03-02,2024-03-12,c2,32.5,cc2",
+]
+
+def _impressoes(linhas):
+    df = ler_planilha(io.BytesIO((CABECALHO + "\n".join(linhas) + "\n").encode('utf-8')), "p.csv")
+    return impressoes_linhas(df)
+
+def test_mesma_planilha_sem_diferencas():
+    impressoes = _impressoes(ANTERIOR)
+    diferencas = comparar_versoes(impressoes, _impressoes(ANTERIOR))
+    
+    assert diferencas['novas'].size == 0 and diferencas['alteradas'].size == 0
+    assert diferencas['inalteradas'] == len(ANTERIOR)
+    assert diferencas['removidas'] == 0
+    assert linhas_a_regenerar(impressoes, diferencas, agrupar=True).size == 0
+
+def test_novas_alteradas_e_removidas():
+    atual = _impressoes(ATUAL)
+    diferencas = comparar_versoes(_impressoes(ANTERIOR), atual)
+    
+    # Posições entre as linhas com dados da versão atual (a linha em branco não conta)
+    assert list(atual['linhas']) == [0, 2, 3, 4, 5, 6, 7]
+    assert list(diferencas['novas']) == [5, 6]
+    assert list(diferencas['alteradas']) == [1]
+    assert diferencas['inalteradas'] == 4
+    assert diferencas['removidas'] == 2
+    assert len(diferencas['grupos_removidos']) == 2
+    # Sem agrupar, só as linhas novas e alteradas, em posições do df
+    assert list(linhas_a_regenerar(atual, diferencas)) == [2, 6, 7]
+
+def test_agrupando_regenera_os_grupos_inteiros():
+    atual = _impressoes(ATUAL)
+    diferencas = comparar_versoes(_impressoes(ANTERIOR), atual)
+    
+    # NF-3 ganhou uma linha e NF-4 perdeu uma: os dois grupos voltam inteiros;
+    # o grupo da NF-6 sumiu e não tem linha para regenerar
+    assert list(linhas_a_regenerar(atual, diferencas, agrupar=True)) == [2, 3, 4, 5, 6, 7]
+
+def test_mudanca_fora_da_chave_e_alteracao_e_nao_linha_nova():
+    anterior = _impressoes(ANTERIOR)
+    atual = _impressoes([ANTERIOR[0].replace("Aluguel", "Aluguel março")] + ANTERIOR[1:])
+    diferencas = comparar_versoes(anterior, atual)
+    
+    assert list(diferencas['alteradas']) == [0]
+    assert diferencas['novas'].size == 0 and diferencas['removidas'] == 0
+
+def test_versoes_guardadas_comparam_igual(tmp_path):
+    anterior = _impressoes(ANTERIOR)
+    caminho = str(tmp_path / "diario.db")
+    with VersoesPlanilha(caminho) as versoes:
+        assert versoes.ultima("p.csv") is None
+        versoes.guardar("p.csv", anterior)
+    with VersoesPlanilha(caminho) as versoes:
+        guardada = versoes.ultima("p.csv")
+    
+    for campo in ('chaves', 'conteudos', 'grupos'):
+        assert np.array_equal(guardada[campo], anterior[campo])
+    atual = _impressoes(ATUAL)
+    a_partir_do_banco = comparar_versoes(guardada, atual)
+    em_memoria = comparar_versoes(anterior, atual)
+    for campo in ('novas', 'alteradas', 'grupos_removidos'):
+        assert np.array_equal(a_partir_do_banco[campo], em_memoria[campo])
+    assert a_partir_do_banco['removidas'] == em_memoria['removidas']
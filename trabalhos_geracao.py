@@ -0,0 +1,160 @@
+"""Trabalhos de geração em segundo plano, em um pool limitado compartilhado pelo servidor
+
+Gerar os artefatos de uma planilha grande leva de segundos a minutos, e no
+script do Streamlit a página fica travada até o fim. Aqui cada geração vira
+um trabalho com id, enviado a um pool de threads único para todas as sessões:
+no máximo TRABALHOS_SIMULTANEOS rodam ao mesmo tempo e os demais esperam na
+fila, por ordem de chegada. Como cada sessão tem um trabalho ativo por vez,
+ninguém passa à frente enchendo a fila.
+
+O trabalho informa o progresso (linhas processadas e linhas por segundo) e
+pode ser cancelado; o cancelamento é verificado a cada INTERVALO_CANCELAMENTO
+linhas. O resultado fica guardado até RETENCAO_RESULTADOS segundos depois do
+fim, para continuar disponível entre os reruns.
+"""
+import os
+import time
+import uuid
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# Gerações rodando ao mesmo tempo no servidor; as demais esperam na fila
+TRABALHOS_SIMULTANEOS = int(os.environ.get("NIBO_TRABALHOS_SIMULTANEOS", max(1, (os.cpu_count() or 2) // 2)))
+
+# Segundos que o resultado de um trabalho terminado fica guardado
+RETENCAO_RESULTADOS = 3600
+
+# Linhas entre duas verificações do pedido de cancelamento
+INTERVALO_CANCELAMENTO = 1000
+
+class TrabalhoCancelado(Exception):
+    """Levantada dentro do trabalho quando o cancelamento é pedido"""
+
+class Trabalho:
+    """Uma geração enviada ao pool: estado, progresso e resultado"""
+
+    NA_FILA = "na fila"
+    RODANDO = "rodando"
+    CONCLUIDO = "concluído"
+    CANCELADO = "cancelado"
+    FALHOU = "falhou"
+
+    def __init__(self, descricao, total):
+        self.id = uuid.uuid4().hex[:12]
+        self.descricao = descricao
+        self.total = total
+        self.processadas = 0
+        self.estado = self.NA_FILA
+        self.criado_em = time.time()
+        self.inicio = None
+        self.inicio_contagem = None
+        self.fim = None
+        self.resultado = None
+        self.erro = None
+        self._cancelamento = threading.Event()
+        self._futuro = None
+
+    @property
+    def ativo(self):
+        return self.estado in (self.NA_FILA, self.RODANDO)
+
+    @property
+    def cancelando(self):
+        return self.ativo and self._cancelamento.is_set()
+
+    def cancelar(self):
+        """Pede o cancelamento; um trabalho ainda na fila sai dela na hora"""
+        self._cancelamento.set()
+        if self._futuro is not None and self._futuro.cancel():
+            self.estado, self.fim = self.CANCELADO, time.time()
+
+    def verificar_cancelamento(self):
+        if self._cancelamento.is_set():
+            raise TrabalhoCancelado()
+
+    def acompanhar(self, linhas):
+        """Repassa as linhas (ex.: payloads) contando o progresso e verificando o cancelamento"""
+        for linha in linhas:
+            if self.inicio_contagem is None:
+                self.inicio_contagem = time.time()
+            self.processadas += 1
+            if not self.processadas % INTERVALO_CANCELAMENTO:
+                self.verificar_cancelamento()
+            yield linha
+        self.verificar_cancelamento()
+
+    def fracao(self):
+        """Fração concluída, entre 0 e 1 (o total pode ser só uma estimativa)"""
+        if not self.ativo:
+            return 1.0
+        return min(1.0, self.processadas / self.total) if self.total else 0.0
+
+    def linhas_por_segundo(self):
+        """Ritmo desde a primeira linha contada (a preparação antes dela não entra)"""
+        if self.inicio_contagem is None:
+            return 0.0
+        segundos = (self.fim or time.time()) - self.inicio_contagem
+        return self.processadas / segundos if segundos else 0.0
+
+    def segundos_restantes(self):
+        """Estimativa pelo ritmo atual, ou None se ainda não der para estimar"""
+        ritmo = self.linhas_por_segundo()
+        if not ritmo or not self.total or self.estado != self.RODANDO:
+            return None
+        return max(0.0, (self.total - self.processadas) / ritmo)
+
+class FilaTrabalhos:
+    """Pool de threads limitado com o registro dos trabalhos enviados a ele"""
+
+    def __init__(self, simultaneos=TRABALHOS_SIMULTANEOS, retencao=RETENCAO_RESULTADOS):
+        self.simultaneos = simultaneos
+        self.retencao = retencao
+        self._executor = ThreadPoolExecutor(simultaneos, thread_name_prefix="nibo-geracao")
+        self._trabalhos = {}
+        self._trava = threading.Lock()
+
+    def enviar(self, funcao, descricao, total, *argumentos):
+        """Põe `funcao(trabalho, *argumentos)` na fila; o retorno dela vira o resultado do trabalho"""
+        trabalho = Trabalho(descricao, total)
+        with self._trava:
+            self._descartar_expirados()
+            self._trabalhos[trabalho.id] = trabalho
+            trabalho._futuro = self._executor.submit(self._rodar, trabalho, funcao, argumentos)
+        return trabalho
+
+    def _rodar(self, trabalho, funcao, argumentos):
+        trabalho.estado, trabalho.inicio = Trabalho.RODANDO, time.time()
+        try:
+            trabalho.verificar_cancelamento()
+            trabalho.resultado = funcao(trabalho, *argumentos)
+            trabalho.estado = Trabalho.CONCLUIDO
+        except TrabalhoCancelado:
+            trabalho.estado = Trabalho.CANCELADO
+        except Exception as e:
+            trabalho.erro = str(e)
+            trabalho.estado = Trabalho.FALHOU
+        finally:
+            trabalho.fim = time.time()
+
+    def obter(self, id_trabalho):
+        """Trabalho pelo id, ou None se não existir ou já tiver sido descartado"""
+        with self._trava:
+            return self._trabalhos.get(id_trabalho)
+
+    def descartar(self, id_trabalho):
+        """Cancela o trabalho, se ainda estiver ativo, e libera o resultado"""
+        with self._trava:
+            trabalho = self._trabalhos.pop(id_trabalho, None)
+        if trabalho is not None and trabalho.ativo:
+            trabalho.cancelar()
+
+    def posicao_na_fila(self, trabalho):
+        """Posição do trabalho entre os que esperam na fila (1 = o próximo a rodar)"""
+        with self._trava:
+            return 1 + sum(1 for outro in self._trabalhos.values()
+                       if outro.estado == Trabalho.NA_FILA and outro.criado_em < trabalho.criado_em)
+
+    def _descartar_expirados(self):
+        agora = time.time()
+        for id_trabalho in [i for i, t in self._trabalhos.items() if t.fim is not None and agora - t.fim > self.retencao]:
+            del self._trabalhos[id_trabalho]
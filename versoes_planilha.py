@@ -0,0 +1,61 @@
+"""Última versão gerada de cada planilha, como impressões digitais das linhas
+
+Fica no mesmo banco SQLite do diário de envios, um registro por planilha
+(pelo nome), com as chaves, os conteúdos e os grupos das linhas em arrays de
+hashes de 64 bits. Quando uma versão corrigida da planilha é enviada de novo,
+a comparação com esse registro diz quais linhas precisam virar artefatos.
+"""
+import sqlite3
+import numpy as np
+from datetime import datetime
+from diario_envios import CAMINHO_DIARIO
+
+# Arrays de impressões guardados, na ordem das colunas da tabela
+CAMPOS_IMPRESSOES = ['chaves', 'conteudos', 'grupos']
+
+class VersoesPlanilha:
+    """Acesso às versões guardadas; use com `with` para fechar a conexão ao sair"""
+
+    def __init__(self, caminho=CAMINHO_DIARIO):
+        self._conexao = sqlite3.connect(caminho)
+        self._conexao.execute("PRAGMA journal_mode=WAL")
+        self._conexao.execute(
+            "CREATE TABLE IF NOT EXISTS versoes ("
+            " planilha TEXT PRIMARY KEY,"
+            " gerada_em TEXT,"
+            " linhas INTEGER,"
+            " chaves BLOB,"
+            " conteudos BLOB,"
+            " grupos BLOB"
+            ")"
+        )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.fechar()
+
+    def ultima(self, planilha):
+        """Impressões da última versão gerada da planilha, ou None se ela nunca foi gerada"""
+        linha = self._conexao.execute(
+            "SELECT gerada_em, chaves, conteudos, grupos FROM versoes WHERE planilha = ?", (planilha,)
+        ).fetchone()
+        if linha is None:
+            return None
+        gerada_em, *arrays = linha
+        return {'gerada_em': gerada_em, **{
+            campo: np.frombuffer(dados, dtype='<u8') for campo, dados in zip(CAMPOS_IMPRESSOES, arrays)
+        }}
+
+    def guardar(self, planilha, impressoes):
+        """Registra as impressões (de impressoes_linhas) como a última versão gerada da planilha"""
+        with self._conexao:
+            self._conexao.execute(
+                "INSERT OR REPLACE INTO versoes VALUES (?, ?, ?, ?, ?, ?)",
+                (planilha, datetime.now().isoformat(timespec='seconds'), len(impressoes['chaves']),
+                 *(np.asarray(impressoes[campo], dtype='<u8').tobytes() for campo in CAMPOS_IMPRESSOES))
+            )
+
+    def fechar(self):
+        self._conexao.close()